@@ -4,18 +4,31 @@ from langchain_core.prompts.chat import _convert_to_message
 
 from app.core.config import settings
 from app.schemas.user import UserPreferenceBase
-from .llms import LLMFactory
 from .graph.movie_agent import MovieAgent
 from .graph.state import AgentState
+from .llms import LLMFactory
+from .memory import ConversationMemory
+from .nodes.conversation_summary import ConversationSummarizer
+from .runner import AgentRunner
 
 
-def build_state(messages: list[tuple[str, str]], user_id: int, user_preferences: List[UserPreferenceBase]):
+def build_state(
+    messages: list[tuple[str, str]],
+    user_id: int,
+    user_preferences: List[UserPreferenceBase],
+    summary: str = "",
+):
     state = AgentState(
         history=[_convert_to_message(message).format() for message in messages],
         user_id=user_id,
-        user_preferences=user_preferences
+        user_preferences=user_preferences,
+        summary=summary,
     )
     return state
 
-llm = LLMFactory.get_llm(settings.LLM_NAME)
-agent_instance = MovieAgent(llm=llm, show_logs=settings.VERBOSE_AGENT)
+agent_instance = MovieAgent(show_logs=settings.VERBOSE_AGENT)
+agent_runner = AgentRunner(agent_instance, settings.AGENT_EXECUTION_MODE, settings.AGENT_WORKERS)
+conversation_memory = ConversationMemory(
+    ConversationSummarizer(LLMFactory.get_role_llm("summary"), show_logs=settings.VERBOSE_AGENT)
+    if settings.CONVERSATION_SUMMARY_ENABLED else None
+)
@@ -0,0 +1,77 @@
+"""
+A/B comparison of the tool answer modes: "llm" (every API tool writes its own answer) against "raw"
+(tools return compact facts and only ExecutorNode writes the answer).
+
+python -m app.agent.compare_tool_answer --repeats 3 --show-answers
+python -m app.agent.compare_tool_answer --question "Какой рейтинг у фильма Матрица?"
+"""
+import argparse
+import statistics
+import time
+
+from langchain_core.messages import HumanMessage
+
+from app.agent.graph.movie_agent import MovieAgent
+from app.agent.graph.state import AgentState
+from app.agent.llms.usage import LLM_REQUESTS, LLM_TOKENS
+
+
+MODES = ("llm", "raw")
+
+DEFAULT_QUESTIONS = (
+    "Какой рейтинг у фильма Ирония судьбы?",
+    "Посоветуй американские фильмы в жанре фантастика после 2010 года",
+    "Сколько лет Киану Ривзу?",
+    "Кто режиссёр фильма Интерстеллар и какие ещё фильмы он снял?",
+)
+
+
+def _total(counter) -> float:
+    return sum(value for _, value in counter.items())
+
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def run(questions: list[str], repeats: int, show_answers: bool) -> None:
+    # The fast router is disabled so that both modes run the same plan source
+    agents = {mode: MovieAgent(use_fast_router=False, tool_answer_mode=mode) for mode in MODES}
+    latencies = {mode: [] for mode in MODES}
+    llm_calls = dict.fromkeys(MODES, 0.0)
+    tokens = dict.fromkeys(MODES, 0.0)
+
+    for question in questions:
+        for i in range(repeats):
+            # The order alternates so that API caches warm up for both modes equally
+            for mode in MODES if i % 2 == 0 else MODES[::-1]:
+                calls_before, tokens_before = _total(LLM_REQUESTS), _total(LLM_TOKENS)
+                start = time.perf_counter()
+                state = agents[mode].invoke(AgentState(history=[HumanMessage(question)], user_id="compare_tool_answer"))
+                latencies[mode].append(time.perf_counter() - start)
+                llm_calls[mode] += _total(LLM_REQUESTS) - calls_before
+                tokens[mode] += _total(LLM_TOKENS) - tokens_before
+                if show_answers and i == 0:
+                    print(f"[{mode}] {question}\n{state.history[-1].content}\n")
+
+    runs = len(questions) * repeats
+    print(f"{'mode':<5} {'p50, s':>7} {'p95, s':>7} {'mean, s':>8} {'LLM calls':>10} {'tokens':>8}")
+    for mode in MODES:
+        print(
+            f"{mode:<5} {_percentile(latencies[mode], 0.5):>7.2f} {_percentile(latencies[mode], 0.95):>7.2f} "
+            f"{statistics.mean(latencies[mode]):>8.2f} {llm_calls[mode] / runs:>10.1f} {tokens[mode] / runs:>8.0f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--question", action="append", help="can be repeated, default - built-in questions")
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--show-answers", action="store_true")
+    args = parser.parse_args()
+    run(args.question or list(DEFAULT_QUESTIONS), args.repeats, args.show_answers)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,17 @@
+import functools
+from typing import Literal
+
 from langchain_core.language_models import BaseChatModel
 from langgraph.graph import END, START, StateGraph
 
+from app.core import tracing
+from app.core.config import settings
+from app.core.metrics import registry
+from app.agent.llms import LLMFactory
+
 from app.agent.graph.state import AgentState
 from app.agent.nodes import (
+    RouterNode,
     PlannerNode,
     ExecutorNode,
     MoviesSearch,
@@ -15,32 +24,72 @@ from app.agent.nodes import (
 )
 
 
+NODE_LATENCY = registry.histogram(
+    "agent_node_latency_seconds", "Latency of a graph node (router, planner, executor)", ("node",)
+)
+
+
 class MovieAgent:
+    """
+    Граф агента. Если llm не передан, модель каждой роли берётся из настроек (LLM_PLANNER, LLM_EXECUTOR, ...),
+    а структурированные ответы при ошибке валидации повторяются на LLM_CASCADE_MODEL.
+    tool_answer_mode задаёт режим ответа API-тулов для всех тулов сразу, по умолчанию — TOOL_ANSWER_MODE(S).
+    """
+
     def __init__(
         self,
-        llm: BaseChatModel,
+        llm: BaseChatModel | None = None,
+        use_fast_router: bool = settings.USE_FAST_ROUTER,
+        tool_answer_mode: Literal["llm", "raw"] | None = None,
         show_logs: bool = False,
         **kwargs,
     ):
         self._llm = llm
+        self._use_fast_router = use_fast_router
+        self._tool_answer_mode = tool_answer_mode
         self._show_logs = show_logs
         self._graph = self._build_graph()
 
+    def _role_llm(self, role: str) -> BaseChatModel:
+        return self._llm or LLMFactory.get_role_llm(role)
+
+    def _fallback_llm(self, role: str) -> BaseChatModel | None:
+        return None if self._llm else LLMFactory.get_fallback_llm(role)
+
+    @staticmethod
+    def _add_node(workflow: StateGraph, name: str, node) -> None:
+        @functools.wraps(node)
+        def timed(state: AgentState):
+            with NODE_LATENCY.time(node=name):
+                return node(state)
+
+        workflow.add_node(name, tracing.traced(f"node {name}", {"agent.node": name})(timed))
+
     def _build_graph(self):
         workflow = StateGraph(AgentState)
 
         # tools
-        movies_search = MoviesSearch(self._llm, show_logs=self._show_logs)
-        movie_reviews_summarizer = MovieReviewsSummarizer(self._llm, show_logs=self._show_logs)
-        movie_semantic_search = MovieSemanticSearch(show_logs=self._show_logs)
+        tool_llm = self._role_llm("tool_answer")
+        params = {
+            "api_llm": self._role_llm("params"),
+            "api_fallback_llm": self._fallback_llm("params"),
+            "answer_mode": self._tool_answer_mode,
+        }
+        movies_search = MoviesSearch(tool_llm, show_logs=self._show_logs, **params)
+        movie_reviews_summarizer = MovieReviewsSummarizer(tool_llm, show_logs=self._show_logs)
+        movie_semantic_search = MovieSemanticSearch(show_logs=self._show_logs, answer_mode=self._tool_answer_mode)
         #people_search = PeopleSearch(self._llm, show_logs=self._show_logs)
-        people_search_by_name = PeopleSearchByName(self._llm, show_logs=self._show_logs)
-        prefs_manager = UserPreferencesManager(self._llm, show_logs=self._show_logs)
+        people_search_by_name = PeopleSearchByName(tool_llm, show_logs=self._show_logs, **params)
+        prefs_manager = UserPreferencesManager(
+            self._role_llm("preferences"), show_logs=self._show_logs, fallback_llm=self._fallback_llm("preferences")
+        )
 
         # nodes
-        planner_node = PlannerNode(self._llm, show_logs=self._show_logs)
+        planner_node = PlannerNode(
+            self._role_llm("planner"), fallback_llm=self._fallback_llm("planner"), show_logs=self._show_logs
+        )
         executor_node = ExecutorNode(
-            self._llm,
+            self._role_llm("executor"),
             [
                 movies_search,
                 movie_reviews_summarizer,
@@ -53,22 +102,30 @@ class MovieAgent:
         )
 
         # graph
-        workflow.add_node("planner", planner_node.invoke)
-        workflow.add_node("executor", executor_node.invoke)
-
-        workflow.add_edge(START, "planner")
+        self._add_node(workflow, "planner", planner_node.invoke)
+        self._add_node(workflow, "executor", executor_node.invoke)
+
+        if self._use_fast_router:
+            # Simple requests get their plan from the local router and skip the planner LLM call
+            router_node = RouterNode(show_logs=self._show_logs)
+            self._add_node(workflow, "router", router_node.invoke)
+            workflow.add_edge(START, "router")
+            workflow.add_conditional_edges("router", router_node.next_node, ["planner", "executor"])
+        else:
+            workflow.add_edge(START, "planner")
         workflow.add_edge("planner", "executor")
         workflow.add_edge("executor", END)
 
         return workflow.compile()
 
     def invoke(self, state: AgentState) -> AgentState:
-        return AgentState.model_validate(dict(self._graph.invoke(state)))
+        with tracing.span("MovieAgent.invoke", {"user.id": str(state.user_id), "agent.history": len(state.history)}):
+            return AgentState.model_validate(dict(self._graph.invoke(state)))
 
 
 if __name__ == "__main__":
     from langchain_core.messages import HumanMessage
-    from app.agent.llms import LLMFactory
+    from app.agent.llms import usage_report
 
     # state = AgentState(history=[HumanMessage("Есть ли жена у Киану Ривза?")], user_id="test_user")
     # gpt = LLMFactory.get_llm("gpt-4o")
@@ -76,8 +133,9 @@ if __name__ == "__main__":
     # state = AgentState(history=[HumanMessage("Какой рейтинг у фильма Ирония судьбы?")], user_id="test_user")
     # state = AgentState(history=[HumanMessage("Посоветуй американские фильмы в жанре фантастика")], user_id="test_user")
     state = AgentState(history=[HumanMessage("Расскажи, что пишут о фильме Побег из Шоушенка")], user_id="test_user")
-    gpt = LLMFactory.get_llm("deepinfra/Llama-3.3-70B-Instruct")
 
-    agent = MovieAgent(gpt, show_logs=True)
+    # Models of the roles come from the settings
+    agent = MovieAgent(show_logs=True)
     result = agent.invoke(state)
     print(result)
+    print(usage_report())
@@ -9,3 +9,4 @@ class AgentState(BaseModel):
     history: List[BaseMessage]
     user_id: int
     user_preferences: List[UserPreferenceBase]
+    summary: str = ""  # summary of the messages older than history
@@ -1 +1,3 @@
-from .llm_factory import LLMFactory
\ No newline at end of file
+from .llm_factory import LLMFactory
+from .cascade import cascade
+from .usage import usage_report
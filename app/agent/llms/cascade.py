@@ -0,0 +1,38 @@
+from typing import Callable
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from app.core.metrics import registry
+
+
+CASCADE_ESCALATIONS = registry.counter(
+    "llm_cascade_escalations_total", "Calls retried on the larger model after a validation failure", ("role",)
+)
+
+
+def cascade(
+    build: Callable[[BaseChatModel], Runnable],
+    llm: BaseChatModel,
+    fallback_llm: BaseChatModel | None = None,
+    role: str = "",
+) -> Runnable:
+    """
+    Цепочка build(llm), которая при ошибке разбора или валидации ответа повторяется на fallback_llm.
+
+    build должен выбрасывать OutputParserException, если ответ модели не подходит,
+    чтобы дешёвая модель отвечала на простые запросы, а большая — только на неудавшиеся.
+    """
+    chain = build(llm)
+    if fallback_llm is None:
+        return chain
+
+    def escalate(inputs):
+        CASCADE_ESCALATIONS.inc(role=role)
+        return inputs
+
+    return chain.with_fallbacks(
+        [RunnableLambda(escalate) | build(fallback_llm)],
+        exceptions_to_handle=(OutputParserException,),
+    )
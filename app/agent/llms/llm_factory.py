@@ -1,4 +1,4 @@
-from typing import Literal, Dict
+from typing import Literal, Dict, Tuple
 from pathlib import Path
 import os
 
@@ -6,15 +6,28 @@ from langchain_core.language_models import BaseChatModel
 from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 
+from app.core.config import settings
+from .usage import LLMUsageCallback
+
 
 BASE_PATH = Path(__file__).parent.parent.parent.parent.resolve() / ".env"
 load_dotenv(BASE_PATH)
 
 
+# planner - PlannerNode, params - API parameters in MoviesSearch/PeopleSearchByName,
+# preferences - UserPreferencesManager, tool_answer - answers of the tools,
+# executor - final answer, autonomous - autonomous recommendations, summary - conversation summary
+ROLES = Literal["planner", "params", "preferences", "tool_answer", "executor", "autonomous", "summary"]
+
+# Roles with a structured output that can be validated and escalated to LLM_CASCADE_MODEL
+CASCADE_ROLES = ("planner", "params", "preferences")
+
+
 class LLMFactory:
     SUPPORTED_MODELS = Literal["gpt-4o", "gpt-4o-mini", "deepinfra/Llama-3.3-70B-Instruct"]
 
     _initialized_models: Dict[str, BaseChatModel] = {}
+    _role_models: Dict[Tuple[str, str], BaseChatModel] = {}
 
 
     @classmethod
@@ -51,3 +64,27 @@ class LLMFactory:
             else:
                 raise ValueError(f"Unsupported model: {model_name}")
         return cls._initialized_models[model_name]
+
+    @classmethod
+    def _get_tracked_llm(cls, role: str, model_name: SUPPORTED_MODELS) -> BaseChatModel:
+        key = (role, model_name)
+        if key not in cls._role_models:
+            # A copy shares the HTTP client with the base model and only adds the usage callback
+            cls._role_models[key] = cls.get_llm(model_name).model_copy(
+                update={"callbacks": [LLMUsageCallback(role, model_name)]}
+            )
+        return cls._role_models[key]
+
+    @classmethod
+    def get_role_llm(cls, role: ROLES) -> BaseChatModel:
+        """Модель для роли из настроек LLM_<ROLE>, по умолчанию LLM_NAME"""
+        return cls._get_tracked_llm(role, getattr(settings, f"LLM_{role.upper()}") or settings.LLM_NAME)
+
+    @classmethod
+    def get_fallback_llm(cls, role: ROLES) -> BaseChatModel | None:
+        """Большая модель, на которой повторяется неудавшийся вызов роли, если каскад включён"""
+        model_name = settings.LLM_CASCADE_MODEL
+        role_model_name = getattr(settings, f"LLM_{role.upper()}") or settings.LLM_NAME
+        if not model_name or role not in CASCADE_ROLES or model_name == role_model_name:
+            return None
+        return cls._get_tracked_llm(role, model_name)
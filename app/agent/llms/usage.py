@@ -0,0 +1,114 @@
+import time
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from app.core import tracing
+from app.core.metrics import registry
+
+
+LLM_LATENCY = registry.histogram(
+    "llm_request_latency_seconds", "LLM call latency by agent role", ("role", "model")
+)
+LLM_REQUESTS = registry.counter(
+    "llm_requests_total", "LLM calls by agent role and outcome", ("role", "model", "status")
+)
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total", "LLM tokens by agent role", ("role", "model", "direction")
+)
+LLM_COST = registry.counter(
+    "llm_cost_usd_total", "Estimated LLM cost in USD by agent role", ("role", "model")
+)
+
+# USD per 1M input / output tokens
+MODEL_PRICES = {
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "deepinfra/Llama-3.3-70B-Instruct": (0.23, 0.4),
+}
+
+
+def _usage(response: LLMResult) -> tuple[int, int]:
+    input_tokens = output_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                input_tokens += usage["input_tokens"]
+                output_tokens += usage["output_tokens"]
+    if not input_tokens and not output_tokens and response.llm_output:
+        usage = response.llm_output.get("token_usage") or {}
+        input_tokens, output_tokens = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    return input_tokens, output_tokens
+
+
+class LLMUsageCallback(BaseCallbackHandler):
+    """Метрики и span-ы вызовов модели в роли агента: задержка, токены и оценка стоимости"""
+
+    def __init__(self, role: str, model_name: str):
+        self.role = role
+        self.model_name = model_name
+        self._started: dict[UUID, float] = {}
+        self._spans: dict[UUID, tracing.Span] = {}
+
+    def _start(self, run_id: UUID) -> None:
+        self._started[run_id] = time.perf_counter()
+        self._spans[run_id] = tracing.start_span(
+            f"llm {self.role}",
+            {"gen_ai.operation.name": "chat", "gen_ai.request.model": self.model_name, "agent.role": self.role},
+            kind="CLIENT",
+        )
+
+    def on_chat_model_start(self, serialized: dict, messages: list, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id)
+
+    def on_llm_start(self, serialized: dict, prompts: list[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id)
+
+    def _observe(self, run_id: UUID, status: str) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            LLM_LATENCY.observe(time.perf_counter() - started, role=self.role, model=self.model_name)
+        LLM_REQUESTS.inc(role=self.role, model=self.model_name, status=status)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        self._observe(run_id, "ok")
+        input_tokens, output_tokens = _usage(response)
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.set_attributes({"gen_ai.usage.input_tokens": input_tokens, "gen_ai.usage.output_tokens": output_tokens})
+            span.end()
+        LLM_TOKENS.inc(input_tokens, role=self.role, model=self.model_name, direction="input")
+        LLM_TOKENS.inc(output_tokens, role=self.role, model=self.model_name, direction="output")
+        input_price, output_price = MODEL_PRICES.get(self.model_name, (0.0, 0.0))
+        LLM_COST.inc(
+            (input_tokens * input_price + output_tokens * output_price) / 1_000_000,
+            role=self.role, model=self.model_name,
+        )
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._observe(run_id, "error")
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.record_exception(error)
+            span.end()
+
+
+def usage_report() -> str:
+    """Сводка по ролям: число вызовов, средняя задержка, токены и стоимость"""
+    rows = {}
+    for (role, model, status), count in LLM_REQUESTS.items():
+        rows.setdefault((role, model), 0)
+        rows[(role, model)] += count
+    lines = [f"{'role':<12} {'model':<34} {'calls':>6} {'avg, s':>7} {'in tok':>8} {'out tok':>8} {'cost, $':>9}"]
+    for (role, model), calls in sorted(rows.items()):
+        latency = LLM_LATENCY.sum(role=role, model=model) / max(LLM_LATENCY.count(role=role, model=model), 1)
+        lines.append(
+            f"{role:<12} {model:<34} {calls:>6.0f} {latency:>7.2f} "
+            f"{LLM_TOKENS.value(role=role, model=model, direction='input'):>8.0f} "
+            f"{LLM_TOKENS.value(role=role, model=model, direction='output'):>8.0f} "
+            f"{LLM_COST.value(role=role, model=model):>9.4f}"
+        )
+    return "\n".join(lines)
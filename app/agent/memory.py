@@ -0,0 +1,128 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.core import tracing
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.core.metrics import registry
+from app.schemas.message import Message
+from .nodes.conversation_summary import ConversationSummarizer
+
+
+SUMMARY_UPDATES = registry.counter(
+    "conversation_summary_updates_total", "Background conversation summary updates by outcome", ("status",)
+)
+
+
+class ConversationMemory:
+    """
+    История диалога для агента: краткое содержание старых сообщений и окно последних сообщений по токенам,
+    поэтому размер промпта не растёт с длиной диалога.
+
+    Краткое содержание обновляется в фоне после каждого ответа (schedule_update). Без summarizer
+    в историю попадают последние USER_HISTORY_LIMIT сообщений.
+    """
+
+    def __init__(
+        self,
+        summarizer: ConversationSummarizer | None,
+        max_messages: int = settings.HISTORY_WINDOW_MAX_MESSAGES,
+        wait_timeout: float = 10.0,
+    ):
+        self._summarizer = summarizer
+        self._max_messages = max_messages
+        self._wait_timeout = wait_timeout
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._dirty: set[int] = set()
+
+    async def load(self, session: AsyncSession, user_id: int, min_messages: int = 1) -> tuple[str, list[Message]]:
+        """:return: (краткое содержание, последние сообщения, среди них не меньше min_messages новых)"""
+        if self._summarizer is None:
+            messages = await crud.message.get_last_user_messages(
+                session, user_id, max(settings.USER_HISTORY_LIMIT, min_messages)
+            )
+            return "", list(messages)
+
+        # The previous turn may still be folding messages that are about to leave the window
+        task = self._tasks.get(user_id)
+        if task is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(task), self._wait_timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        summary = await crud.conversation_summary.get_by_user_id(session, user_id)
+        messages = await crud.message.get_last_user_messages(
+            session, user_id, max(self._max_messages, min_messages), after_id=summary.last_message_id if summary else 0
+        )
+        _, window = self._summarizer.split(messages, min_messages)
+        return (summary.content if summary else ""), window
+
+    def schedule_update(self, user_id: int) -> None:
+        if self._summarizer is None:
+            return
+        if user_id in self._tasks:
+            # One update per user at a time, the running one repeats for the new messages
+            self._dirty.add(user_id)
+            return
+        self._tasks[user_id] = asyncio.create_task(self._update_loop(user_id))
+
+    async def _update_loop(self, user_id: int) -> None:
+        try:
+            while True:
+                self._dirty.discard(user_id)
+                await self._update(user_id)
+                if user_id not in self._dirty:
+                    break
+        finally:
+            del self._tasks[user_id]
+
+    async def _update(self, user_id: int) -> None:
+        # The task inherits the context of the finished turn, the update is traced on its own
+        with tracing.attach(None), tracing.span("conversation_summary.update", {"user.id": user_id}) as span:
+            try:
+                await self._update_summary(user_id, span)
+            except Exception as e:
+                span.record_exception(e)
+                SUMMARY_UPDATES.inc(status="error")
+                print(f"Conversation summary update failed for user {user_id}: {e}")
+
+    async def _update_summary(self, user_id: int, span: tracing.Span) -> None:
+        async with async_session_factory() as session:
+            summary = await crud.conversation_summary.get_by_user_id(session, user_id)
+            content, after_id = (summary.content, summary.last_message_id) if summary else ("", 0)
+            recent = await crud.message.get_last_user_messages(session, user_id, self._max_messages, after_id=after_id)
+            folded_count = 0
+            if len(recent) == self._max_messages:
+                # More messages may be pending than one read returns (a failed update, a burst of messages,
+                # the summary enabled for an existing user): the older ones are folded first, oldest page first
+                while page := await crud.message.get_user_messages_between(
+                    session, user_id, after_id, recent[0].id, self._max_messages
+                ):
+                    content = await self._summarizer.aupdate(content, page)
+                    if not await crud.conversation_summary.save(session, user_id, content, page[-1].id):
+                        SUMMARY_UPDATES.inc(status="stale")
+                        return
+                    after_id = page[-1].id
+                    folded_count += len(page)
+            # Of the last messages only those that no longer fit in the window are folded
+            folded, _ = self._summarizer.split(recent)
+            span.set_attribute("summary.folded_messages", folded_count + len(folded))
+            if folded:
+                content = await self._summarizer.aupdate(content, folded)
+                if not await crud.conversation_summary.save(session, user_id, content, folded[-1].id):
+                    SUMMARY_UPDATES.inc(status="stale")
+                    return
+            elif not folded_count:
+                SUMMARY_UPDATES.inc(status="skipped")
+                return
+        SUMMARY_UPDATES.inc(status="ok")
+
+    async def drain(self, timeout: float) -> bool:
+        """Ждёт фоновые обновления при остановке"""
+        if not self._tasks:
+            return True
+        _, pending = await asyncio.wait(list(self._tasks.values()), timeout=timeout)
+        return not pending
@@ -1,4 +1,5 @@
 from .planner_node import PlannerNode
+from .router_node import RouterNode, FastRouter
 from .executor_node import ExecutorNode
 
 from .movies_search import MoviesSearch
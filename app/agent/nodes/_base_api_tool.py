@@ -1,14 +1,32 @@
+import time
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Literal
 
 from langchain_core.output_parsers import StrOutputParser, BaseOutputParser, JsonOutputParser
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, FunctionMessage
 from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+from app.agent.llms.cascade import cascade
+from app.agent.nodes.prompt_budget import PromptBudget
+from app.core import tracing
+from app.core.config import settings
+from app.core.metrics import registry
+
+
+TOOL_LATENCY = registry.histogram(
+    "agent_tool_latency_seconds", "Tool call latency by answer mode", ("tool", "mode")
+)
+TOOL_ERRORS = registry.counter(
+    "agent_tool_errors_total", "Tool calls that raised an exception", ("tool",)
+)
 
 
 class BaseApiTool(ABC):
     """Base Tool class"""
+    _answer_mode: Literal["llm", "raw"] = "llm"
+
     def __init__(
         self,
         llm: BaseChatModel,
@@ -20,16 +38,47 @@ class BaseApiTool(ABC):
         description: str | None = None,
         limit: int = 10,
         show_logs: bool = False,
+        api_llm: BaseChatModel | None = None,
+        api_fallback_llm: BaseChatModel | None = None,
+        answer_mode: Literal["llm", "raw"] | None = None,
     ) -> None:
-        self._chain = PromptTemplate.from_template(api_prompt) | llm | api_parser
+        # API parameters may come from a separate (cheaper) model and are retried
+        # on api_fallback_llm when they do not pass _validate_params
+        self._chain = cascade(
+            lambda model: PromptTemplate.from_template(api_prompt) | model | api_parser | RunnableLambda(self._validate_params),
+            api_llm or llm,
+            api_fallback_llm,
+            role="params",
+        )
         self._answer_chain = PromptTemplate.from_template(answer_prompt) | llm | answer_parser
+        self._answer_prompt = answer_prompt
+        self._budget = PromptBudget(name, settings.PROMPT_BUDGET_TOOL, show_logs)
         self._description = description
         self._name = name
         self._limit = limit
         self._show_logs = show_logs
+        self._answer_mode = answer_mode or settings.TOOL_ANSWER_MODES.get(name, settings.TOOL_ANSWER_MODE)
+
+    def _raw_answer(self, question: str, info: str) -> str:
+        """Данные API без обработки моделью: ответ на вопрос по ним формулирует ExecutorNode"""
+        return f"{self._name} — {question}\n{info}"
+
+    def _validate_params(self, params):
+        """Проверка сгенерированных параметров API, при ошибке выбрасывает OutputParserException"""
+        return params
 
     def invoke(self, question: str, collected_info: str, *args, **kwargs) -> str:
-        return self._invoke(question, collected_info, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            with tracing.span(f"tool {self._name}", {"tool.name": self._name, "tool.mode": self._answer_mode}) as span:
+                answer = self._invoke(question, collected_info, *args, **kwargs)
+                span.set_attribute("tool.answer_chars", len(answer or ""))
+                return answer
+        except Exception:
+            TOOL_ERRORS.inc(tool=self._name)
+            raise
+        finally:
+            TOOL_LATENCY.observe(time.perf_counter() - start, tool=self._name, mode=self._answer_mode)
 
     @abstractmethod
     def _invoke(self, question: str, collected_info: str, *args, **kwargs) -> str:
@@ -27,13 +27,20 @@ class BaseNode(ABC):
         self._name = name
         self._show_logs = show_logs
 
-    def _history_to_str(self, history: List[BaseMessage]):
+    def _summary_to_line(self, summary: str) -> str:
+        # Older messages are replaced by their summary, see ConversationMemory
+        return f"summary: {summary}" if summary else ""
+
+    def _history_to_lines(self, history: List[BaseMessage]) -> List[str]:
         roles_to_str = {
             AIMessage: "assistant",
             HumanMessage: "user"
         }
-        return "\n".join([f"{roles_to_str[type(x)]}: {x.content}" for x in history
-                         if not isinstance(x, FunctionMessage)])
+        return [f"{roles_to_str[type(x)]}: {x.content}" for x in history
+                if not isinstance(x, FunctionMessage)]
+
+    def _history_to_str(self, history: List[BaseMessage], summary: str = ""):
+        return "\n".join(filter(None, [self._summary_to_line(summary), *self._history_to_lines(history)]))
 
     def _format_preferences_for_prompt(
         self, preferences: List[UserPreferenceBase]
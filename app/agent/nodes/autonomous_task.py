@@ -1,26 +1,46 @@
 from pathlib import Path
-import requests
+import asyncio
 import os
-import copy
-import random
+import time
 
 from aiogram import Bot as TelegramBot
 from sqlalchemy import select, and_
+from sqlalchemy.orm import noload
 from sqlalchemy.ext.asyncio import AsyncSession
 from langchain_core.output_parsers import StrOutputParser, BaseOutputParser
 from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import PromptTemplate
 from dotenv import load_dotenv
 
+from app import crud
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.core.metrics import registry
+from app.core.cache import TTLCache
+from app.core.rate_limit import kp_background_limiter
+from app.core.broadcast import BroadcastMessage, BroadcastSender, BroadcastStats, DeliveryStatus
+from app.models.task_run import TaskRunStatus
 from app.models.user import User, PreferenceItem, PreferenceType
+from app.schemas.task_run import TaskRun as TaskRunSchema
 from app.schemas.user import User as UserSchema, UserPreference as UserPreferenceSchema
 from app.agent.nodes._base_node import BaseNode
+from app.agent.recommendations.candidate_pools import CandidatePools, build_candidate_pools, load_movies
+from app.agent.recommendations.engine import Recommendation, RecommenderEngine
+from app.agent.recommendations.embedding import EmbeddingRecommendation, recommend_by_embedding
 from . import kp_utils
 
 
 load_dotenv(Path(__file__).parent.parent.parent.parent.resolve() / ".env")
 
 
+USERS_PROCESSED = registry.counter(
+    "autonomous_task_users_total", "Users processed by autonomous tasks", ("task",)
+)
+USERS_PER_MINUTE = registry.gauge(
+    "autonomous_task_users_per_minute", "Throughput of the last autonomous task run", ("task",)
+)
+
+
 MOVIES_RECOMMEND_PROMPT_TEMPLATE = """
 Ты — персональный ассистент по подбору фильмов и сериалов. Твоя задача — помогать пользователю находить кино, которое ему понравится, на основе его предпочтений. Ты дружелюбный, внимательный и заинтересованный в том, чтобы пользователь получил удовольствие от просмотра. Ты умеешь анализировать предпочтения пользователя (жанры, актеры, режиссеры, темы) и составлять персонализированные рекомендации с обоснованием.
 
@@ -53,6 +73,26 @@ RECOMMENDATIONS:
 """
 
 
+MOVIE_BLURB_PROMPT_TEMPLATE = """
+Ты — персональный ассистент по подбору фильмов и сериалов. Напиши короткое (1-2 предложения) увлекательное описание фильма для подборки рекомендаций.
+Начни с названия и года в формате **«Название» (год)**, затем через тире — о чём фильм. Если есть рейтинги, упомяни их.
+Не добавляй приветствий, нумерации и обращений к пользователю.
+
+Информация о фильме:
+```
+{movie}
+```
+
+Описание:
+"""
+
+FRAGMENTS_GREETING = "Привет! Я подобрал для тебя несколько фильмов, которые, думаю, тебе понравятся:"
+FRAGMENTS_CLOSING = "Какой фильм тебя больше всего заинтересовал? Или, может быть, подобрать что-то ещё?"
+
+# Movie info text -> generated blurb, shared by all users and runs
+MOVIE_BLURB_CACHE = TTLCache(maxsize=10_000, ttl=7 * 24 * 3600)
+
+
 class RecommendUsersAutonomousTask:
 
     def __init__(
@@ -63,14 +103,28 @@ class RecommendUsersAutonomousTask:
         name="RecommendUsersAutonomousTask",
         description="Отправляет всем активным пользователям персональные рекомендации по фильмам",
         limit: int = 5,
+        workers: int = settings.AUTONOMOUS_TASK_WORKERS,
+        mode: str = settings.RECOMMENDER_MODE,
+        message_mode: str = settings.AUTONOMOUS_MESSAGE_MODE,
+        batch_size: int = settings.AUTONOMOUS_BATCH_SIZE,
+        max_attempts: int = settings.AUTONOMOUS_TASK_MAX_ATTEMPTS,
+        blurb_prompt: str = MOVIE_BLURB_PROMPT_TEMPLATE,
         show_logs: bool = False,
     ):
         self._answer_chain = (
             PromptTemplate.from_template(answer_prompt) | llm | answer_parser
         )
+        self._blurb_chain = (
+            PromptTemplate.from_template(blurb_prompt) | llm | StrOutputParser()
+        )
         self._description = description
         self._name = name
         self._limit = limit
+        self._workers = workers
+        self._mode = mode
+        self._message_mode = message_mode
+        self._batch_size = batch_size
+        self._max_attempts = max_attempts
         self._show_logs = show_logs
 
     def _preference_to_prompt(
@@ -102,93 +156,21 @@ class RecommendUsersAutonomousTask:
         return result
 
 
-    def _get_popular_movies_recommendation(self) -> list:
-        params = copy.deepcopy(kp_utils.DEFAULT_SEARCH_PARAMS)
-        params["lists"] = ["top250"]
-        params["page"] = random.randint(1, 250 // self._limit)
-        params["limit"] = self._limit
-        api_response = requests.get(
-            kp_utils.MOVIE_SEARCH_URL, params=params, headers=kp_utils.HEADERS
-        )
-        return api_response.json()["docs"]
-
-    def _get_personalized_movies_recommendation(
-        self,
-        positive_prefs: list[UserPreferenceSchema],
-        watched_movies: list[int],
-        search_limit: int = 50,
-    ) -> tuple[list, list]:
-        random.shuffle(positive_prefs)
-        docs = []
-        source_prefs = []
-        i = 0
-        while i < self._limit:
-            if not positive_prefs:
-                break
-            pref = positive_prefs[i % len(positive_prefs)]
-            if pref.preference_item == PreferenceItem.MOVIE:
-                api_response = requests.get(
-                    kp_utils.MOVIE_SEARCH_URL + f"/{pref.kp_id}", headers=kp_utils.HEADERS
-                )
-                if not api_response.ok:
-                    positive_prefs.pop(i % len(positive_prefs))
-                    continue
-                api_response = api_response.json()
-                if "similarMovies" not in api_response:
-                    positive_prefs.pop(i % len(positive_prefs))
-                    continue
-                pref_docs = []
-                for movie in api_response["similarMovies"]:
-                    if movie["id"] not in watched_movies:
-                        pref_docs.append(requests.get(kp_utils.MOVIE_SEARCH_URL + f"/{movie['id']}", headers=kp_utils.HEADERS).json())
-
-            else:
-                if pref.preference_item == PreferenceItem.GENRE:
-                    param_key = "genres.name"
-                    param_value = [pref.item_name]
-                elif (
-                    pref.preference_item == PreferenceItem.ACTOR
-                    or pref.preference_item == PreferenceItem.DIRECTOR
-                ):
-                    param_key = "persons.id"
-                    param_value = [pref.kp_id]
-                else:
-                    raise ValueError("Unknown preference item")
-
-                params = copy.deepcopy(kp_utils.DEFAULT_SEARCH_PARAMS)
-                params[param_key] = param_value
-                params["limit"] = search_limit
-                api_response = requests.get(
-                    kp_utils.MOVIE_SEARCH_URL, params=params, headers=kp_utils.HEADERS
-                )
-                if not api_response.ok:
-                    positive_prefs.pop(i % len(positive_prefs))
-                    continue
-                pref_docs = api_response.json()["docs"]
-            random.shuffle(pref_docs)
-            pref_doc_idx = 0
-            while pref_doc_idx < len(pref_docs) and pref_docs[pref_doc_idx]["id"] in watched_movies:
-                pref_doc_idx += 1
-            if pref_doc_idx < len(pref_docs):
-                docs.append(pref_docs[pref_doc_idx])
-                source_prefs.append(pref)
-                watched_movies.append(pref_docs[pref_doc_idx]["id"])
-                i += 1
-                continue
-            
-            positive_prefs.pop(i % len(positive_prefs))
-
-        return docs, source_prefs
-
-
-    def _prepare_answer(self, movies_docs: list, source_prefs: list | None) -> str:
-        movies_data = [kp_utils.transform_movie_data(i) for i in movies_docs]
+    def _preference_to_reason(self, pref: UserPreferenceSchema) -> str:
+        type2russian = {
+            PreferenceItem.MOVIE: "тебе понравился фильм",
+            PreferenceItem.GENRE: "ты любишь жанр",
+            PreferenceItem.DIRECTOR: "тебе нравится режиссёр",
+            PreferenceItem.ACTOR: "тебе нравится актёр",
+        }
+        return f"{type2russian[pref.preference_item]} «{pref.item_name}»"
 
+    def _recommendations_to_prompt(self, movies_data: list[str], source_prefs: list | None) -> str:
         recs_str = ""
 
         for i in range(len(movies_data)):
             recs_str = recs_str + f"## Рекомендация {i + 1}.\n"
-            if source_prefs:
+            if source_prefs and source_prefs[i]:
                 recs_str = recs_str + f"### Причина рекомендации: {self._preference_to_prompt(source_prefs[i])}\n"
             recs_str = recs_str + f"### Информация о рекомендованном фильме:\n{movies_data[i]}\n"
             recs_str = recs_str + "\n\n"
@@ -196,59 +178,365 @@ class RecommendUsersAutonomousTask:
         if self._show_logs:
             print(f"Movies recs:\n{recs_str}")
 
-        return self._answer_chain.invoke({"recommendations": recs_str})
+        return recs_str
+
+    async def _prepare_answer(self, movies_data: list[str], source_prefs: list | None) -> str:
+        recs_str = self._recommendations_to_prompt(movies_data, source_prefs)
+        return await self._answer_chain.ainvoke({"recommendations": recs_str})
+
+    async def _get_blurbs(self, movies_data: set[str]) -> dict[str, str]:
+        """Описания фильмов: из кэша, недостающие генерируются одним батчем"""
+        blurbs = {}
+        missing = []
+        for movie_data in movies_data:
+            blurb = MOVIE_BLURB_CACHE.get(movie_data)
+            if blurb is None:
+                missing.append(movie_data)
+            else:
+                blurbs[movie_data] = blurb
+
+        if missing:
+            generated = await self._blurb_chain.abatch(
+                [{"movie": movie_data} for movie_data in missing],
+                config={"max_concurrency": self._workers},
+                return_exceptions=True,
+            )
+            for movie_data, blurb in zip(missing, generated):
+                if isinstance(blurb, Exception):
+                    print(f"{self._name}: failed to generate movie blurb: {blurb}")
+                    continue
+                blurb = blurb.strip()
+                MOVIE_BLURB_CACHE.set(movie_data, blurb)
+                blurbs[movie_data] = blurb
+
+        if self._show_logs:
+            print(f"Movie blurbs: {len(movies_data) - len(missing)} cached, {len(missing)} generated.")
+        return blurbs
+
+    def _assemble_answer(self, blurbs: list[str], source_prefs: list | None) -> str:
+        lines = [FRAGMENTS_GREETING]
+        for i, blurb in enumerate(blurbs):
+            line = f"{i + 1}. {blurb}"
+            if source_prefs and source_prefs[i]:
+                line += f"\nПодобрал, потому что {self._preference_to_reason(source_prefs[i])}."
+            lines.append(line)
+        lines.append(FRAGMENTS_CLOSING)
+        return "\n\n".join(lines)
+
+    async def _prepare_answers(self, selections: list[tuple[list[str], list | None]]) -> list[str | Exception]:
+        """
+        Готовит сообщения для нескольких пользователей сразу.
+
+        batch — один запрос к LLM на пользователя, запросы отправляются через abatch с ограничением параллельности;
+        fragments — сообщение собирается из закэшированных описаний фильмов без отдельного запроса на пользователя.
+        """
+        if self._message_mode == "fragments":
+            blurbs = await self._get_blurbs({movie_data for movies_data, _ in selections for movie_data in movies_data})
+            answers = []
+            for movies_data, source_prefs in selections:
+                if not all(movie_data in blurbs for movie_data in movies_data):
+                    answers.append(RuntimeError("Movie blurb is missing"))
+                    continue
+                answers.append(self._assemble_answer([blurbs[movie_data] for movie_data in movies_data], source_prefs))
+            return answers
+
+        return await self._answer_chain.abatch(
+            [
+                {"recommendations": self._recommendations_to_prompt(movies_data, source_prefs)}
+                for movies_data, source_prefs in selections
+            ],
+            config={"max_concurrency": self._workers},
+            return_exceptions=True,
+        )
+
+    @staticmethod
+    def _watched_and_liked(user: UserSchema) -> tuple[list[int], list[UserPreferenceSchema]]:
+        watched_movies = [
+            i.kp_id
+            for i in user.preferences
+            if i.preference_item == PreferenceItem.MOVIE
+        ]
+        positive_prefs = [
+            i for i in user.preferences if i.preference_type == PreferenceType.LIKE
+        ]
+        return watched_movies, positive_prefs
+
+    def _pick_random(self, pools: CandidatePools, user: UserSchema) -> list[Recommendation]:
+        """Случайный выбор из пулов предпочтений; похожие фильмы выбираются по id, ещё не загрузив их"""
+        watched_movies, positive_prefs = self._watched_and_liked(user)
+        if not positive_prefs:
+            return []
+        movie_ids, source_prefs = pools.select_personalized(
+            positive_prefs, watched_movies, self._limit, loaded_only=False
+        )
+        return [Recommendation(movie_id, 0.0, pref) for movie_id, pref in zip(movie_ids, source_prefs)]
+
+    async def _load_picked_movies(
+        self,
+        client: kp_utils.AsyncKpClient,
+        pools: CandidatePools,
+        recommendations: dict[int, list[Recommendation]],
+    ) -> None:
+        """Загружает только выбранные фильмы, пачками id на запрос"""
+        picked = [rec for recs in recommendations.values() for rec in recs if rec.movie_id not in pools.movies]
+        try:
+            await load_movies(client, pools, (rec.movie_id for rec in picked))
+        except kp_utils.KpApiError:
+            # Users with these picks are failed by CandidatePools.require and retried
+            pools.unavailable.update(
+                ("movie", rec.source_pref.kp_id)
+                for rec in picked if rec.source_pref.preference_item == PreferenceItem.MOVIE
+            )
+
+    def _select_recommendations(
+        self,
+        pools: CandidatePools,
+        user: UserSchema,
+        recommendations: list[Recommendation | EmbeddingRecommendation] | None,
+    ) -> tuple[list[str], list | None]:
+        watched_movies, positive_prefs = self._watched_and_liked(user)
+        if not (recommendations and isinstance(recommendations[0], EmbeddingRecommendation)):
+            # A Kinopoisk outage fails the user, who is retried, instead of sending worse recommendations
+            pools.require(positive_prefs)
+            # A picked movie the API did not return is left out
+            recommendations = [rec for rec in recommendations or [] if rec.movie_id in pools.movies]
+
+        if recommendations:
+            return (
+                [
+                    (rec.movie if isinstance(rec, EmbeddingRecommendation) else pools.movies[rec.movie_id]).render()
+                    for rec in recommendations
+                ],
+                [rec.source_pref for rec in recommendations],
+            )
+
+        movie_ids, source_prefs = [], None
+        if positive_prefs:
+            movie_ids, source_prefs = pools.select_personalized(positive_prefs, watched_movies, self._limit)
+        if not movie_ids:
+            # source preferences are None if popular movies recommended
+            movie_ids, source_prefs = pools.select_popular(watched_movies, self._limit), None
+        return [pools.movies[movie_id].render() for movie_id in movie_ids], source_prefs
+
+    async def _process_user(
+        self,
+        pools: CandidatePools,
+        sender: BroadcastSender,
+        stats: BroadcastStats,
+        user: UserSchema,
+        recommendations: list[Recommendation | EmbeddingRecommendation] | None = None,
+    ) -> None:
+        movies_data, source_prefs = self._select_recommendations(pools, user, recommendations)
+
+        if not movies_data:
+            return
+
+        if self._show_logs:
+            print(f"Made up {len(movies_data)} recommendations for user {user.tg_chat_id}.")
+
+        answer = await self._prepare_answer(movies_data, source_prefs)
+
+        if self._show_logs:
+            print(f"Answer for user {user.tg_chat_id}:\n{answer}")
+            print("-------------------")
+
+        # Users who blocked the bot are deactivated by the sender and count as processed
+        status = await sender.send(user.tg_chat_id, answer, stats)
+        if status == DeliveryStatus.FAILED:
+            raise RuntimeError("Message was not delivered")
+
+    async def _load_users(
+        self,
+        session: AsyncSession,
+        tg_user_id: int | None,
+        shard: int = 0,
+        shards: int = 1,
+    ) -> list[UserSchema]:
+        # Message history is not needed for recommendations, skip loading it
+        stmt = select(User).where(User.is_active == True).options(noload(User.messages)).order_by(User.id)
+        if tg_user_id:
+            stmt = stmt.where(User.tg_chat_id == tg_user_id)
+        if shards > 1:
+            stmt = stmt.where(User.id % shards == shard)
+        result = await session.execute(stmt)
+        return [UserSchema.model_validate(user) for user in result.scalars().all()]
+
+    async def _start_run(self, session: AsyncSession, run_name: str, run_key: str) -> TaskRunSchema | None:
+        """Новая попытка запуска для срабатывания расписания или None, если запуск выполнять не нужно"""
+        abandoned = await crud.task_run.abandon_stale(session, run_name, run_key)
+        if abandoned:
+            print(f"{run_name}: {abandoned} interrupted runs marked as failed.")
+        run = await crud.task_run.get_by_run_key(session, run_name, run_key)
+        if run is None:
+            run = await crud.task_run.create(session, {"name": run_name, "run_key": run_key})
+        elif run.status == TaskRunStatus.DONE:
+            if self._show_logs:
+                print(f"Run {run_name} {run_key} is already done.")
+            return None
+        elif run.attempts >= self._max_attempts:
+            print(f"{run_name}: giving up run {run_key} after {run.attempts} attempts, {run.failed} users failed.")
+            return None
+        return await crud.task_run.start_attempt(session, run.id)
 
     async def _ainvoke(
         self,
         session: AsyncSession,
         bot: TelegramBot,
         tg_user_id: int = None,
+        shard: int = 0,
+        shards: int = 1,
+        run_key: str | None = None,
     ):
+        """
+        :param shard: Номер части пользователей (user.id % shards), которую обрабатывает этот запуск
+        :param run_key: Ключ срабатывания расписания: уже завершённый запуск с тем же ключом не повторяется,
+            повторная попытка обрабатывает только пользователей, которые не были обработаны
+        :return: False, если часть пользователей не обработана и запуск стоит повторить
+        """
         if self._show_logs:
             print(f"---{self._name}---")
             print("Starting autonomous task...")
 
-        stmt = select(User).where(User.is_active == True)
-        if tg_user_id:
-            stmt = stmt.where(User.tg_chat_id == tg_user_id)
-        result = await session.execute(stmt)
-        users = result.scalars().all()
-        users = [UserSchema.model_validate(user) for user in users]
+        run_name = self._name if shards == 1 else f"{self._name}:{shard}/{shards}"
+
+        # Only scheduled runs are checkpointed: a retry of the same schedule slot skips the users already done
+        run = None
+        if tg_user_id is None and run_key is not None:
+            run = await self._start_run(session, run_name, run_key)
+            if run is None:
+                return True
+
+        users = await self._load_users(session, tg_user_id, shard, shards)
 
         if self._show_logs:
             print(f"Found {len(users)} active users.")
 
-        for user in users:
-            positive_prefs = [
-                i for i in user.preferences if i.preference_type == PreferenceType.LIKE
-            ]
-            source_prefs = None # source preferences of personalized recommendations; None if popular movies recommended
-            if not positive_prefs:
-                rec_docs = self._get_popular_movies_recommendation()
+        if run and run.processed:
+            done_user_ids = await crud.task_run.get_done_user_ids(session, run.id)
+            users = [user for user in users if user.id not in done_user_ids]
+            print(f"{run_name}: attempt {run.attempts} of run {run_key}, "
+                  f"{len(done_user_ids)} users already processed.")
+
+        processed = 0
+        failed = 0
+
+        sender = BroadcastSender(bot, show_logs=self._show_logs)
+        stats = BroadcastStats()
+
+        async def user_done(user: UserSchema) -> None:
+            nonlocal processed
+            processed += 1
+            USERS_PROCESSED.inc(task=self._name)
+            if run:
+                async with async_session_factory() as worker_session:
+                    await crud.task_run.mark_user_done(worker_session, run.id, user.id)
+
+        def user_failed(user: UserSchema, error: Exception) -> None:
+            nonlocal failed
+            failed += 1
+            print(f"{self._name}: failed to process user {user.tg_chat_id}: {error}")
+
+        async def worker(queue: asyncio.Queue[UserSchema]) -> None:
+            while not queue.empty():
+                user = queue.get_nowait()
+                try:
+                    await self._process_user(pools, sender, stats, user, recommendations.get(user.id))
+                except Exception as e:
+                    user_failed(user, e)
+                    continue
+                await user_done(user)
+
+        start = time.perf_counter()
+        try:
+            recommendations = {}
+            if self._mode == "embedding" and users:
+                # One vector query per user against the movie index, no Kinopoisk requests
+                recommendations = await asyncio.to_thread(recommend_by_embedding, users, self._limit)
+                recommendations = {user_id: recs for user_id, recs in recommendations.items() if recs}
+                if self._show_logs:
+                    print(f"Embedding recommendations for {len(recommendations)} users "
+                          f"({time.perf_counter() - start:.1f}s)")
+
+            # All Kinopoisk requests of the run happen here, per-user selection is in-memory
+            pool_users = [user for user in users if user.id not in recommendations]
+            pools = CandidatePools()
+            if pool_users:
+                async with kp_utils.AsyncKpClient(limiter=kp_background_limiter) as client:
+                    # Only the engine scores every similar movie, a random pick fetches just the picked ones
+                    pools = await build_candidate_pools(
+                        client, pool_users, concurrency=self._workers, load_similar=self._mode == "engine"
+                    )
+                    if self._mode == "random":
+                        recommendations = {user.id: self._pick_random(pools, user) for user in pool_users}
+                        await self._load_picked_movies(client, pools, recommendations)
+                if self._show_logs:
+                    print(f"Candidate pools: {len(pools.movies)} movies, {len(pools.by_genre)} genres, "
+                          f"{len(pools.by_person)} persons, {len(pools.by_movie)} movies with similar ones "
+                          f"({time.perf_counter() - start:.1f}s)")
+
+            if self._mode == "engine" and pool_users:
+                # Top-k for every user in one vectorized pass
+                recommendations = RecommenderEngine(pools).fit(pool_users).recommend(self._limit)
+
+            if self._message_mode == "llm":
+                queue: asyncio.Queue[UserSchema] = asyncio.Queue()
+                for user in users:
+                    queue.put_nowait(user)
+                await asyncio.gather(*(worker(queue) for _ in range(min(self._workers, len(users)))))
             else:
-                watched_movies = [
-                    i.kp_id
-                    for i in user.preferences
-                    if i.preference_item == PreferenceItem.MOVIE
-                ]
-                rec_docs, source_prefs = self._get_personalized_movies_recommendation(
-                    positive_prefs, watched_movies
-                )
-                if not rec_docs:
-                    rec_docs = self._get_popular_movies_recommendation()
-
-            if self._show_logs:
-                print(f"Made up {len(rec_docs)} recommendations for user {user.tg_chat_id}.")
-
-            answer = self._prepare_answer(rec_docs, source_prefs)
-
-            if self._show_logs:
-                print(f"Answer for user {user.tg_chat_id}:\n{answer}")
-                print("-------------------")
-
-            await bot.send_message(user.tg_chat_id, answer)
-
-        return
+                async def on_result(message: BroadcastMessage, status: DeliveryStatus) -> None:
+                    if status == DeliveryStatus.FAILED:
+                        user_failed(message.key, RuntimeError("Message was not delivered"))
+                    else:
+                        await user_done(message.key)
+
+                # Batches keep the checkpoint granular: a batch is generated at once, then sent
+                for batch_start in range(0, len(users), self._batch_size):
+                    selected = []
+                    for user in users[batch_start:batch_start + self._batch_size]:
+                        try:
+                            selection = self._select_recommendations(pools, user, recommendations.get(user.id))
+                        except kp_utils.KpApiError as e:
+                            user_failed(user, e)
+                            continue
+                        if selection[0]:
+                            selected.append((user, selection))
+                        else:
+                            await user_done(user)  # nothing to recommend
+                    generated = await self._prepare_answers([selection for _, selection in selected])
+
+                    messages = []
+                    for (user, _), answer in zip(selected, generated):
+                        if isinstance(answer, Exception):
+                            user_failed(user, answer)
+                            continue
+                        if self._show_logs:
+                            print(f"Answer for user {user.tg_chat_id}:\n{answer}")
+                            print("-------------------")
+                        messages.append(BroadcastMessage(user.tg_chat_id, answer, key=user))
+
+                    stats.add(await sender.broadcast(messages, on_result, workers=self._workers))
+        except Exception:
+            if run:
+                await crud.task_run.finish(session, run.id, TaskRunStatus.FAILED, failed)
+            raise
+
+        elapsed = time.perf_counter() - start
+
+        if run:
+            await crud.task_run.finish(
+                session, run.id, TaskRunStatus.PARTIAL if failed else TaskRunStatus.DONE, failed
+            )
+
+        throughput = processed / elapsed * 60 if elapsed else 0.0
+        USERS_PER_MINUTE.set(throughput, task=self._name)
+        if self._show_logs or tg_user_id is None:
+            print(f"{run_name}: processed {processed} users, failed {failed}, "
+                  f"{elapsed:.1f}s, {throughput:.1f} users/min")
+            print(f"{run_name}: delivered {stats.delivered}, blocked {stats.blocked}, "
+                  f"failed {stats.failed}, throttled {stats.throttled}")
+
+        return not failed
 
     async def ainvoke(self, *args, **kwargs):
         return await self._ainvoke(*args, **kwargs)
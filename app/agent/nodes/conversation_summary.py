@@ -0,0 +1,103 @@
+import time
+from typing import Sequence
+
+from langchain_core.output_parsers import StrOutputParser, BaseOutputParser
+from langchain_core.language_models import BaseChatModel
+from langchain_core.prompts import PromptTemplate
+
+from app.agent.nodes.prompt_budget import count_tokens, truncate_tokens
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.message import MessageType
+from app.schemas.message import Message
+
+
+SUMMARY_LATENCY = registry.histogram(
+    "conversation_summary_latency_seconds", "Latency of a conversation summary update"
+)
+SUMMARY_MESSAGES = registry.counter(
+    "conversation_summary_messages_total", "Messages folded into conversation summaries"
+)
+
+
+CONVERSATION_SUMMARY_PROMPT_TEMPLATE = """
+## System
+Ты ведёшь краткое содержание диалога пользователя с ассистентом по фильмам, сериалам и людям из киноиндустрии.
+
+## Твоя задача
+Тебе приходит текущее краткое содержание SUMMARY и сообщения MESSAGES, которые в него ещё не вошли.
+Дополни SUMMARY этими сообщениями и верни обновлённое краткое содержание целиком.
+Сохрани то, что может понадобиться в следующих ответах: о каких фильмах, сериалах и людях шла речь, что спрашивал
+пользователь, что ему уже посоветовали или рассказали, что ему понравилось или не понравилось.
+Старое и уже неважное сокращай. Пиши кратко, без вступлений, не больше {max_words} слов.
+
+## SUMMARY
+{summary}
+
+## MESSAGES
+{messages}
+
+## Обновлённое краткое содержание:
+"""
+
+ROLE_NAMES = {MessageType.HUMAN: "user", MessageType.AI: "assistant"}
+
+
+class ConversationSummarizer:
+    """
+    Краткое содержание диалога для промптов.
+
+    split() делит ещё не вошедшие в краткое содержание сообщения на окно последних, которое помещается
+    в window_tokens и передаётся в промпт как есть, и более старые, которые aupdate() добавляет в краткое содержание.
+    """
+
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        prompt: str = CONVERSATION_SUMMARY_PROMPT_TEMPLATE,
+        parser: BaseOutputParser = StrOutputParser(),
+        name: str = "ConversationSummarizer",
+        max_tokens: int = settings.CONVERSATION_SUMMARY_MAX_TOKENS,
+        window_tokens: int = settings.HISTORY_WINDOW_TOKENS,
+        show_logs: bool = False,
+    ):
+        self._chain = PromptTemplate.from_template(prompt) | llm | parser
+        self._name = name
+        self._max_tokens = max_tokens
+        self._window_tokens = window_tokens
+        self._show_logs = show_logs
+
+    @staticmethod
+    def _format(message: Message) -> str:
+        return f"{ROLE_NAMES.get(message.message_type, message.message_type.value)}: {message.content}"
+
+    def split(self, messages: Sequence[Message], min_recent: int = 1) -> tuple[list[Message], list[Message]]:
+        """:return: (сообщения для краткого содержания, окно последних сообщений, не меньше min_recent)"""
+        budget = self._window_tokens
+        start = len(messages)
+        while start > 0:
+            tokens = count_tokens(self._format(messages[start - 1]))
+            if tokens > budget and len(messages) - start >= min_recent:
+                break
+            budget -= tokens
+            start -= 1
+        return list(messages[:start]), list(messages[start:])
+
+    async def aupdate(self, summary: str, messages: Sequence[Message]) -> str:
+        start = time.perf_counter()
+        content = await self._chain.ainvoke({
+            "summary": summary or "(пусто)",
+            "messages": "\n".join(self._format(message) for message in messages),
+            # Cyrillic words are about two tokens
+            "max_words": self._max_tokens // 2,
+        })
+        SUMMARY_LATENCY.observe(time.perf_counter() - start)
+        SUMMARY_MESSAGES.inc(len(messages))
+        content = truncate_tokens(content.strip(), self._max_tokens)
+
+        if self._show_logs:
+            print(f"---{self._name}---")
+            print(f"{len(messages)} messages folded, {count_tokens(content)} tokens")
+            print(content)
+            print("-------------------")
+        return content
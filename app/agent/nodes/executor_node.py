@@ -10,7 +10,15 @@ from app.agent.nodes.planner_node import AgentTaskList, AgentTask
 from app.agent.nodes._base_api_tool import BaseApiTool
 from app.agent.nodes.people_search import PeopleSearch
 from app.agent.nodes._base_node import BaseNode
+from app.agent.nodes.prompt_budget import PromptBudget, PromptSection
 from app.agent.graph.state import AgentState
+from app.core.config import settings
+from app.core.metrics import registry
+
+
+PLAN_TASKS = registry.counter(
+    "agent_plan_tasks_total", "Plan tasks executed, by the agent (tool) they were given to", ("agent",)
+)
 
 
 EXECUTOR_PROMPT_TEMPLATE = """
@@ -19,8 +27,11 @@ EXECUTOR_PROMPT_TEMPLATE = """
 
 ## Твоя задача
 Тебе на вход приходит история диалога пользователя и ассистента HISTORY. Последние сообщения пользователя актуальнее.
+Строка summary в начале HISTORY, если есть, — краткое содержание более раннего диалога.
 Также ты получаешь собранную информацию из баз данных COLLECTED_INFO, которую нужно использовать для ответа на вопрос, который
 интересует пользователя.
+Ответы инструментов в COLLECTED_INFO бывают готовым текстом или сырыми данными (факты о фильмах, JSON, текст из Википедии)
+после строки «<инструмент> — <вопрос>». По сырым данным ответ на вопрос формулируешь ты.
 
 Старайся дать более развернутый ответ. Ничего не придумывай
 
@@ -41,9 +52,12 @@ class ExecutorNode(BaseNode):
         parser: BaseOutputParser = StrOutputParser(),
         name="ExecutorNode",
         description="Выполняет все тулы, согласно плану",
+        max_tokens: int = settings.PROMPT_BUDGET_EXECUTOR,
         show_logs: bool = False,
     ):
         super().__init__(llm, prompt, parser, name, description, show_logs)
+        self._prompt = prompt
+        self._budget = PromptBudget(name, max_tokens, show_logs)
         self.executors = executors
         self._name_to_executor = {executor._name: executor for executor in executors}
 
@@ -60,6 +74,7 @@ class ExecutorNode(BaseNode):
 
             # TODO: add search of closest executor name
             executor = self._name_to_executor[task.agent]
+            PLAN_TASKS.inc(agent=task.agent)
 
             collected_info.append(
                 executor.invoke(
@@ -69,18 +84,28 @@ class ExecutorNode(BaseNode):
                 )
             )
 
+        # Old messages go first, then the summary and the tool outputs are cut; preferences are kept
+        prompt = self._budget.fit(
+            [
+                PromptSection("history", self._history_to_lines(state.history), priority=0, min_tokens=300,
+                              shrink="drop", keep="tail", separator="\n"),
+                PromptSection("summary", [self._summary_to_line(state.summary)], priority=1),
+                PromptSection("tools", collected_info[1:], priority=1, min_tokens=500, shrink="even", separator="\n"),
+                PromptSection("preferences", collected_info[:1], priority=2, shrink="none"),
+            ],
+            fixed=self._prompt,
+        )
+        collected_info = self._format_collected_info_for_prompt([prompt["preferences"], prompt["tools"]])
         answer = self._chain.invoke(
             {
-                "history": self._history_to_str(state.history),
-                "collected_info": self._format_collected_info_for_prompt(
-                    collected_info
-                ),
+                "history": "\n".join(filter(None, [prompt["summary"], prompt["history"]])),
+                "collected_info": collected_info,
             }
         )
 
         if self._show_logs:
             print(f"---{self._name}---")
-            print(self._format_collected_info_for_prompt(collected_info))
+            print(collected_info)
             print(answer)
             print("-------------------")
 
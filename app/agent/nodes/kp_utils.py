@@ -1,16 +1,34 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator
+from urllib.parse import urlsplit
+
 import requests
-import wikipedia
-wikipedia.set_lang("ru")
+import aiohttp
 
+from app.core import tracing
 from app.core.config import settings
+from app.core.metrics import registry
+from app.core.rate_limit import AsyncTokenBucket
+from . import wiki_utils
+from .movie import Movie
 
 
-BASE_URL = "https://api.kinopoisk.dev/v1.4"
+BASE_URL = settings.KP_BASE_URL.rstrip("/")
 MOVIE_SEARCH_URL = BASE_URL + "/movie"
 MOVIE_SEARCH_BY_NAME_URL = BASE_URL + "/movie/search"
 PERSON_SEARCH_BY_NAME_URL = BASE_URL + "/person/search"
 REVIEW_SEARCH_URL = BASE_URL + "/review"
 
+MAX_PAGE_LIMIT = 250
+
+KP_LATENCY = registry.histogram(
+    "kinopoisk_request_latency_seconds", "Kinopoisk API request latency by endpoint", ("endpoint",)
+)
+KP_REQUESTS = registry.counter(
+    "kinopoisk_requests_total", "Kinopoisk API requests by endpoint and HTTP status", ("endpoint", "status")
+)
+
 
 HEADERS = {
             "accept": "application/json",
@@ -18,99 +36,105 @@ HEADERS = {
         }
 
 
+def to_query_params(params: dict | None) -> list[tuple[str, str]]:
+    """Раскрывает списки в повторяющиеся параметры, как это делает requests"""
+    query = []
+    for key, value in (params or {}).items():
+        values = value if isinstance(value, (list, tuple)) else [value]
+        for v in values:
+            if isinstance(v, bool):
+                v = str(v).lower()
+            query.append((key, str(v)))
+    return query
+
+
+@contextmanager
+def _observe_request(url: str) -> Iterator[tracing.Span]:
+    """Span и метрики запроса, статус берётся из атрибута http.response.status_code span-а"""
+    endpoint = url.removeprefix(BASE_URL)
+    attributes = {"http.request.method": "GET", "server.address": urlsplit(BASE_URL).hostname, "kp.endpoint": endpoint}
+    start = time.perf_counter()
+    with tracing.span(f"kinopoisk {endpoint}", attributes, kind="CLIENT") as span:
+        try:
+            yield span
+        finally:
+            KP_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+            KP_REQUESTS.inc(endpoint=endpoint, status=span.attributes.get("http.response.status_code", "error"))
+
+
+def kp_get(url: str, params: dict | None = None) -> requests.Response:
+    """GET-запрос к API Кинопоиска с трассировкой и метриками"""
+    with _observe_request(url) as span:
+        response = requests.get(url, params=params, headers=HEADERS)
+        span.set_attribute("http.response.status_code", response.status_code)
+        return response
+
+
+class KpApiError(Exception):
+    """API Кинопоиска недоступно: ошибка сети, таймаут или ответ с кодом ошибки"""
+
+
+class AsyncKpClient:
+    """Асинхронный клиент API Кинопоиска на aiohttp"""
+
+    def __init__(self, timeout: float = 30.0, limiter: AsyncTokenBucket | None = None):
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._limiter = limiter
+        self._session: aiohttp.ClientSession | None = None
+
+    async def __aenter__(self) -> "AsyncKpClient":
+        self._session = aiohttp.ClientSession(headers=HEADERS, timeout=self._timeout)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._session.close()
+        self._session = None
+
+    async def get(self, url: str, params: dict | None = None) -> dict | None:
+        """
+        :return: JSON ответа или None, если ресурс не найден
+        :raises KpApiError: если API не ответило, чтобы сбой не выглядел как пустой результат
+        """
+        if self._limiter:
+            await self._limiter.acquire()
+        with _observe_request(url) as span:
+            try:
+                async with self._session.get(url, params=to_query_params(params)) as response:
+                    span.set_attribute("http.response.status_code", response.status)
+                    if response.status == 404:
+                        return None
+                    if not response.ok:
+                        raise KpApiError(f"{url}: HTTP {response.status}")
+                    return await response.json()
+            except (aiohttp.ClientError, TimeoutError) as e:
+                span.record_exception(e)
+                raise KpApiError(f"{url}: {e!r}") from e
+
+
 def transform_movie_data(movie_json: dict) -> str:
+    """Описание фильма для промпта, см. Movie.render"""
+    return Movie.from_kp(movie_json).render()
+
 
-    name = movie_json.get("name", "Unknown Title")
-    year = movie_json.get("year", "Unknown Year")
-    description = movie_json.get("description", "No description available.")
-    movie_type = movie_json.get("type", "Unknown type")
-    is_series = movie_json.get("isSeries", False)
-    movie_length = movie_json.get("movieLength", "Unknown length")
-    series_length = movie_json.get("seriesLength", "N/A")
-    total_series_length = movie_json.get("totalSeriesLength", "N/A")
-    mpaa_rating = movie_json.get("ratingMpaa", "No MPAA rating")
-    genres = ", ".join([genre["name"] for genre in movie_json.get("genres", [])])
-    countries = ", ".join([country["name"] for country in movie_json.get("countries", [])])
-
-    rating_data = movie_json.get("rating", {})
-    kp_rating = rating_data.get("kp", "N/A")
-    imdb_rating = rating_data.get("imdb", "N/A")
-    critics_rating = rating_data.get("filmCritics", "N/A")
-    russian_critics_rating = rating_data.get("russianFilmCritics", "N/A")
-    await_rating = rating_data.get("await", "N/A")
-
-    votes_data = movie_json.get("votes", {})
-    kp_votes = votes_data.get("kp", "N/A")
-    imdb_votes = votes_data.get("imdb", "N/A")
-    critics_votes = votes_data.get("filmCritics", "N/A")
-
-    if is_series:
-        length_info = f"Episode Length: {series_length} minutes | Total Series Length: {total_series_length if total_series_length != 'N/A' else 'N/A'}"
-    else:
-        length_info = f"Duration: {movie_length} minutes"
-
-    output = f"""
-    Title: {name}
-    Year: {year}
-    Type: {movie_type.capitalize()}
-    Country: {countries}
-    Genres: {genres}
-    {length_info}
-    MPAA Rating: {mpaa_rating}
-
-    Description: {description}
-
-    Ratings:
-    - Kinopoisk: {kp_rating} ({kp_votes} votes)
-    - IMDb: {imdb_rating} ({imdb_votes} votes)
-    - Film Critics: {critics_rating} ({critics_votes} votes)
-    - Russian Film Critics: {russian_critics_rating} / 100
-    - Awaiting Audience Rating: {await_rating}
+def get_person_info_from_wiki(
+    name: str,
+    question: str | None = None,
+    return_summary: bool = False,
+    kp_id: int | None = None,
+) -> str | None:
     """
+    Информация о человеке из Википедии: сначала из локального хранилища статей, затем из сети.
 
-    return output.strip()
-
-WIKI_SEARCH_KEYWORDS = (
-        "актёр",
-        "актер",
-        "актриса",
-        "режиссер",
-        "режиссёр",
-        "сценарист",
-        "продюсер",
-        "оператор",
-        "композитор",
-        "художник-постановщик",
-        "гримёр",
-        "костюмер",
-        "звукорежиссёр",
-        "монтажёр",
-        "каскадёр",
-        "хореограф",
-        "дубляж",
-        "театр",
-        "кино",
-        "мульт",
-        "аниме",
-        "сериал",
-    )
-
-def get_person_info_from_wiki(name: str, return_summary: bool = False) -> str | None:
-
-    search_res = wikipedia.search(name, results=3)
-    for r in search_res:
-        page = wikipedia.page(r)
-        for kw in WIKI_SEARCH_KEYWORDS:
-            if page.summary.find(kw) != -1:
-                break
-        else:
-            continue
-        break
-    else:
+    Если передан вопрос, возвращаются только вводная часть и разделы страницы, относящиеся к вопросу.
+    """
+    page = wiki_utils.find_person_page(name, kp_id)
+    if page is None:
         return None  # Персона не найдена или не относится к киноиндустрии
-    
+
     if return_summary:
         return page.summary
+    if question:
+        return wiki_utils.select_sections(page, question)
     return page.content
 
 
@@ -203,11 +227,7 @@ class InferKpId:
             "limit": 1,
             "query": item_name,
         }
-        api_response = requests.get(
-            MOVIE_SEARCH_BY_NAME_URL,
-            params=params,
-            headers=HEADERS,
-        )
+        api_response = kp_get(MOVIE_SEARCH_BY_NAME_URL, params)
         if not api_response.ok:
             return None
         data_json = api_response.json()
@@ -224,11 +244,7 @@ class InferKpId:
             "limit": 1,
             "query": item_name,
         }
-        api_response = requests.get(
-            PERSON_SEARCH_BY_NAME_URL,
-            params=params,
-            headers=HEADERS,
-        )
+        api_response = kp_get(PERSON_SEARCH_BY_NAME_URL, params)
         if not api_response.ok:
             return None
         data_json = api_response.json()
@@ -0,0 +1,173 @@
+from dataclasses import dataclass, field, fields
+
+
+def _number(value) -> float | None:
+    # Kinopoisk uses 0 for "no rating yet"
+    return value or None
+
+
+def _format_rating(value: float) -> str:
+    return f"{value:.1f}".removesuffix(".0")
+
+
+@dataclass(slots=True)
+class Movie:
+    """
+    Фильм или сериал из API Кинопоиска, разобранный один раз из JSON.
+
+    render() — описание для промпта без пустых полей, render_short() — одна строка для списков.
+    Оба результата кэшируются в объекте.
+    """
+    id: int
+    name: str
+    en_name: str | None = None
+    year: int | None = None
+    type: str | None = None
+    is_series: bool = False
+    countries: tuple[str, ...] = ()
+    genres: tuple[str, ...] = ()
+    movie_length: int | None = None
+    series_length: int | None = None
+    total_series_length: int | None = None
+    mpaa: str | None = None
+    description: str | None = None
+    short_description: str | None = None
+    rating_kp: float | None = None
+    rating_imdb: float | None = None
+    rating_critics: float | None = None
+    rating_russian_critics: float | None = None
+    rating_await: float | None = None
+    votes_kp: int | None = None
+    votes_imdb: int | None = None
+    votes_critics: int | None = None
+    _rendered: str | None = field(default=None, init=False, repr=False, compare=False)
+    _rendered_short: str | None = field(default=None, init=False, repr=False, compare=False)
+
+    @classmethod
+    def from_kp(cls, movie_json: dict) -> "Movie":
+        rating = movie_json.get("rating") or {}
+        votes = movie_json.get("votes") or {}
+        return cls(
+            id=movie_json.get("id"),
+            name=movie_json.get("name") or movie_json.get("enName") or movie_json.get("alternativeName") or "Unknown Title",
+            en_name=movie_json.get("enName") or None,
+            year=movie_json.get("year") or None,
+            type=movie_json.get("type") or None,
+            is_series=bool(movie_json.get("isSeries")),
+            countries=tuple(country["name"] for country in movie_json.get("countries") or []),
+            genres=tuple(genre["name"] for genre in movie_json.get("genres") or []),
+            movie_length=movie_json.get("movieLength") or None,
+            series_length=movie_json.get("seriesLength") or None,
+            total_series_length=movie_json.get("totalSeriesLength") or None,
+            mpaa=movie_json.get("ratingMpaa") or None,
+            description=movie_json.get("description") or None,
+            short_description=movie_json.get("shortDescription") or None,
+            rating_kp=_number(rating.get("kp")),
+            rating_imdb=_number(rating.get("imdb")),
+            rating_critics=_number(rating.get("filmCritics")),
+            rating_russian_critics=_number(rating.get("russianFilmCritics")),
+            rating_await=_number(rating.get("await")),
+            votes_kp=_number(votes.get("kp")),
+            votes_imdb=_number(votes.get("imdb")),
+            votes_critics=_number(votes.get("filmCritics")),
+        )
+
+    def to_chroma(self) -> dict[str, str | int | float | bool]:
+        """Метаданные для Chroma: только скалярные значения, пустые поля не сохраняются"""
+        metadata = {"kp_id": self.id, "movie_name": self.name}
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if f.name in ("id", "name") or f.name.startswith("_") or value in (None, (), ""):
+                continue
+            metadata[f.name] = ", ".join(value) if isinstance(value, tuple) else value
+        return metadata
+
+    @classmethod
+    def from_chroma(cls, metadata: dict) -> "Movie":
+        values = {f.name: metadata[f.name] for f in fields(cls) if f.init and f.name in metadata}
+        for name in ("countries", "genres"):
+            if name in values:
+                values[name] = tuple(values[name].split(", "))
+        return cls(id=metadata["kp_id"], name=metadata["movie_name"], **values)
+
+    def _title(self) -> str:
+        details = ", ".join(str(value) for value in (self.en_name, self.year) if value)
+        return f"{self.name} ({details})" if details else self.name
+
+    def _ratings(self, short: bool = False) -> str:
+        ratings = []
+        for label, value, votes in (
+            ("Kinopoisk", self.rating_kp, self.votes_kp),
+            ("IMDb", self.rating_imdb, self.votes_imdb),
+            ("Film Critics", self.rating_critics, self.votes_critics),
+        ):
+            if value:
+                ratings.append(f"{label} {_format_rating(value)}" + (f" ({votes} votes)" if votes and not short else ""))
+        if short:
+            return ", ".join(ratings[:2])
+        if self.rating_russian_critics:
+            ratings.append(f"Russian Film Critics {self.rating_russian_critics:.0f}/100")
+        if self.rating_await:
+            ratings.append(f"Awaiting Audience {self.rating_await:.0f}%")
+        return ", ".join(ratings)
+
+    def render(self) -> str:
+        if self._rendered is None:
+            if self.is_series:
+                length = " | ".join(filter(None, (
+                    self.series_length and f"Episode: {self.series_length} min",
+                    self.total_series_length and f"Total: {self.total_series_length} min",
+                )))
+            else:
+                length = self.movie_length and f"Duration: {self.movie_length} min"
+            details = " | ".join(filter(None, (
+                self.type and f"Type: {self.type}",
+                self.countries and f"Country: {', '.join(self.countries)}",
+                self.genres and f"Genres: {', '.join(self.genres)}",
+                length,
+                self.mpaa and f"MPAA: {self.mpaa}",
+            )))
+            ratings = self._ratings()
+            self._rendered = "\n".join(filter(None, (
+                f"Title: {self._title()}",
+                details,
+                ratings and f"Ratings: {ratings}",
+                self.description and f"Description: {self.description}",
+            )))
+        return self._rendered
+
+    def render_short(self) -> str:
+        if self._rendered_short is None:
+            parts = [self._title(), ", ".join(self.genres[:3]), self._ratings(short=True)]
+            self._rendered_short = " — ".join(filter(None, parts))
+            if self.short_description:
+                self._rendered_short += f". {self.short_description}"
+        return self._rendered_short
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+    import tracemalloc
+
+    from app.agent.nodes.prompt_budget import count_tokens
+
+    # python -m app.agent.nodes.movie docs.json — a Kinopoisk /movie response
+    with open(sys.argv[1], encoding="utf-8") as f:
+        docs = json.load(f)["docs"]
+
+    text = json.dumps(docs)
+    tracemalloc.start()
+    raw = json.loads(text)
+    raw_size = tracemalloc.get_traced_memory()[0]
+    del raw
+    # Only the values referenced by the records stay in memory
+    movies = [Movie.from_kp(doc) for doc in json.loads(text)]
+    movies_size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"Memory per movie: JSON {raw_size / len(docs):.0f} B, Movie {movies_size / len(docs):.0f} B")
+    print(f"Tokens per movie: render {sum(count_tokens(m.render()) for m in movies) / len(movies):.0f}, "
+          f"render_short {sum(count_tokens(m.render_short()) for m in movies) / len(movies):.0f}")
+    print(movies[0].render())
+    print(movies[0].render_short())
@@ -1,5 +1,4 @@
 from pathlib import Path
-import requests
 import os
 import copy
 
@@ -9,6 +8,8 @@ from langchain_core.prompts import PromptTemplate
 from dotenv import load_dotenv
 
 from app.agent.nodes._base_api_tool import BaseApiTool
+from app.agent.nodes.prompt_budget import PromptBudget, PromptSection
+from app.core.config import settings
 from . import kp_utils
 
 
@@ -52,6 +53,8 @@ class MovieReviewsSummarizer(BaseApiTool):
         show_logs: bool = False,
     ):
         self._answer_chain = PromptTemplate.from_template(answer_prompt) | llm | answer_parser
+        self._answer_prompt = answer_prompt
+        self._budget = PromptBudget(name, settings.PROMPT_BUDGET_TOOL, show_logs)
         self._description = description
         self._name = name
         self._limit = limit
@@ -74,11 +77,16 @@ class MovieReviewsSummarizer(BaseApiTool):
             "sortType": "-1",
             #"selectFields": ["reviewLikes", "review"]
         }
-        review_api_response = requests.get(kp_utils.REVIEW_SEARCH_URL, params=review_search_params, headers=kp_utils.HEADERS)
+        review_api_response = kp_utils.kp_get(kp_utils.REVIEW_SEARCH_URL, review_search_params)
         if not review_api_response.ok:
             return "Произошла ошибка при обращении к API"
         movie_reviews = sorted(review_api_response.json()["docs"], key=lambda x: x['userRating'], reverse=True)
-        movie_reviews = "\n\n---\n\n".join([i['review'] for i in movie_reviews[:self._limit]])
+        # Long reviews are cut evenly so that every opinion gets into the summary
+        movie_reviews = self._budget.fit(
+            [PromptSection("reviews", [i['review'] for i in movie_reviews[:self._limit]], shrink="even",
+                           separator="\n\n---\n\n")],
+            fixed=self._answer_prompt + movie_name,
+        )["reviews"]
 
         answer = self._answer_chain.invoke({"movie_name": movie_name, "reviews": movie_reviews})
 
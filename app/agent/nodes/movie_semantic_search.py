@@ -1,15 +1,23 @@
 from pathlib import Path
+from typing import Literal
+
 from dotenv import load_dotenv
 
-from app.core.index_db import collection
+from app.core.config import settings
+from app.core.index_db import collection, observe
 from app.agent.nodes.planner_node import MOVIES_SEARCH_FIELDS as OUTPUT_FIELDS
 from app.agent.nodes._base_api_tool import BaseApiTool
+from app.agent.nodes.movie import Movie
 
 
 load_dotenv(Path(__file__).parent.parent.parent.parent.resolve() / ".env")
 
 
 class MovieSemanticSearch(BaseApiTool):
+    """
+    Поиск фильма по описанию в индексе. Отдельного LLM-ответа у тула нет: в режиме llm возвращаются данные
+    найденного фильма, в режиме raw они идут с заголовком вопроса, как у остальных тулов
+    """
 
     def __init__(
         self,
@@ -17,11 +25,13 @@ class MovieSemanticSearch(BaseApiTool):
         description = "Осуществляет семантический поиск по содержанию фильмов и возвращает информацию о них",
         distance_thr = 0.9,
         show_logs: bool = False,
+        answer_mode: Literal["llm", "raw"] | None = None,
     ):  
         self._name = name
         self._description = description
         self._distance_thr = distance_thr
         self._show_logs = show_logs
+        self._answer_mode = answer_mode or settings.TOOL_ANSWER_MODES.get(name, settings.TOOL_ANSWER_MODE)
 
 
     def _invoke(self, question: str, collected_info: str, *args, **kwargs) -> str:
@@ -30,11 +40,17 @@ class MovieSemanticSearch(BaseApiTool):
             print(f"---{self._name}---")
             print(question)
 
-        response = collection.query(query_texts=question, n_results=1)
-        if response['distances'][0][0] > self._distance_thr:
+        with observe("query", n_results=1) as span:
+            response = collection.query(query_texts=question, n_results=1)
+            if response['distances'][0]:
+                span.set_attribute("chroma.distance", response['distances'][0][0])
+        # An empty index (e.g. the in-memory one of a worker process) finds nothing
+        if not response['distances'][0] or response['distances'][0][0] > self._distance_thr:
             answer = "К сожалению, я не могу найти информацию по вашему запросу"
         else:
-            answer = response['metadatas'][0][0]['movie_data']
+            answer = Movie.from_chroma(response['metadatas'][0][0]).render()
+            if self._answer_mode == "raw":
+                answer = self._raw_answer(question, answer)
         if self._show_logs:
             print(answer)
             print("-------------------")
@@ -1,5 +1,5 @@
 from pathlib import Path
-import requests
+from typing import Literal
 import os
 import copy
 
@@ -8,11 +8,14 @@ from langchain_core.output_parsers import (
     BaseOutputParser,
     JsonOutputParser,
 )
+from langchain_core.exceptions import OutputParserException
 from langchain_core.language_models import BaseChatModel
 from dotenv import load_dotenv
 
 from app.agent.nodes.planner_node import MOVIES_SEARCH_FIELDS as OUTPUT_FIELDS
 from app.agent.nodes._base_api_tool import BaseApiTool
+from app.agent.nodes.movie import Movie
+from app.agent.nodes.prompt_budget import PromptSection
 from . import kp_utils
 
 
@@ -247,22 +250,10 @@ COLLECTED_INFO:
 
 INFO:
 ```text
-Title: Гладиатор 2
-Year: 2024
-Type: Movie
-Country: Великобритания, США, Марокко, Канада, Мальта
-Genres: боевик, драма, приключения, история
-Duration: 148 minutes
-MPAA Rating: r
-
+Title: Гладиатор 2 (2024)
+Type: movie | Country: Великобритания, США, Марокко, Канада, Мальта | Genres: боевик, драма, приключения, история | Duration: 148 min | MPAA: r
+Ratings: Kinopoisk 6.3 (38657 votes), IMDb 6.7 (144924 votes), Film Critics 6.6 (373 votes), Russian Film Critics 75/100
 Description: 200 год нашей эры. Армия Римской империи под командованием генерала Марка Акация штурмует Нумидию — последнее свободное государство в Северной Африке. В битве с захватчиками у воина Ханно погибает супруга-лучница, а сам он попадает в плен. Вместе с другими пленникам его готовятся продать в рабство, но благодаря физической выносливости и боевым навыкам его замечает и покупает организатор гладиаторских боёв Макрин. Так воин становится гладиатором, одержимым жаждой мести римскому полководцу. Макрин обещает Ханно устроить встречу с его заклятым врагом, если парень будет эффектно, красочно и яростно сражаться на арене Колизея.
-
-Ratings:
-- Kinopoisk: 6.321 (38657 votes)
-- IMDb: 6.7 (144924 votes)
-- Film Critics: 6.6 (373 votes)
-- Russian Film Critics: 75
-- Awaiting Audience Rating: None
 ```
 
 Твой ответ:
@@ -275,98 +266,38 @@ COLLECTED_INFO:
 
 INFO:
 ```text
-Title: Джентльмены
-    Year: 2019
-    Type: Movie
-    Country: США, Великобритания, Франция, Япония, Чехия
-    Genres: криминал, комедия, боевик
-    Duration: 113 minutes
-    MPAA Rating: r
-
-    Description: Один ушлый американец ещё со студенческих лет приторговывал наркотиками, а теперь придумал схему нелегального обогащения с использованием поместий обедневшей английской аристократии и очень неплохо на этом разбогател. Другой пронырливый журналист приходит к Рэю, правой руке американца, и предлагает тому купить киносценарий, в котором подробно описаны преступления его босса при участии других представителей лондонского криминального мира — партнёра-еврея, китайской диаспоры, чернокожих спортсменов и даже русского олигарха.
-
-    Ratings:
-    - Kinopoisk: 8.616 (2084762 votes)
-    - IMDb: 7.8 (422433 votes)
-    - Film Critics: 6.6 (278 votes)
-    - Russian Film Critics: 86.3636
-    - Awaiting Audience Rating: None
+Title: Джентльмены (2019)
+Type: movie | Country: США, Великобритания, Франция, Япония, Чехия | Genres: криминал, комедия, боевик | Duration: 113 min | MPAA: r
+Ratings: Kinopoisk 8.6 (2084762 votes), IMDb 7.8 (422433 votes), Film Critics 6.6 (278 votes), Russian Film Critics 86/100
+Description: Один ушлый американец ещё со студенческих лет приторговывал наркотиками, а теперь придумал схему нелегального обогащения с использованием поместий обедневшей английской аристократии и очень неплохо на этом разбогател. Другой пронырливый журналист приходит к Рэю, правой руке американца, и предлагает тому купить киносценарий, в котором подробно описаны преступления его босса при участии других представителей лондонского криминального мира — партнёра-еврея, китайской диаспоры, чернокожих спортсменов и даже русского олигарха.
 
 ---
 
-Title: 1917
-    Year: 2019
-    Type: Movie
-    Country: Великобритания, США, Индия, Испания
-    Genres: военный, боевик, драма, история
-    Duration: 119 minutes
-    MPAA Rating: r
-
-    Description: 6 апреля 1917 года, разгар Первой мировой войны, Западный фронт на севере Франции. Британский генерал поручает капралу Блэйку и его сослуживцу смертельно опасную миссию. Они должны пересечь вражескую территорию, вроде бы оставленную германскими войсками, и доставить приказ об отмене наступления во 2-й батальон Девонширского полка, иначе 1600 солдат попадут в ловушку противника, в том числе и брат Блэйка.
-
-    Ratings:
-    - Kinopoisk: 7.928 (202015 votes)
-    - IMDb: 8.2 (708538 votes)
-    - Film Critics: 8.3 (472 votes)
-    - Russian Film Critics: 62.5
-    - Awaiting Audience Rating: None
+Title: 1917 (2019)
+Type: movie | Country: Великобритания, США, Индия, Испания | Genres: военный, боевик, драма, история | Duration: 119 min | MPAA: r
+Ratings: Kinopoisk 7.9 (202015 votes), IMDb 8.2 (708538 votes), Film Critics 8.3 (472 votes), Russian Film Critics 62/100
+Description: 6 апреля 1917 года, разгар Первой мировой войны, Западный фронт на севере Франции. Британский генерал поручает капралу Блэйку и его сослуживцу смертельно опасную миссию. Они должны пересечь вражескую территорию, вроде бы оставленную германскими войсками, и доставить приказ об отмене наступления во 2-й батальон Девонширского полка, иначе 1600 солдат попадут в ловушку противника, в том числе и брат Блэйка.
 
 ---
 
-Title: Переводчик
-    Year: 2022
-    Type: Movie
-    Country: Великобритания, Испания, США
-    Genres: боевик, триллер, военный, история, драма
-    Duration: 123 minutes
-    MPAA Rating: r
-
-    Description: Афганистан, март 2018 года. Во время спецоперации по поиску оружия талибов отряд сержанта армии США Джона Кинли попадает в засаду. В живых остаются только сам Джон, получивший ранение, и местный переводчик Ахмед, который сотрудничает с американцами. Очнувшись на родине, Кинли не помнит, как ему удалось выжить, но понимает, что именно Ахмед спас ему жизнь, протащив на себе через опасную территорию. Теперь чувство вины не даёт Джону покоя, и он решает вернуться за Ахмедом и его семьёй, которых в Афганистане усиленно ищут талибы.
-
-    Ratings:
-    - Kinopoisk: 7.886 (1022683 votes)
-    - IMDb: 7.5 (181824 votes)
-    - Film Critics: 6.8 (118 votes)
-    - Russian Film Critics: 75
-    - Awaiting Audience Rating: None
+Title: Переводчик (2022)
+Type: movie | Country: Великобритания, Испания, США | Genres: боевик, триллер, военный, история, драма | Duration: 123 min | MPAA: r
+Ratings: Kinopoisk 7.9 (1022683 votes), IMDb 7.5 (181824 votes), Film Critics 6.8 (118 votes), Russian Film Critics 75/100
+Description: Афганистан, март 2018 года. Во время спецоперации по поиску оружия талибов отряд сержанта армии США Джона Кинли попадает в засаду. В живых остаются только сам Джон, получивший ранение, и местный переводчик Ахмед, который сотрудничает с американцами. Очнувшись на родине, Кинли не помнит, как ему удалось выжить, но понимает, что именно Ахмед спас ему жизнь, протащив на себе через опасную территорию. Теперь чувство вины не даёт Джону покоя, и он решает вернуться за Ахмедом и его семьёй, которых в Афганистане усиленно ищут талибы.
 
 ---
 
-Title: Бегущий по лезвию 2049
-    Year: 2017
-    Type: Movie
-    Country: США, Великобритания, Канада, Испания
-    Genres: фантастика, боевик, триллер, драма
-    Duration: 164 minutes
-    MPAA Rating: r
-
-    Description: В недалеком будущем мир населен людьми и репликантами, созданными выполнять самую тяжелую работу. Работа офицера полиции Кей — держать репликантов под контролем в условиях нарастающего напряжения. Он случайно становится обладателем секретной информации, которая ставит под угрозу существование всего человечества. Желая найти ключ к разгадке, Кей решает разыскать Рика Декарда — бывшего офицера специального подразделения полиции Лос-Анджелеса, который бесследно исчез много лет назад.
-
-    Ratings:
-    - Kinopoisk: 7.798 (443703 votes)
-    - IMDb: 8 (674279 votes)
-    - Film Critics: 8.2 (442 votes)
-    - Russian Film Critics: 72
-    - Awaiting Audience Rating: None
+Title: Бегущий по лезвию 2049 (2017)
+Type: movie | Country: США, Великобритания, Канада, Испания | Genres: фантастика, боевик, триллер, драма | Duration: 164 min | MPAA: r
+Ratings: Kinopoisk 7.8 (443703 votes), IMDb 8 (674279 votes), Film Critics 8.2 (442 votes), Russian Film Critics 72/100
+Description: В недалеком будущем мир населен людьми и репликантами, созданными выполнять самую тяжелую работу. Работа офицера полиции Кей — держать репликантов под контролем в условиях нарастающего напряжения. Он случайно становится обладателем секретной информации, которая ставит под угрозу существование всего человечества. Желая найти ключ к разгадке, Кей решает разыскать Рика Декарда — бывшего офицера специального подразделения полиции Лос-Анджелеса, который бесследно исчез много лет назад.
 
 ---
 
-Title: Люди Икс: Дни минувшего будущего
-    Year: 2014
-    Type: Movie
-    Country: Великобритания, США
-    Genres: фантастика, боевик, триллер, приключения
-    Duration: 131 minutes
-    MPAA Rating: pg13
-
-    Description: В недалёком будущем мутанты близки к истреблению роботами-охотниками на мутантов Стражами. Единственная надежда для мутантов выжить - предотвратить череду роковых событий, приведших к появлению Стражей. С помощью своих способностей, Китти Прайд перемещает сознание Росомахи в его молодое тело в 1973 год. В прошлом всё оказывается не так радужно: молодой Профессор Икс окончательно разочарован в своих идеях, Магнето содержится в тюрьме глубоко под землёй, а человечество не знает как реагировать на широкое появление мутантов...
-
-    Ratings:
-    - Kinopoisk: 7.729 (304776 votes)
-    - IMDb: 7.9 (749247 votes)
-    - Film Critics: 7.5 (333 votes)
-    - Russian Film Critics: 93.3333
-    - Awaiting Audience Rating: None
+Title: Люди Икс: Дни минувшего будущего (2014)
+Type: movie | Country: Великобритания, США | Genres: фантастика, боевик, триллер, приключения | Duration: 131 min | MPAA: pg13
+Ratings: Kinopoisk 7.7 (304776 votes), IMDb 7.9 (749247 votes), Film Critics 7.5 (333 votes), Russian Film Critics 93/100
+Description: В недалёком будущем мутанты близки к истреблению роботами-охотниками на мутантов Стражами. Единственная надежда для мутантов выжить - предотвратить череду роковых событий, приведших к появлению Стражей. С помощью своих способностей, Китти Прайд перемещает сознание Росомахи в его молодое тело в 1973 год. В прошлом всё оказывается не так радужно: молодой Профессор Икс окончательно разочарован в своих идеях, Магнето содержится в тюрьме глубоко под землёй, а человечество не знает как реагировать на широкое появление мутантов...
 
 ```
 
@@ -466,6 +397,47 @@ INFO:
 """
 
 
+# Parameters and values allowed in MOVIE_SEARCH_PROMPT_TEMPLATE
+MOVIE_SEARCH_PARAMS = frozenset((
+    "title", "type", "isSeries", "status", "year", "releaseYears.start", "releaseYears.end",
+    "rating.kp", "rating.imdb", "ageRating", "votes.kp", "votes.imdb", "budget.value", "audience.count",
+    "movieLength", "seriesLength", "totalSeriesLength", "genres.name", "countries.name", "networks.items.name",
+    "persons.name", "fees.world", "fees.usa", "fees.russia", "premiere.world", "premiere.usa",
+    "premiere.russia", "premiere.digital", "premiere.cinema", "premiere.country",
+))
+MOVIE_SEARCH_VALUES = {
+    "type": frozenset(("movie", "tv-series", "cartoon", "animated-series", "anime")),
+    "isSeries": frozenset(("true", "false")),
+    "status": frozenset(("announced", "completed", "filming", "post-production", "pre-production")),
+    "genres.name": frozenset((
+        "аниме", "биография", "боевик", "вестерн", "военный", "детектив", "детский", "для взрослых",
+        "документальный", "драма", "история", "комедия", "короткометражка", "криминал", "мелодрама", "музыка",
+        "мультфильм", "мюзикл", "приключения", "семейный", "спорт", "триллер", "ужасы", "фантастика",
+        "фильм-нуар", "фэнтези",
+    )),
+}
+
+
+def validate_movie_search_params(params) -> dict[str, list[str]]:
+    """Параметры поиска, сгенерированные LLM, только из белого списка и в формате массивов строк"""
+    if not isinstance(params, dict) or not params:
+        raise OutputParserException(f"Expected a non-empty dict of search params, got {params!r}")
+    unknown = set(params) - MOVIE_SEARCH_PARAMS
+    if unknown:
+        raise OutputParserException(f"Unknown search params: {sorted(unknown)}")
+    validated = {}
+    for key, values in params.items():
+        values = values if isinstance(values, list) else [values]
+        if not values or not all(isinstance(value, (str, int, float, bool)) for value in values):
+            raise OutputParserException(f"Invalid values of {key}: {values!r}")
+        values = [str(value).lower() if isinstance(value, bool) else str(value) for value in values]
+        allowed = MOVIE_SEARCH_VALUES.get(key)
+        if allowed and any(value.lstrip("!+") not in allowed for value in values):
+            raise OutputParserException(f"Invalid values of {key}: {values!r}")
+        validated[key] = values
+    return validated
+
+
 class MoviesSearch(BaseApiTool):
 
     def __init__(
@@ -479,6 +451,9 @@ class MoviesSearch(BaseApiTool):
         description="Осуществляет сложный поиск фильмов/сериалов по параметрам и возвращает информацию о них",
         limit: int = 5,
         show_logs: bool = False,
+        api_llm: BaseChatModel | None = None,
+        api_fallback_llm: BaseChatModel | None = None,
+        answer_mode: Literal["llm", "raw"] | None = None,
     ):
         super().__init__(
             llm,
@@ -490,8 +465,14 @@ class MoviesSearch(BaseApiTool):
             description,
             limit,
             show_logs,
+            api_llm,
+            api_fallback_llm,
+            answer_mode,
         )
 
+    def _validate_params(self, params) -> dict[str, list[str]]:
+        return validate_movie_search_params(params)
+
     def _find_persons_ids(self, persons: list[str]) -> list[str]:
         persons_ids = []
         for person in persons:
@@ -515,9 +496,7 @@ class MoviesSearch(BaseApiTool):
                 params["persons.id"] = persons_ids
             del params_generated["persons.name"]
         params.update(params_generated)
-        api_response = requests.get(
-            kp_utils.MOVIE_SEARCH_URL, params=params, headers=kp_utils.HEADERS
-        )
+        api_response = kp_utils.kp_get(kp_utils.MOVIE_SEARCH_URL, params)
         if not api_response.ok:
             return []
         json_response = api_response.json()
@@ -531,11 +510,7 @@ class MoviesSearch(BaseApiTool):
         docs = []
         for title in generated_params["title"]:
             params["query"] = title
-            api_response = requests.get(
-                kp_utils.MOVIE_SEARCH_BY_NAME_URL,
-                params=params,
-                headers=kp_utils.HEADERS,
-            )
+            api_response = kp_utils.kp_get(kp_utils.MOVIE_SEARCH_BY_NAME_URL, params)
             if not api_response.ok:
                 continue
             data_json = api_response.json()
@@ -561,17 +536,31 @@ class MoviesSearch(BaseApiTool):
         if not docs:
             api_response = "Error"
             api_answer = "К сожалению, я не смог найти информацию по вашему запросу"
+        elif self._answer_mode == "raw":
+            movies = [Movie.from_kp(doc) for doc in docs]
+            # ExecutorNode already has the collected info, only the movies are returned;
+            # a filter search is a list of recommendations, so one line per movie is enough
+            items = [movie.render() if "title" in params_generated else movie.render_short() for movie in movies]
+            api_response = self._budget.fit([PromptSection("info", items, shrink="drop")])["info"]
+            api_answer = self._raw_answer(question, api_response)
         else:
-            api_response = "\n\n---\n\n".join(
-                [kp_utils.transform_movie_data(i) for i in docs]
+            # Movies are ordered by relevance, the last ones are dropped first
+            prompt = self._budget.fit(
+                [
+                    PromptSection("collected_info", [collected_info], priority=0),
+                    PromptSection("info", [Movie.from_kp(doc).render() for doc in docs], priority=1,
+                                  min_tokens=500, shrink="drop", separator="\n\n---\n\n"),
+                ],
+                fixed=self._answer_prompt + OUTPUT_FIELDS + question,
             )
+            api_response = prompt["info"]
 
             # TODO: maybe add collected_info to api response info ?
             api_answer = self._answer_chain.invoke(
                 {
                     "fields": OUTPUT_FIELDS,
                     "question": question,
-                    "collected_info": collected_info,
+                    "collected_info": prompt["collected_info"],
                     "info": api_response,
                 }
             )
@@ -1,5 +1,6 @@
-from typing import Dict, List
+from typing import Dict, List, Literal
 from pathlib import Path
+import json
 import requests
 import os
 
@@ -148,8 +149,12 @@ class PeopleSearch(BaseApiTool):
         description = "Возвращает данные о человеке",
         limit: int = 10,
         show_logs: bool = False,
+        answer_mode: Literal["llm", "raw"] | None = None,
     ):
-        super().__init__(llm, api_prompt, answer_prompt, api_parser, answer_parser, name, description, limit, show_logs)
+        super().__init__(
+            llm, api_prompt, answer_prompt, api_parser, answer_parser, name, description, limit, show_logs,
+            answer_mode=answer_mode,
+        )
         self._format_instructions = api_parser.get_format_instructions()
 
     def _invoke(self, question: str, collected_info: str, *args, **kwargs) -> str:
@@ -164,7 +169,12 @@ class PeopleSearch(BaseApiTool):
         params["limit"] = self._limit
         params["selectFields"] = request_data["fields"]
         api_response = requests.get(PeopleSearch.BASE_URL, params=params, headers=headers).json()["docs"]
-        api_answer = self._answer_chain.invoke({"fields": OUTPUT_FIELDS, "question": question, "info": api_response})
+        if self._answer_mode == "raw":
+            api_answer = self._raw_answer(
+                question, "\n".join(json.dumps(doc, ensure_ascii=False) for doc in api_response)
+            )
+        else:
+            api_answer = self._answer_chain.invoke({"fields": OUTPUT_FIELDS, "question": question, "info": api_response})
 
         if self._show_logs:
             print(f"---{self._name}---")
@@ -1,13 +1,21 @@
 from pathlib import Path
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal
+import json
 import os
 
+import requests
+
 from langchain_core.output_parsers import StrOutputParser, BaseOutputParser, JsonOutputParser
+from langchain_core.exceptions import OutputParserException
 from langchain_core.language_models import BaseChatModel
 from dotenv import load_dotenv
 
 from app.agent.nodes.planner_node import PEOPLE_SEARCH_BY_NAME_FIELDS as OUTPUT_FIELDS
 from app.agent.nodes._base_api_tool import BaseApiTool
+from app.agent.nodes.prompt_budget import PromptSection
+from app.core import tracing
+from app.core.wiki_store import wiki_store
 from . import kp_utils
 
 load_dotenv(Path(__file__).parent.parent.parent.parent.resolve() / ".env")
@@ -121,11 +129,34 @@ class PeopleSearchByName(BaseApiTool):
         description = "Возвращает данные о человеке по его имени",
         limit: int = 5,
         show_logs: bool = False,
-        load_info_from_wiki: bool = True
+        load_info_from_wiki: bool = True,
+        api_llm: BaseChatModel | None = None,
+        api_fallback_llm: BaseChatModel | None = None,
+        answer_mode: Literal["llm", "raw"] | None = None,
     ):
-        super().__init__(llm, api_prompt, answer_prompt, api_parser, answer_parser, name, description, limit, show_logs)
+        super().__init__(
+            llm, api_prompt, answer_prompt, api_parser, answer_parser, name, description, limit, show_logs,
+            api_llm, api_fallback_llm, answer_mode,
+        )
         self._load_info_from_wiki = load_info_from_wiki
 
+    def _validate_params(self, params) -> dict:
+        query = params.get("query") if isinstance(params, dict) else None
+        names = query if isinstance(query, list) else [query]
+        if set(params or ()) != {"query"} or not names or not all(isinstance(name, str) and name.strip() for name in names):
+            raise OutputParserException(f"Expected {{\"query\": name or list of names}}, got {params!r}")
+        return params
+
+    def _person_info(self, name: str, question: str) -> str | None:
+        # Kinopoisk id picks the right namesake in the local article store
+        kp_id = None
+        if wiki_store.available:
+            try:
+                kp_id = kp_utils.InferKpId.person(name)
+            except requests.RequestException as e:
+                print(f"{self._name}: failed to find Kinopoisk id of {name}: {e}")
+        return kp_utils.get_person_info_from_wiki(name, question, kp_id=kp_id)
+
     def _invoke(self, question: str, collected_info: str, *args, **kwargs) -> str:
 
         params = self._chain.invoke(
@@ -133,26 +164,44 @@ class PeopleSearchByName(BaseApiTool):
         )
 
         if self._load_info_from_wiki:
-            api_response = kp_utils.get_person_info_from_wiki(params["query"])
-            if not api_response:
-                api_response = "Информация о данном человеке не найдена, или он не относится к киноиндустрии"
+            names = params["query"] if isinstance(params["query"], list) else [params["query"]]
+            with ThreadPoolExecutor(max_workers=len(names) or 1) as executor:
+                infos = list(executor.map(
+                    tracing.wrap(lambda name: self._person_info(name, question)), names
+                ))
+            api_response = "\n\n".join(
+                f"# {name}\n{info or 'Информация о данном человеке не найдена, или он не относится к киноиндустрии'}"
+                for name, info in zip(names, infos)
+            )
             fields = "Информация о человеке со страницы в Википедии"
         else:
             params["page"] = 1
             params["limit"] = self._limit
-            api_response = requests.get(
-                kp_utils.PERSON_SEARCH_BY_NAME_URL, params=params, headers=kp_utils.HEADERS
-            ).json()["docs"]
+            api_response = kp_utils.kp_get(kp_utils.PERSON_SEARCH_BY_NAME_URL, params).json()["docs"]
             fields = OUTPUT_FIELDS
 
-        api_answer = self._answer_chain.invoke(
-            {
-                "fields": fields,
-                "question": question,
-                "collected_info": collected_info,
-                "info": api_response,
-            }
-        )
+        if self._answer_mode == "raw":
+            if not isinstance(api_response, str):
+                api_response = "\n".join(json.dumps(doc, ensure_ascii=False) for doc in api_response)
+            api_response = self._budget.fit([PromptSection("info", [api_response])])["info"]
+            api_answer = self._raw_answer(question, api_response)
+        else:
+            prompt = self._budget.fit(
+                [
+                    PromptSection("collected_info", [collected_info], priority=0),
+                    PromptSection("info", [str(api_response)], priority=1, min_tokens=500),
+                ],
+                fixed=self._answer_prompt + fields + question,
+            )
+            api_response = prompt["info"]
+            api_answer = self._answer_chain.invoke(
+                {
+                    "fields": fields,
+                    "question": question,
+                    "collected_info": prompt["collected_info"],
+                    "info": api_response,
+                }
+            )
 
         if self._show_logs:
             print(f"---{self._name}---")
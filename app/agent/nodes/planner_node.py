@@ -1,13 +1,33 @@
+import itertools
+import json
 import re
+import time
+from typing import Iterator, Literal
 
+from langchain_core.exceptions import OutputParserException
 from langchain_core.output_parsers import StrOutputParser, BaseOutputParser, JsonOutputParser
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import FunctionMessage
+from langchain_core.messages import AIMessage, FunctionMessage
 from langchain_core.prompts import PromptTemplate
-from pydantic import BaseModel, Field
+from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import BaseModel, Field, ValidationError
 
+from app.agent.llms.cascade import cascade
 from app.agent.nodes._base_node import BaseNode
 from app.agent.graph.state import AgentState
+from app.core.config import settings
+from app.core.metrics import registry
+
+
+PLANNER_LATENCY = registry.histogram(
+    "agent_planner_latency_seconds", "Planner LLM call latency", ("mode",)
+)
+PLANNER_OUTPUT_TOKENS = registry.counter(
+    "agent_planner_output_tokens_total", "Output tokens generated by the planner", ("mode",)
+)
+PLANNER_PARSE_FAILURES = registry.counter(
+    "agent_planner_parse_failures_total", "Planner responses that did not match the schema", ("mode", "repaired")
+)
 
 
 PEOPLE_SEARCH_BY_NAME_FIELDS = """
@@ -69,22 +89,21 @@ PEOPLE_SEARCH_FIELDS = """
 
 
 MOVIES_SEARCH_FIELDS = """
-Title - Название фильма.
-Year - Год выпуска.
+Title - Название фильма, в скобках английское название и год выпуска.
 Type - Тип (например, фильм, сериал).
 Country - Страны производства.
 Genres - Жанры фильма.
-Duration - Продолжительность фильма в минутах.
-MPAA Rating - Рейтинг MPAA.
-
+Duration - Продолжительность фильма в минутах, у сериалов Episode - длительность серии и Total - всех серий.
+MPAA - Рейтинг MPAA.
+Ratings - Оценки и количество голосов:
+- Kinopoisk - на Кинопоиске.
+- IMDb - на IMDb.
+- Film Critics - кинокритиков.
+- Russian Film Critics - российских кинокритиков, из 100.
+- Awaiting Audience - процент ожидающих фильм зрителей.
 Description - Описание сюжета фильма.
 
-Ratings:
-- Kinopoisk - Оценка на Кинопоиске и количество голосов.
-- IMDb - Оценка на IMDb и количество голосов.
-- Film Critics - Оценка кинокритиков и количество голосов.
-- Russian Film Critics - Оценка российских кинокритиков.
-- Awaiting Audience Rating - Оценка ожидаемой аудитории (если имеется).
+Поля без данных не выводятся.
 """
 
 
@@ -95,7 +114,7 @@ PLANNER_PROMPT_TEMPLATE = """
 Отвечай всегда только на русском языке.
 
 ## Твоя задача
-1. Получить историю диалога (user и assistant) под именем HISTORY.
+1. Получить историю диалога (user и assistant) под именем HISTORY. Строка summary в её начале, если есть, — краткое содержание более раннего диалога.
 2. Проанализировать всю доступную информацию, учитывая, что более поздние сообщения в истории более релевантны.
 3. Сформировать пошаговый план, позволяющий максимально полно и корректно удовлетворить запрос пользователя, касающийся кино- и телеиндустрии (фильмы, сериалы, аниме, личности, связанные с кино, и т.д.).
 4. Составить соответствующие запросы к другим LLM-агентам (если необходимо) и учесть, что каждый агент должен использовать данные, полученные на предыдущих шагах.
@@ -156,6 +175,40 @@ HISTORY:
 """
 
 
+# Compact prompt for structured output: the schema is passed to the model by the API,
+# so neither format instructions nor a reasoning section are needed
+PLANNER_STRUCTURED_PROMPT_TEMPLATE = """
+Ты — планировщик помощника по фильмам, сериалам и людям из киноиндустрии.
+По истории диалога составь список вызовов агентов, нужных для ответа на последний запрос пользователя. Поздние сообщения важнее,
+строка summary в начале истории — краткое содержание более раннего диалога.
+
+Агенты (выполняются по порядку):
+- MoviesSearch — поиск фильмов, сериалов, аниме по названию, жанру, стране, году; подборки. Запрос — полная формулировка с параметрами, например "Составь подборку английских боевиков, вышедших после 2012 года".
+- PeopleSearchByName — информация о человеке из киноиндустрии по имени, например "Какой рост у Киану Ривза?".
+- MovieSemanticSearch — поиск фильма по описанию сюжета, когда название не указано. Запрос — только описание сюжета.
+- MovieReviewsSummarizer — сводка отзывов зрителей о фильме. Запрос — только название фильма.
+- UserPreferencesManager — сохранение предпочтений, если пользователь их выразил. Запрос — описание предпочтения, например "Пользователь любит боевики, не любит Брэда Питта".
+
+Если агенты не нужны (приветствие, вопрос вне темы, ответ уже есть в истории), верни пустой список задач.
+{reasoning_instructions}
+HISTORY:
+{history}
+"""
+
+REASONING_INSTRUCTIONS = "Перед задачами кратко (1-2 предложения) объясни в поле reasoning, какие агенты нужны и почему.\n"
+
+PLAN_REPAIR_PROMPT_TEMPLATE = """
+Исправь ответ планировщика так, чтобы он соответствовал схеме. Сохрани исходные задачи, ничего не добавляй.
+Верни только JSON без пояснений.
+
+Схема:
+{format_instructions}
+
+Ответ планировщика:
+{response}
+"""
+
+
 class AgentTask(BaseModel):
     agent: str = Field(description="Имя агента")
     question: str = Field(description="Запрос для агента")
@@ -165,41 +218,166 @@ class AgentTaskList(BaseModel):
     tasks: list[AgentTask] = Field(description="Итоговая последовательность с вызовом агентов. Пустой список означает, что ответ на запрос пользователя не требует обращения к агентам.")
 
 
+class ReasonedAgentTaskList(BaseModel):
+    # reasoning goes first so that the model generates it before the tasks
+    reasoning: str = Field(description="Краткое обоснование выбора агентов")
+    tasks: list[AgentTask] = Field(description=AgentTaskList.model_fields["tasks"].description)
+
+
+PLANNER_AGENTS = (
+    "MoviesSearch", "PeopleSearchByName", "MovieSemanticSearch", "MovieReviewsSummarizer", "UserPreferencesManager",
+)
+
+JSON_BLOCK = re.compile(r"`{3}(?:json)?\s*(.*?)\s*`{3}", re.DOTALL)
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _json_objects(text: str) -> Iterator[object]:
+    # Each object is decoded on its own, a greedy {.*} would join two objects into invalid JSON
+    start = text.find("{")
+    while start != -1:
+        try:
+            value, end = _JSON_DECODER.raw_decode(text, start)
+        except ValueError:
+            start = text.find("{", start + 1)
+            continue
+        yield value
+        start = text.find("{", end)
+
+
+def parse_plan(response: str) -> AgentTaskList | None:
+    """План из ответа модели: fenced-блок ```json, затем первый подходящий JSON-объект в тексте"""
+    blocks = []
+    for block in JSON_BLOCK.findall(response):
+        try:
+            blocks.append(json.loads(block))
+        except ValueError:
+            continue
+    for candidate in itertools.chain(blocks, _json_objects(response)):
+        try:
+            return AgentTaskList.model_validate(candidate)
+        except ValidationError:
+            continue
+    return None
+
+
 class PlannerNode(BaseNode):
+    """
+    Строит план вызова агентов.
+
+    mode="structured" — ответ в виде AgentTaskList через structured output (tool calling или JSON schema)
+    с коротким промптом, рассуждение только при reasoning=True. mode="text" — исходный промпт с рассуждением
+    и блоком ```json. Ответ, не прошедший валидацию, исправляется отдельным вызовом LLM.
+    """
+
     def __init__(
         self,
         llm: BaseChatModel,
-        prompt: str = PLANNER_PROMPT_TEMPLATE,
+        prompt: str | None = None,
         parser: BaseOutputParser = StrOutputParser(),
         name = "PlannerNode",
         description = "Возвращает план поиска информации",
+        mode: Literal["text", "structured"] = settings.PLANNER_MODE,
+        reasoning: bool = settings.PLANNER_REASONING,
+        structured_method: Literal["function_calling", "json_schema", "json_mode"] = settings.PLANNER_STRUCTURED_METHOD,
+        fallback_llm: BaseChatModel | None = None,
         show_logs: bool = False,
     ):
-        prompt = PromptTemplate(template=prompt, partial_variables={
-            # "people_search_by_name_fields": PEOPLE_SEARCH_BY_NAME_FIELDS,
-            # "people_search_fields": PEOPLE_SEARCH_FIELDS,
-            # "movies_search_fields": MOVIES_SEARCH_FIELDS,
-            "format_instructions": JsonOutputParser(pydantic_object=AgentTaskList).get_format_instructions()
-        })
-        self._chain = prompt | llm | parser
+        format_instructions = JsonOutputParser(pydantic_object=AgentTaskList).get_format_instructions()
+        if mode == "structured":
+            self._prompt = PromptTemplate(template=prompt or PLANNER_STRUCTURED_PROMPT_TEMPLATE, partial_variables={
+                "reasoning_instructions": REASONING_INSTRUCTIONS if reasoning else "",
+            })
+        else:
+            self._prompt = PromptTemplate(template=prompt or PLANNER_PROMPT_TEMPLATE, partial_variables={
+                # "people_search_by_name_fields": PEOPLE_SEARCH_BY_NAME_FIELDS,
+                # "people_search_fields": PEOPLE_SEARCH_FIELDS,
+                # "movies_search_fields": MOVIES_SEARCH_FIELDS,
+                "format_instructions": format_instructions
+            })
+        self._mode = mode
+        self._reasoning = reasoning
+        self._structured_method = structured_method
+        self._chain = cascade(self._build_chain, llm, fallback_llm, role="planner")
+        self._repair_chain = PromptTemplate(
+            template=PLAN_REPAIR_PROMPT_TEMPLATE,
+            partial_variables={"format_instructions": format_instructions},
+        ) | llm | parser
         self._description = description
         self._name = name
         self._show_logs = show_logs
 
+    def _build_chain(self, llm: BaseChatModel) -> Runnable:
+        if self._mode == "structured":
+            return self._prompt | llm.with_structured_output(
+                ReasonedAgentTaskList if self._reasoning else AgentTaskList,
+                method=self._structured_method,
+                include_raw=True,
+                # json_mode has no schema to be strict about
+                **({"strict": True} if self._structured_method != "json_mode" else {}),
+            ) | RunnableLambda(self._check_structured)
+        return self._prompt | llm | RunnableLambda(self._check_text)
+
+    def _check(self, raw: AIMessage, plan: AgentTaskList | None) -> tuple[AIMessage, AgentTaskList]:
+        if raw.usage_metadata:
+            PLANNER_OUTPUT_TOKENS.inc(raw.usage_metadata["output_tokens"], mode=self._mode)
+        unknown = [task.agent for task in plan.tasks if task.agent not in PLANNER_AGENTS] if plan else []
+        if plan is None or unknown:
+            response = raw.content or json.dumps([call["args"] for call in raw.tool_calls], ensure_ascii=False)
+            error = f"Unknown agents {unknown}" if unknown else "The response does not match AgentTaskList"
+            raise OutputParserException(error, llm_output=response)
+        return raw, plan
+
+    def _check_structured(self, result: dict) -> tuple[AIMessage, AgentTaskList]:
+        plan = AgentTaskList(tasks=result["parsed"].tasks) if result["parsed"] is not None else None
+        return self._check(result["raw"], plan)
+
+    def _check_text(self, raw: AIMessage) -> tuple[AIMessage, AgentTaskList]:
+        return self._check(raw, parse_plan(raw.content))
+
+    def _call(self, history: str) -> tuple[AIMessage, AgentTaskList]:
+        """Вызов LLM: сырой ответ модели и прошедший валидацию план, иначе OutputParserException"""
+        start = time.perf_counter()
+        try:
+            return self._chain.invoke({"history": history})
+        finally:
+            PLANNER_LATENCY.observe(time.perf_counter() - start, mode=self._mode)
+
+    def _repair(self, response: str) -> AgentTaskList:
+        plan = None
+        try:
+            plan = parse_plan(self._repair_chain.invoke({"response": response}))
+        except Exception as e:
+            print(f"{self._name}: plan repair failed: {e}")
+        if plan is not None:
+            plan.tasks = [task for task in plan.tasks if task.agent in PLANNER_AGENTS]
+        PLANNER_PARSE_FAILURES.inc(mode=self._mode, repaired=str(plan is not None).lower())
+        if plan is None:
+            # Without a plan the executor still answers from the dialogue history
+            print(f"{self._name}: could not parse the plan, continuing without agents: {response[:500]!r}")
+            plan = AgentTaskList(tasks=[])
+        return plan
+
     def _invoke(self, state: AgentState) -> str:
-        history = self._history_to_str(state.history)
-        
-        response = self._chain.invoke({"history": history})
-        pattern = r"`{3}json\s*(.*?)\s*`{3}"
-        plan = AgentTaskList.model_validate_json(re.findall(pattern, response, re.DOTALL)[0])
-        
+        history = self._history_to_str(state.history, state.summary)
+
+        try:
+            raw, plan = self._call(history)
+            response = raw.content
+        except OutputParserException as e:
+            response = e.llm_output or ""
+            plan = self._repair(response)
+
         if self._show_logs:
             print(f"---{self._name}---")
             print(history)
+            if response:
+                print(response)
             print(plan)
             print("-------------------")
 
-        state.history.append(FunctionMessage(name=self._name, content=response, response_metadata=plan.model_dump()))
+        content = response or plan.model_dump_json()
+        state.history.append(FunctionMessage(name=self._name, content=content, response_metadata=plan.model_dump()))
         return state
 
 
@@ -207,9 +385,28 @@ if __name__ == "__main__":
     from langchain_core.messages import HumanMessage
     from app.agent.llms import LLMFactory
 
-    state = AgentState(history=[HumanMessage("Женат ли Киллиан Мерфи?")], user_id="test_user")
-    gpt = LLMFactory.get_llm("gpt-4o")
-
-    planner = PlannerNode(gpt)
-    result = planner.invoke(state)
-    print(result)
+    questions = [
+        "Женат ли Киллиан Мерфи?",
+        "Расскажи, что пишут о фильме Побег из Шоушенка",
+        "Посоветуй американские фильмы в жанре фантастика, я люблю Нолана",
+        "Как называется фильм, где парень застрял на Марсе и выращивал картошку?",
+    ]
+    gpt = LLMFactory.get_llm("gpt-4o-mini")
+
+    # Output tokens and latency of the original prompt vs structured output
+    for mode, reasoning in (("text", True), ("structured", True), ("structured", False)):
+        planner = PlannerNode(gpt, mode=mode, reasoning=reasoning)
+        latency = tokens = 0.0
+        for question in questions:
+            state = AgentState(history=[HumanMessage(question)], user_id=0, user_preferences=[])
+            tokens_before = PLANNER_OUTPUT_TOKENS.value(mode=mode)
+            start = time.perf_counter()
+            try:
+                _, plan = planner._call(planner._history_to_str(state.history))
+            except OutputParserException as e:
+                plan = f"invalid response: {e.llm_output!r}"
+            latency += time.perf_counter() - start
+            tokens += PLANNER_OUTPUT_TOKENS.value(mode=mode) - tokens_before
+            print(f"  {question} -> {plan}")
+        print(f"{mode} (reasoning={reasoning}): {tokens / len(questions):.0f} output tokens, "
+              f"{latency / len(questions):.2f}s per plan")
@@ -0,0 +1,178 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Literal
+
+import tiktoken
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+
+PROMPT_SECTION_TOKENS = registry.histogram(
+    "agent_prompt_section_tokens", "Tokens of a prompt section after budgeting", ("prompt", "section"),
+    buckets=(50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000),
+)
+PROMPT_TRUNCATED_TOKENS = registry.counter(
+    "agent_prompt_truncated_tokens_total", "Tokens removed from a prompt section to fit the budget", ("prompt", "section")
+)
+
+# Cyrillic text is about 3 characters per token, used when the encoding can't be loaded
+APPROX_CHARS_PER_TOKEN = 3
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """Кодировка tiktoken, файл которой должен быть заранее скачан в TIKTOKEN_CACHE_DIR (см. Dockerfile)"""
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    _encoding = tiktoken.get_encoding(settings.TIKTOKEN_ENCODING)
+                except Exception as e:
+                    print(f"Prompt budget: tiktoken encoding is unavailable, counting tokens approximately: {e}")
+                    _encoding = False
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if not encoding:
+        return -(-len(text) // APPROX_CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, keep: Literal["head", "tail"] = "head") -> str:
+    """Обрезает текст до max_tokens токенов, по возможности по границе абзаца или предложения"""
+    max_tokens -= 2  # room for the "…" marker
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if not encoding:
+        max_chars = max_tokens * APPROX_CHARS_PER_TOKEN
+        if len(text) <= max_chars:
+            return text
+        cut = text[:max_chars] if keep == "head" else text[-max_chars:]
+    else:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        # A token boundary may split a multibyte character
+        cut = encoding.decode(tokens[:max_tokens] if keep == "head" else tokens[-max_tokens:], errors="ignore")
+
+    if keep == "head":
+        boundary = max(cut.rfind("\n\n"), cut.rfind(". "))
+        return (cut[:boundary + 1] if boundary > len(cut) // 2 else cut).rstrip() + " …"
+    boundary = cut.find("\n")
+    return "… " + (cut[boundary + 1:] if 0 <= boundary < len(cut) // 2 else cut).lstrip()
+
+
+@dataclass
+class PromptSection:
+    """
+    Часть промпта. Текст состоит из items, соединённых separator.
+
+    При нехватке бюджета раньше сокращаются секции с меньшим priority, но не меньше min_tokens:
+    shrink="drop" убирает элементы с конца (keep="tail" — с начала, например старые сообщения истории),
+    shrink="even" обрезает самые длинные элементы до равной доли, shrink="truncate" обрезает текст целиком,
+    shrink="none" — секция не сокращается, даже если промпт не помещается в бюджет.
+    """
+    name: str
+    items: list[str]
+    priority: int = 0
+    min_tokens: int = 0
+    shrink: Literal["drop", "even", "truncate", "none"] = "truncate"
+    keep: Literal["head", "tail"] = "head"
+    separator: str = "\n\n"
+    tokens: int = field(init=False, default=0)
+
+    @property
+    def text(self) -> str:
+        return self.separator.join(self.items)
+
+    def _count(self) -> int:
+        self.tokens = count_tokens(self.text)
+        return self.tokens
+
+    def _shrink_to(self, target: int) -> None:
+        target = max(target, 0)
+        if self.shrink == "drop":
+            while len(self.items) > 1 and self._count() > target:
+                rest = self.items[1:] if self.keep == "tail" else self.items[:-1]
+                room = target - count_tokens(self.separator.join(rest)) - count_tokens(self.separator)
+                # The edge item is cut rather than dropped when part of it still fits
+                edge = truncate_tokens(self.items[0] if self.keep == "tail" else self.items[-1], room, self.keep)
+                if edge:
+                    self.items = [edge, *rest] if self.keep == "tail" else [*rest, edge]
+                    self._count()
+                    break
+                self.items = rest
+        elif self.shrink == "even" and len(self.items) > 1:
+            sizes = [count_tokens(item) for item in self.items]
+            budget = target - count_tokens(self.separator) * (len(self.items) - 1)
+            # Water-filling: short items stay whole, long ones share the rest evenly
+            cap = budget // len(sizes)
+            for i, size in enumerate(sorted(sizes)):
+                if size > cap:
+                    break
+                budget -= size
+                cap = budget // max(len(sizes) - i - 1, 1)
+            self.items = [
+                item if size <= cap else truncate_tokens(item, cap, self.keep)
+                for item, size in zip(self.items, sizes)
+            ]
+        if self._count() > target:
+            self.items = [truncate_tokens(self.text, target, self.keep)]
+            self._count()
+
+
+class PromptBudget:
+    """
+    Бюджет токенов промпта.
+
+    fit() считает токены секций и, если вместе с неизменной частью промпта (fixed) они не помещаются
+    в max_tokens, сокращает сначала наименее ценные секции. Токены секций пишутся в метрики
+    и в лог при show_logs.
+    """
+
+    def __init__(self, prompt_name: str, max_tokens: int, show_logs: bool = False):
+        self._prompt_name = prompt_name
+        self._max_tokens = max_tokens
+        self._show_logs = show_logs
+        self._fixed_cache: dict[str, int] = {}
+
+    def _fixed_tokens(self, fixed: str) -> int:
+        # The template is the same on every call
+        if fixed not in self._fixed_cache:
+            self._fixed_cache[fixed] = count_tokens(fixed)
+        return self._fixed_cache[fixed]
+
+    def fit(self, sections: list[PromptSection], fixed: str = "") -> dict[str, str]:
+        fixed_tokens = self._fixed_tokens(fixed)
+        before = {section.name: section._count() for section in sections}
+        excess = fixed_tokens + sum(before.values()) - self._max_tokens
+        for section in sorted(sections, key=lambda s: s.priority):
+            if excess <= 0:
+                break
+            reducible = section.tokens - section.min_tokens
+            if reducible <= 0 or section.shrink == "none":
+                continue
+            section._shrink_to(section.tokens - min(excess, reducible))
+            excess -= before[section.name] - section.tokens
+
+        for section in sections:
+            PROMPT_SECTION_TOKENS.observe(section.tokens, prompt=self._prompt_name, section=section.name)
+            if section.tokens < before[section.name]:
+                PROMPT_TRUNCATED_TOKENS.inc(
+                    before[section.name] - section.tokens, prompt=self._prompt_name, section=section.name
+                )
+        if self._show_logs:
+            total = fixed_tokens + sum(section.tokens for section in sections)
+            parts = ", ".join(
+                f"{s.name} {s.tokens}" + (f" (was {before[s.name]})" if s.tokens < before[s.name] else "")
+                for s in sections
+            )
+            print(f"Prompt budget {self._prompt_name}: {total}/{self._max_tokens} tokens: template {fixed_tokens}, {parts}")
+        return {section.name: section.text for section in sections}
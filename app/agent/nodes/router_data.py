@@ -0,0 +1,212 @@
+# Labelled user messages for the fast-path router classifier.
+# TRAIN_EXAMPLES are used to fit the model, EVAL_EXAMPLES only for offline evaluation.
+
+TRAIN_EXAMPLES = [
+    # greeting
+    ("привет", "greeting"),
+    ("Привет!", "greeting"),
+    ("здравствуйте", "greeting"),
+    ("Здравствуй, бот", "greeting"),
+    ("добрый день", "greeting"),
+    ("Добрый вечер!", "greeting"),
+    ("доброе утро", "greeting"),
+    ("хай", "greeting"),
+    ("хеллоу", "greeting"),
+    ("спасибо", "greeting"),
+    ("Спасибо большое!", "greeting"),
+    ("благодарю", "greeting"),
+    ("спасибо, помог", "greeting"),
+    ("пока", "greeting"),
+    ("до свидания", "greeting"),
+    ("приветствую", "greeting"),
+    ("ку", "greeting"),
+    ("Привет, как дела?", "greeting"),
+    ("отлично, спасибо", "greeting"),
+    ("класс, благодарю", "greeting"),
+    ("ок", "greeting"),
+    ("понятно, спасибо", "greeting"),
+    ("всем привет", "greeting"),
+    ("здорово", "greeting"),
+
+    # movie_info
+    ("Расскажи о фильме Назад в будущее", "movie_info"),
+    ("Какой рейтинг у фильма Матрица?", "movie_info"),
+    ("Расскажи про сериал Во все тяжкие", "movie_info"),
+    ("Когда вышел фильм Интерстеллар?", "movie_info"),
+    ("Сколько длится фильм Титаник?", "movie_info"),
+    ("В каком году вышел Брат 2?", "movie_info"),
+    ("Информация о фильме Иван Васильевич меняет профессию", "movie_info"),
+    ("Какой жанр у фильма Остров проклятых?", "movie_info"),
+    ("Что за фильм Зеленая миля?", "movie_info"),
+    ("Расскажи о мультфильме Король лев", "movie_info"),
+    ("Какая оценка на кинопоиске у Форреста Гампа?", "movie_info"),
+    ("Сколько сезонов в сериале Друзья?", "movie_info"),
+    ("Какой рейтинг IMDb у Крестного отца?", "movie_info"),
+    ("О чем фильм Начало?", "movie_info"),
+    ("Расскажи про аниме Тетрадь смерти", "movie_info"),
+    ("Какой возрастной рейтинг у фильма Дэдпул?", "movie_info"),
+    ("Из какой страны фильм Амели?", "movie_info"),
+    ("Кто снял фильм Достать ножи?", "movie_info"),
+    ("Сколько серий в сериале Шерлок?", "movie_info"),
+    ("Расскажи о фильме Ирония судьбы", "movie_info"),
+    ("Какой бюджет у фильма Аватар?", "movie_info"),
+    ("Когда вышел сериал Игра престолов?", "movie_info"),
+    ("Дай информацию о фильме Бойцовский клуб", "movie_info"),
+    ("Что известно о фильме Дюна 2021 года?", "movie_info"),
+
+    # reviews
+    ("Что пишут о фильме Побег из Шоушенка?", "reviews"),
+    ("Отзывы о фильме Матрица", "reviews"),
+    ("Какие отзывы у сериала Чернобыль?", "reviews"),
+    ("Что думают зрители о фильме Довод?", "reviews"),
+    ("Покажи рецензии на фильм Джокер", "reviews"),
+    ("Что говорят про фильм Оппенгеймер?", "reviews"),
+    ("Как зрители оценили фильм Барби?", "reviews"),
+    ("Мнения зрителей о фильме Интерстеллар", "reviews"),
+    ("Стоит ли смотреть фильм Дюна, что пишут в отзывах?", "reviews"),
+    ("Какие рецензии на сериал Очень странные дела?", "reviews"),
+    ("Понравился ли зрителям фильм Майор Гром?", "reviews"),
+    ("Отзывы на Форрест Гамп", "reviews"),
+    ("Что люди пишут о фильме Холоп?", "reviews"),
+    ("Суммаризируй отзывы о фильме Аватар", "reviews"),
+    ("Какие мнения о сериале Слово пацана?", "reviews"),
+    ("Что пишут критики о фильме Паразиты?", "reviews"),
+    ("Хвалят ли фильм Легенда №17?", "reviews"),
+    ("Ругают ли фильм Вратарь галактики?", "reviews"),
+    ("Рецензии на Зеленую милю", "reviews"),
+    ("Что пишут в отзывах про Брат?", "reviews"),
+    ("Как отзываются о фильме Левиафан?", "reviews"),
+    ("Отзывы зрителей о мультфильме Головоломка", "reviews"),
+
+    # person
+    ("Сколько лет Киану Ривзу?", "person"),
+    ("Какой рост у Киану Ривза?", "person"),
+    ("Кто такой Кристофер Нолан?", "person"),
+    ("Расскажи о режиссере Квентине Тарантино", "person"),
+    ("Женат ли Киллиан Мерфи?", "person"),
+    ("Откуда родом Брэд Питт?", "person"),
+    ("Где родился Леонардо ДиКаприо?", "person"),
+    ("Расскажи об актрисе Скарлетт Йоханссон", "person"),
+    ("Когда родился Никита Михалков?", "person"),
+    ("Есть ли дети у Джонни Деппа?", "person"),
+    ("Кто такая Марго Робби?", "person"),
+    ("Расскажи биографию Алексея Балабанова", "person"),
+    ("Сколько лет Тому Хэнксу?", "person"),
+    ("Замужем ли Эмма Стоун?", "person"),
+    ("Кто жена Тома Хэнкса?", "person"),
+    ("Расскажи про актера Данилу Козловского", "person"),
+    ("Чем известен Стивен Спилберг?", "person"),
+    ("Какого роста Том Круз?", "person"),
+    ("Какие награды у Мартина Скорсезе?", "person"),
+    ("Когда умер Андрей Тарковский?", "person"),
+    ("Расскажи о сценаристе Аароне Соркине", "person"),
+    ("Кто такой Федор Бондарчук?", "person"),
+    ("Биография Хоакина Феникса", "person"),
+
+    # plot
+    ("Как называется фильм про советского ученого, создавшего машину времени?", "plot"),
+    ("Фильм, где мужчина живет один и тот же день снова и снова", "plot"),
+    ("Не могу вспомнить название фильма, где парень застрял на Марсе и выращивал картошку", "plot"),
+    ("Ищу фильм про корабль, который столкнулся с айсбергом", "plot"),
+    ("Как называется сериал, где учитель химии начал варить наркотики?", "plot"),
+    ("Фильм про мальчика, который узнал, что он волшебник", "plot"),
+    ("Помоги найти фильм, в котором люди живут в симуляции и не знают об этом", "plot"),
+    ("Мультфильм про рыбку, которую искал отец по всему океану", "plot"),
+    ("Забыл название фильма, где герои крадут идеи из снов", "plot"),
+    ("Как называется фильм, в котором игрушки оживают, когда людей нет рядом?", "plot"),
+    ("Фильм о том, как заключенный много лет копал туннель из тюрьмы", "plot"),
+    ("Сериал про подростков, которые ищут пропавшего друга и сталкиваются с монстром из другого мира", "plot"),
+    ("Есть фильм, где робот остался один на Земле и собирает мусор", "plot"),
+    ("Какой фильм, где дедушка улетел на доме с воздушными шарами?", "plot"),
+    ("Не помню название: мужчина с потерей памяти делает татуировки, чтобы найти убийцу жены", "plot"),
+    ("Фильм про астронавтов, которые летят через червоточину искать новый дом", "plot"),
+    ("Как называется кино про двух бандитов в девяностых в Питере", "plot"),
+    ("Ищу мультфильм, где девочка попала в мир духов и ее родители превратились в свиней", "plot"),
+    ("Фильм в котором солдат снова и снова умирает в битве с пришельцами и возрождается", "plot"),
+    ("Как называется фильм про бойцовский клуб и раздвоение личности?", "plot"),
+    ("Сериал, где семьи борются за железный трон", "plot"),
+    ("Фильм, где офисный работник узнает, что он персонаж видеоигры", "plot"),
+
+    # other
+    ("Посоветуй американские фильмы в жанре фантастика", "other"),
+    ("Что посмотреть вечером?", "other"),
+    ("Составь подборку комедий 90-х", "other"),
+    ("Мне нравятся фильмы Нолана", "other"),
+    ("Я люблю ужасы", "other"),
+    ("Не люблю мелодрамы", "other"),
+    ("Посоветуй что-нибудь похожее на Интерстеллар", "other"),
+    ("Какие фильмы есть с Брэдом Питтом?", "other"),
+    ("А какой у него рейтинг?", "other"),
+    ("А отзывы?", "other"),
+    ("Сравни Матрицу и Начало", "other"),
+    ("Расскажи о фильме Матрица и что о нем пишут", "other"),
+    ("Какая погода завтра?", "other"),
+    ("Напиши код на питоне", "other"),
+    ("Мне понравился фильм Остров проклятых, посоветуй похожее", "other"),
+    ("Лучшие сериалы 2023 года", "other"),
+    ("Топ фильмов ужасов", "other"),
+    ("Что нового в кино?", "other"),
+    ("Фильмы с Киану Ривзом и Кэрри-Энн Мосс", "other"),
+    ("Удали мои предпочтения", "other"),
+    ("А еще?", "other"),
+    ("Покажи больше", "other"),
+    ("Какие фильмы снял Тарантино?", "other"),
+    ("Хочу посмотреть что-то доброе с семьей", "other"),
+]
+
+
+EVAL_EXAMPLES = [
+    ("Привет, бот!", "greeting"),
+    ("Добрый день!", "greeting"),
+    ("спасибо!", "greeting"),
+    ("Большое спасибо за помощь", "greeting"),
+    ("здравствуйте!", "greeting"),
+    ("всем здравствуйте", "greeting"),
+    ("До встречи", "greeting"),
+    ("хорошо, спасибо", "greeting"),
+
+    ("Расскажи о фильме Шрек", "movie_info"),
+    ("Какой рейтинг у фильма Побег из Шоушенка?", "movie_info"),
+    ("Когда вышел фильм Брат?", "movie_info"),
+    ("Сколько длится фильм Оппенгеймер?", "movie_info"),
+    ("Расскажи про сериал Шерлок", "movie_info"),
+    ("Что за фильм Остров?", "movie_info"),
+    ("Какой жанр у сериала Мандалорец?", "movie_info"),
+    ("Информация о мультфильме Холодное сердце", "movie_info"),
+
+    ("Что пишут о фильме Начало?", "reviews"),
+    ("Отзывы о сериале Чернобыль", "reviews"),
+    ("Что зрители думают о фильме Джокер?", "reviews"),
+    ("Рецензии на фильм Матрица", "reviews"),
+    ("Какие отзывы у фильма Зеленая книга?", "reviews"),
+    ("Что говорят про сериал Ведьмак?", "reviews"),
+    ("Как отзываются зрители о фильме Сталкер?", "reviews"),
+    ("Мнения о фильме Титаник", "reviews"),
+
+    ("Сколько лет Брэду Питту?", "person"),
+    ("Кто такой Тимоти Шаламе?", "person"),
+    ("Где родилась Анджелина Джоли?", "person"),
+    ("Расскажи о режиссере Дэвиде Финчере", "person"),
+    ("Женат ли Райан Гослинг?", "person"),
+    ("Какой рост у Тома Харди?", "person"),
+    ("Расскажи об актере Константине Хабенском", "person"),
+    ("Когда родился Сергей Бодров?", "person"),
+
+    ("Как называется фильм, где парень отправился в прошлое на машине DeLorean?", "plot"),
+    ("Фильм про собаку, которая ждала хозяина на станции много лет", "plot"),
+    ("Ищу сериал, где гениальный доктор ставит диагнозы и хромает", "plot"),
+    ("Не могу вспомнить фильм, где девушка видит мир в ярких красках и помогает соседям в Париже", "plot"),
+    ("Мультфильм про девочку-принцессу с волшебной силой льда", "plot"),
+    ("Фильм о человеке, который всю жизнь прожил в телешоу и не знал об этом", "plot"),
+    ("Как называется фильм, где парень видит мертвых людей?", "plot"),
+    ("Кино про бандитов и чемодан с неизвестным содержимым", "plot"),
+
+    ("Посоветуй хороший триллер", "other"),
+    ("Я обожаю фильмы Тарантино", "other"),
+    ("Составь подборку французских комедий", "other"),
+    ("А когда он вышел?", "other"),
+    ("Какие фильмы есть с Томом Хэнксом?", "other"),
+    ("Сколько будет два плюс два?", "other"),
+    ("Расскажи о фильме Дюна и покажи отзывы", "other"),
+    ("Мне не понравился фильм Довод", "other"),
+]
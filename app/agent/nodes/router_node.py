@@ -0,0 +1,273 @@
+import math
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from enum import StrEnum
+
+from langchain_core.messages import AIMessage, FunctionMessage, HumanMessage
+
+from app.agent.graph.state import AgentState
+from app.agent.nodes.planner_node import AgentTask, AgentTaskList
+from app.agent.nodes.router_data import TRAIN_EXAMPLES
+from app.core.config import settings
+from app.core.metrics import registry
+
+
+ROUTER_DECISIONS = registry.counter(
+    "agent_router_decisions_total", "Fast-path router decisions by intent", ("intent", "routed")
+)
+
+
+class Intent(StrEnum):
+    GREETING = "greeting"
+    MOVIE_INFO = "movie_info"
+    REVIEWS = "reviews"
+    PERSON = "person"
+    PLOT = "plot"
+    OTHER = "other"  # the LLM planner decides
+
+
+# High-precision rules, checked before the classifier
+RULES = {
+    Intent.GREETING: re.compile(
+        r"^(всем\s+)?(привет\w*|здравствуй\w*|добрый\s+(день|вечер)|доброе\s+утро|хай|ку|hello|hi"
+        r"|(большое\s+)?спасибо(\s+большое)?|благодарю|пока|до\s+(свидания|встречи))[\s!.,)]*$"
+    ),
+    Intent.REVIEWS: re.compile(r"\b(отзыв\w*|рецензи\w*|что\s+(пишут|думают|говорят)|мнени[яе])"),
+    Intent.PERSON: re.compile(
+        r"\b(кто\s+так(ой|ая)|сколько\s+лет|как(ой|ого)\s+рост\w*|женат|замужем|биографи\w*"
+        r"|где\s+родил\w*|когда\s+(родил|умер)\w*|откуда\s+родом)\b"
+    ),
+    Intent.PLOT: re.compile(
+        r"(как\s+называется|не\s+(могу\s+вспомнить|помню)|забыл\w*\s+название|помоги\w*\s+найти|ищу)"
+        r".*\b(фильм|сериал|мульт|кино)"
+    ),
+}
+# Messages that need the dialogue context or several tools go to the planner
+FALLBACK_RULES = (
+    # preferences are saved by UserPreferencesManager
+    re.compile(r"\b(люблю|нравит\w*|нравят\w*|понравил\w*|обожаю|ненавижу|терпеть не могу)\b"),
+    # references to earlier messages
+    re.compile(r"\b(он|она|оно|они|его|ее|её|него|нее|неё|нем|нём|этот|этого|этом|тот|там|еще|ещё)\b"),
+    # several requests in one message
+    re.compile(r"\b(и|а также)\s+(что|покажи|расскажи|какие|какой|дай)\b"),
+)
+
+TITLE_QUOTES = re.compile(r"[«\"“](.+?)[»\"”]")
+REVIEWS_TITLE = (
+    re.compile(r"\b(?:о|об|про|на|у)\s+(?:фильм\w*|сериал\w*|мультфильм\w*|кино)\s+(.+?)[?.!]*$", re.IGNORECASE),
+    re.compile(r"\b(?:отзыв\w*|рецензи\w*)\s+(?:зрителей\s+|критиков\s+)?(?:о|об|про|на)\s+(.+?)[?.!]*$", re.IGNORECASE),
+)
+# A movie word or a capitalized name/title after the first word
+SUBJECT = re.compile(r"(?i:фильм|сериал|мульт|кино|аниме)|\s[«\"“]?[A-ZА-ЯЁ0-9]")
+PLOT_PREFIX = re.compile(
+    r"^.*?\b(?:фильм\w*|сериал\w*|мультфильм\w*|кино)\s*[,:]?\s*(?:где|в котором|в которой|про|о том,? как|о)?\s*",
+    re.IGNORECASE,
+)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().replace("ё", "е").split())
+
+
+class NaiveBayesClassifier:
+    """Мультиномиальный наивный байес по символьным n-граммам"""
+
+    def __init__(self, ngram_range: tuple[int, int] = (2, 4), alpha: float = 0.1, temperature: float = 5.0):
+        self._ngram_range = ngram_range
+        self._alpha = alpha
+        self._temperature = temperature
+        self._log_priors: dict[str, float] = {}
+        self._log_likelihoods: dict[str, dict[str, float]] = {}
+        self._log_unseen: dict[str, float] = {}
+
+    def _features(self, text: str) -> Counter:
+        # Words are padded so that n-grams capture word starts and endings
+        text = f" {_normalize(text)} "
+        low, high = self._ngram_range
+        return Counter(text[i:i + n] for n in range(low, high + 1) for i in range(len(text) - n + 1))
+
+    def fit(self, examples: list[tuple[str, str]]) -> "NaiveBayesClassifier":
+        counts: dict[str, Counter] = defaultdict(Counter)
+        labels = Counter()
+        for text, label in examples:
+            counts[label].update(self._features(text))
+            labels[label] += 1
+        vocabulary = set().union(*counts.values())
+        for label, features in counts.items():
+            total = sum(features.values()) + self._alpha * len(vocabulary)
+            self._log_priors[label] = math.log(labels[label] / len(examples))
+            self._log_likelihoods[label] = {
+                feature: math.log((count + self._alpha) / total) for feature, count in features.items()
+            }
+            self._log_unseen[label] = math.log(self._alpha / total)
+        self._vocabulary = vocabulary
+        return self
+
+    def predict_proba(self, text: str) -> dict[str, float]:
+        features = {f: c for f, c in self._features(text).items() if f in self._vocabulary}
+        # n-grams of one text are far from independent, so raw naive Bayes is overconfident:
+        # the likelihood is averaged over the n-grams to get usable probabilities
+        size = max(sum(features.values()), 1) / self._temperature
+        scores = {}
+        for label, log_prior in self._log_priors.items():
+            likelihoods, unseen = self._log_likelihoods[label], self._log_unseen[label]
+            likelihood = sum(count * likelihoods.get(f, unseen) for f, count in features.items())
+            scores[label] = log_prior + likelihood / size
+        top = max(scores.values())
+        exp = {label: math.exp(score - top) for label, score in scores.items()}
+        norm = sum(exp.values())
+        return {label: value / norm for label, value in exp.items()}
+
+
+@dataclass(frozen=True)
+class Route:
+    intent: Intent
+    confidence: float
+    plan: AgentTaskList | None  # None — the message goes to the LLM planner
+    source: str  # "rule", "model" or "fallback"
+
+
+class FastRouter:
+    """
+    Быстрый локальный роутер запросов.
+
+    Простые запросы (приветствие, информация о фильме, отзывы, персона, поиск по сюжету) превращаются
+    в план без вызова LLM: сначала проверяются правила, затем классификатор. Если уверенности мало,
+    план не строится и запрос уходит в PlannerNode.
+    """
+
+    def __init__(self, min_confidence: float = settings.FAST_ROUTER_MIN_CONFIDENCE):
+        self._min_confidence = min_confidence
+        self._model = NaiveBayesClassifier().fit(TRAIN_EXAMPLES)
+
+    def classify(self, text: str) -> tuple[Intent, float, str]:
+        normalized = _normalize(text)
+        matched = [intent for intent, rule in RULES.items() if rule.search(normalized)]
+        if len(matched) > 1:
+            return Intent.OTHER, 1.0, "fallback"
+        if matched:
+            intent, confidence, source = matched[0], 1.0, "rule"
+        else:
+            proba = self._model.predict_proba(text)
+            label = max(proba, key=proba.get)
+            intent, confidence, source = Intent(label), proba[label], "model"
+            # Tools need something to search for: a movie word, a title or a name
+            if intent != Intent.GREETING and not SUBJECT.search(text):
+                return Intent.OTHER, confidence, "fallback"
+        # Plot descriptions are full of pronouns, so they are not checked for references
+        if intent != Intent.PLOT and any(rule.search(normalized) for rule in FALLBACK_RULES):
+            return Intent.OTHER, 1.0, "fallback"
+        return intent, confidence, source
+
+    def _plan(self, intent: Intent, text: str) -> AgentTaskList | None:
+        text = text.strip()
+        if intent == Intent.GREETING:
+            return AgentTaskList(tasks=[])
+        if intent == Intent.MOVIE_INFO:
+            return AgentTaskList(tasks=[AgentTask(agent="MoviesSearch", question=text)])
+        if intent == Intent.PERSON:
+            return AgentTaskList(tasks=[AgentTask(agent="PeopleSearchByName", question=text)])
+        if intent == Intent.REVIEWS:
+            # The summarizer expects only the title
+            match = next(filter(None, (pattern.search(text) for pattern in (TITLE_QUOTES, *REVIEWS_TITLE))), None)
+            if not match:
+                return None
+            return AgentTaskList(tasks=[AgentTask(agent="MovieReviewsSummarizer", question=match.group(1).strip())])
+        if intent == Intent.PLOT:
+            description = PLOT_PREFIX.sub("", text, count=1).strip(" ?.!") or text
+            return AgentTaskList(tasks=[AgentTask(agent="MovieSemanticSearch", question=description)])
+        return None
+
+    def route(self, text: str) -> Route:
+        intent, confidence, source = self.classify(text)
+        plan = None
+        if intent != Intent.OTHER and confidence >= self._min_confidence:
+            plan = self._plan(intent, text)
+        return Route(intent, confidence, plan, source if plan is not None else "fallback")
+
+
+class RouterNode:
+    """Узел графа перед PlannerNode: готовый план для простых запросов или передача планировщику"""
+
+    def __init__(
+        self,
+        router: FastRouter | None = None,
+        name: str = "RouterNode",
+        show_logs: bool = False,
+    ):
+        self._router = router or FastRouter()
+        self._name = name
+        self._show_logs = show_logs
+
+    def invoke(self, state: AgentState) -> AgentState:
+        return self._invoke(state)
+
+    def _invoke(self, state: AgentState) -> AgentState:
+        message = state.history[-1] if state.history else None
+        if not isinstance(message, HumanMessage):
+            return state
+
+        route = self._router.route(message.content)
+        # A short follow-up right after the bot's answer ("А Матрица?") usually depends on it
+        follow_up = len(state.history) > 1 and isinstance(state.history[-2], AIMessage)
+        if follow_up and len(message.content) < 25 and route.intent != Intent.GREETING:
+            route = Route(route.intent, route.confidence, None, "fallback")
+        ROUTER_DECISIONS.inc(intent=route.intent.value, routed=str(route.plan is not None).lower())
+        if self._show_logs:
+            print(f"---{self._name}---")
+            print(f"{route.intent} ({route.source}, {route.confidence:.2f})")
+            print("-------------------")
+        if route.plan is None:
+            return state
+
+        state.history.append(
+            FunctionMessage(
+                name=self._name,
+                content=route.plan.model_dump_json(),
+                response_metadata=route.plan.model_dump(),
+            )
+        )
+        return state
+
+    def next_node(self, state: AgentState) -> str:
+        message = state.history[-1]
+        if isinstance(message, FunctionMessage) and message.name == self._name:
+            return "executor"
+        return "planner"
+
+
+if __name__ == "__main__":
+    import time
+
+    from app.agent.nodes.router_data import EVAL_EXAMPLES
+
+    router = FastRouter()
+    correct = routed = routed_correct = 0
+    confusion: dict[tuple[str, str], int] = Counter()
+    latencies = []
+    for text, label in EVAL_EXAMPLES:
+        start = time.perf_counter()
+        route = router.route(text)
+        latencies.append(time.perf_counter() - start)
+        predicted = route.intent if route.plan is not None else Intent.OTHER
+        confusion[(label, predicted)] += 1
+        correct += predicted == label
+        if route.plan is not None:
+            routed += 1
+            routed_correct += predicted == label
+        elif label != Intent.OTHER:
+            print(f"  fallback: {text!r} ({route.intent}, {route.confidence:.2f})")
+        if route.plan is not None and predicted != label:
+            print(f"  wrong: {text!r} -> {predicted}, expected {label}")
+
+    latencies.sort()
+    total = len(EVAL_EXAMPLES)
+    print(f"Accuracy: {correct / total:.1%} ({correct}/{total})")
+    print(f"Coverage (planner skipped): {routed / total:.1%}, precision of skipped: {routed_correct / max(routed, 1):.1%}")
+    print(f"Latency: p50 {latencies[total // 2] * 1000:.3f} ms, p99 {latencies[int(total * 0.99)] * 1000:.3f} ms")
+    for intent in Intent:
+        tp = confusion[(intent, intent)]
+        predicted = sum(v for (_, p), v in confusion.items() if p == intent)
+        actual = sum(v for (a, _), v in confusion.items() if a == intent)
+        print(f"  {intent:<10} precision {tp / max(predicted, 1):.2f} recall {tp / max(actual, 1):.2f}")
@@ -11,6 +11,7 @@ from app.schemas.user import UserPreferenceBase
 from app.models.user import UserPreference as UserPreferenceModel, PreferenceItem, PreferenceType
 from app.core.database import engine
 from app.agent.nodes._base_api_tool import BaseApiTool
+from app.agent.llms.cascade import cascade
 from . import kp_utils
 
 
@@ -113,8 +114,9 @@ class UserPreferencesManager(BaseApiTool):
         name = "UserPreferencesManager",
         description = "По сообщению о предпочтениях пользователя возвращает структурированный список предпочтений",
         show_logs: bool = False,
+        fallback_llm: BaseChatModel | None = None,
     ):
-        self._chain = PromptTemplate.from_template(prompt) | llm | parser
+        self._chain = cascade(lambda model: PromptTemplate.from_template(prompt) | model | parser, llm, fallback_llm, role="preferences")
         self._description = description
         self._name = name
         self._show_logs = show_logs
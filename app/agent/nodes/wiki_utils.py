@@ -0,0 +1,234 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import requests
+import wikipedia
+import wikipedia.wikipedia as wikipedia_api
+wikipedia.set_lang("ru")
+
+from app.core import tracing
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.wiki_store import WIKI_SEARCH_KEYWORDS, wiki_store
+
+
+# Sections that say nothing about the person
+SKIPPED_SECTIONS = ("примечания", "ссылки", "литература", "источники", "см. также")
+
+HEADERS = {"User-Agent": wikipedia_api.USER_AGENT}
+
+# query -> page titles
+WIKI_SEARCH_CACHE = TTLCache(maxsize=10_000, ttl=settings.WIKI_CACHE_TTL)
+# title -> (resolved title, current revision id), short-lived so edits are picked up
+WIKI_REVISION_CACHE = TTLCache(maxsize=10_000, ttl=3600)
+# (title, revision id) -> WikiPage, a revision never changes
+WIKI_PAGE_CACHE = TTLCache(maxsize=2_000, ttl=7 * 24 * 3600)
+
+
+@dataclass(frozen=True)
+class WikiSection:
+    title: str  # "Биография / Ранние годы" for subsections, "" for the lead
+    text: str
+
+
+@dataclass(frozen=True)
+class WikiPage:
+    title: str
+    revision: int
+    sections: tuple[WikiSection, ...]
+
+    @property
+    def summary(self) -> str:
+        return self.sections[0].text if self.sections and not self.sections[0].title else ""
+
+    @property
+    def content(self) -> str:
+        parts = []
+        for section in self.sections:
+            parts.append(f"== {section.title} ==\n{section.text}" if section.title else section.text)
+        return "\n\n".join(parts)
+
+
+_HEADING = re.compile(r"^(={2,6})\s*(.+?)\s*\1\s*$", re.MULTILINE)
+_WORD = re.compile(r"\w+")
+
+
+def split_sections(content: str) -> tuple[WikiSection, ...]:
+    """Делит plain text страницы Википедии на разделы по заголовкам вида == Заголовок =="""
+    sections = []
+    path: list[str] = []
+    position = 0
+    title = ""
+    for match in _HEADING.finditer(content):
+        text = content[position:match.start()].strip()
+        if text:
+            sections.append(WikiSection(title, text))
+        level = len(match.group(1)) - 2
+        path = path[:level] + [match.group(2)]
+        title = " / ".join(path)
+        position = match.end()
+    text = content[position:].strip()
+    if text:
+        sections.append(WikiSection(title, text))
+    return tuple(
+        section for section in sections
+        if not section.title.lower().startswith(SKIPPED_SECTIONS)
+    )
+
+
+def _stems(text: str) -> set[str]:
+    # Crude stemming is enough to match Russian word forms: "фильмы", "фильмах" -> "фильм"
+    return {word[:5] for word in _WORD.findall(text.lower()) if len(word) > 2}
+
+
+def select_sections(page: WikiPage, question: str, max_chars: int = settings.WIKI_MAX_CHARS) -> str:
+    """Вводная часть страницы и разделы, больше всего пересекающиеся по словам с вопросом, в пределах max_chars"""
+    question_stems = _stems(question)
+    scored = []
+    for i, section in enumerate(page.sections):
+        if not section.title:
+            continue
+        score = 3 * len(question_stems & _stems(section.title)) + len(question_stems & _stems(section.text))
+        if score:
+            scored.append((score, i))
+    scored.sort(key=lambda item: (-item[0], item[1]))
+
+    chosen = {0} if page.summary else set()
+    size = len(page.summary)
+    for _, i in scored:
+        section_size = len(page.sections[i].title) + len(page.sections[i].text) + 8
+        if size + section_size > max_chars:
+            continue
+        chosen.add(i)
+        size += section_size
+
+    parts = []
+    for i in sorted(chosen):
+        section = page.sections[i]
+        parts.append(f"== {section.title} ==\n{section.text}" if section.title else section.text)
+    return "\n\n".join(parts)[:max_chars]
+
+
+def _api_query(action: str, params: dict) -> dict:
+    """Часть "query" ответа MediaWiki API или пустой словарь, если запрос не удался"""
+    with tracing.span(f"wikipedia {action}", {"http.request.method": "GET", "wiki.action": action}, kind="CLIENT") as span:
+        try:
+            response = requests.get(
+                wikipedia_api.API_URL,
+                params={"action": "query", "format": "json", **params},
+                headers=HEADERS,
+                timeout=10,
+            )
+            span.set_attribute("http.response.status_code", response.status_code)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            span.record_exception(e)
+            print(f"Wikipedia {action} request failed: {e}")
+            return {}
+        # MediaWiki reports errors such as rate limits with status 200 and an "error" object
+        if "error" in data:
+            print(f"Wikipedia {action} request failed: {data['error'].get('info', data['error'])}")
+            return {}
+        return data.get("query", {})
+
+
+def search(query: str, results: int = 3) -> list[str]:
+    key = (query.lower(), results)
+    titles = WIKI_SEARCH_CACHE.get(key)
+    with tracing.span("wikipedia search", {"cache.hit": titles is not None}, kind="CLIENT"):
+        if titles is None:
+            titles = wikipedia.search(query, results=results)
+            WIKI_SEARCH_CACHE.set(key, titles)
+    return titles
+
+
+def _get_revisions(titles: list[str]) -> dict[str, tuple[str, int]]:
+    revisions = {title: WIKI_REVISION_CACHE.get(title) for title in titles}
+    missing = [title for title, revision in revisions.items() if revision is None]
+    if missing:
+        # One request for all titles
+        response = _api_query("revisions", {
+            "prop": "revisions",
+            "rvprop": "ids",
+            "redirects": "",
+            "titles": "|".join(missing),
+        })
+        if not response:
+            # A failed request is not cached as missing pages
+            return {title: revision for title, revision in revisions.items() if revision and revision[1]}
+        resolved = {title: title for title in missing}
+        for item in response.get("normalized", []) + response.get("redirects", []):
+            for title, target in resolved.items():
+                if target == item["from"]:
+                    resolved[title] = item["to"]
+        current = {
+            page["title"]: page["revisions"][0]["revid"]
+            for page in response.get("pages", {}).values()
+            if page.get("revisions")
+        }
+        for title in missing:
+            # Missing pages are cached too, with revision 0
+            revisions[title] = (resolved[title], current.get(resolved[title], 0))
+            WIKI_REVISION_CACHE.set(title, revisions[title])
+    return {title: revision for title, revision in revisions.items() if revision[1]}
+
+
+def _fetch_page(title: str, revision: int) -> WikiPage:
+    page = WIKI_PAGE_CACHE.get((title, revision))
+    with tracing.span("wikipedia page", {"wiki.title": title, "cache.hit": page is not None}):
+        if page is None:
+            response = _api_query("extracts", {"prop": "extracts", "explaintext": "", "revids": revision})
+            if not response.get("pages"):
+                return WikiPage(title=title, revision=revision, sections=())
+            content = next(iter(response["pages"].values())).get("extract", "")
+            page = WikiPage(title=title, revision=revision, sections=split_sections(content))
+            WIKI_PAGE_CACHE.set((title, revision), page)
+    return page
+
+
+def get_pages(titles: list[str]) -> list[WikiPage]:
+    """Страницы по названиям в исходном порядке; отсутствующие в кэше загружаются параллельно"""
+    revisions = _get_revisions(titles)
+    resolved = [revisions[title] for title in titles if title in revisions]
+    with ThreadPoolExecutor(max_workers=max(len(resolved), 1)) as executor:
+        return list(executor.map(tracing.wrap(lambda item: _fetch_page(*item)), resolved))
+
+
+def get_local_page(name: str, kp_id: int | None = None) -> WikiPage | None:
+    with tracing.span("wiki_store get", {"db.system": "sqlite"}) as span:
+        article = wiki_store.get(name, kp_id)
+        span.set_attribute("cache.hit", article is not None)
+    if article is None:
+        return None
+    page = WIKI_PAGE_CACHE.get((article.title, article.revision))
+    if page is None:
+        page = WikiPage(title=article.title, revision=article.revision, sections=split_sections(article.content))
+        WIKI_PAGE_CACHE.set((article.title, article.revision), page)
+    return page
+
+
+def find_person_page(name: str, kp_id: int | None = None) -> WikiPage | None:
+    # The offline store answers without network, live Wikipedia is only asked on a miss
+    page = get_local_page(name, kp_id)
+    if page is not None:
+        return page
+    for page in get_pages(search(name, results=3)):
+        if any(kw in page.summary for kw in WIKI_SEARCH_KEYWORDS):
+            return page
+    return None  # Персона не найдена или не относится к киноиндустрии
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    name, question = sys.argv[1], sys.argv[2]
+    for attempt in range(2):
+        start = time.perf_counter()
+        page = find_person_page(name)
+        info = select_sections(page, question) if page else None
+        print(f"Attempt {attempt + 1}: {time.perf_counter() - start:.2f}s, "
+              f"{len(page.content) if page else 0} -> {len(info or '')} chars")
+    print(info)
@@ -0,0 +1,3 @@
+from .candidate_pools import CandidatePools, build_candidate_pools, load_movies
+from .engine import Recommendation, RecommenderEngine
+from .embedding import EmbeddingRecommendation, recommend_by_embedding
@@ -0,0 +1,247 @@
+import asyncio
+import copy
+import random
+from array import array
+from dataclasses import dataclass, field
+from typing import Iterable, NamedTuple
+
+from app.core.cache import TTLCache
+from app.models.user import PreferenceItem, PreferenceType
+from app.schemas.user import User as UserSchema, UserPreference as UserPreferenceSchema
+from app.agent.nodes import kp_utils
+from app.agent.nodes.movie import Movie
+
+
+# Similar-movies graph: source movie id -> similar movie ids
+SIMILAR_MOVIES_CACHE = TTLCache(maxsize=50_000, ttl=24 * 3600)
+
+
+class MovieFeatures(NamedTuple):
+    rating: float
+    votes: int
+    year: int
+    genres: tuple[str, ...]
+
+
+def movie_features(doc: dict) -> MovieFeatures:
+    return MovieFeatures(
+        rating=float((doc.get("rating") or {}).get("kp") or 0.0),
+        votes=int((doc.get("votes") or {}).get("kp") or 0),
+        year=int(doc.get("year") or 0),
+        genres=tuple(genre["name"] for genre in doc.get("genres") or []),
+    )
+
+
+async def get_similar_movie_ids(client: kp_utils.AsyncKpClient, movie_id: int) -> list[int]:
+    similar_ids = SIMILAR_MOVIES_CACHE.get(movie_id)
+    if similar_ids is None:
+        api_response = await client.get(kp_utils.MOVIE_SEARCH_URL + f"/{movie_id}")
+        if not api_response:
+            return []
+        similar_ids = [movie["id"] for movie in api_response.get("similarMovies") or []]
+        SIMILAR_MOVIES_CACHE.set(movie_id, similar_ids)
+    return similar_ids
+
+
+async def get_movies_by_ids(client: kp_utils.AsyncKpClient, movie_ids: list[int]) -> list:
+    chunks = [
+        movie_ids[i:i + kp_utils.MAX_PAGE_LIMIT]
+        for i in range(0, len(movie_ids), kp_utils.MAX_PAGE_LIMIT)
+    ]
+    responses = await asyncio.gather(*(
+        client.get(
+            kp_utils.MOVIE_SEARCH_URL,
+            params={
+                "page": 1,
+                "limit": len(chunk),
+                "id": chunk,
+                "selectFields": kp_utils.DEFAULT_SEARCH_PARAMS["selectFields"],
+            },
+        )
+        for chunk in chunks
+    ))
+    return [doc for response in responses if response for doc in response["docs"]]
+
+
+POPULAR_POOL = ("popular", None)
+
+
+def _pool_key(pref: UserPreferenceSchema) -> tuple:
+    if pref.preference_item == PreferenceItem.GENRE:
+        return "genre", pref.item_name.lower()
+    if pref.preference_item == PreferenceItem.MOVIE:
+        return "movie", pref.kp_id
+    return "person", pref.kp_id
+
+
+@dataclass
+class CandidatePools:
+    """
+    Кандидаты для рекомендаций, посчитанные один раз на запуск задачи.
+
+    Списки кандидатов хранятся как массивы id фильмов, данные фильма — один раз в movies.
+    JSON Кинопоиска не хранится: из него сразу разбирается Movie.
+    """
+    by_genre: dict[str, array] = field(default_factory=dict)
+    by_person: dict[int, array] = field(default_factory=dict)
+    by_movie: dict[int, array] = field(default_factory=dict)
+    popular: array = field(default_factory=lambda: array("q"))
+    movies: dict[int, Movie] = field(default_factory=dict)
+    features: dict[int, MovieFeatures] = field(default_factory=dict)
+    # Pools that were not loaded because the API failed, keys of _pool_key
+    unavailable: set[tuple] = field(default_factory=set)
+
+    def add_movies(self, docs: Iterable[dict]) -> array:
+        ids = array("q")
+        for doc in docs:
+            if doc["id"] not in self.movies:
+                self.movies[doc["id"]] = Movie.from_kp(doc)
+                self.features[doc["id"]] = movie_features(doc)
+            ids.append(doc["id"])
+        return ids
+
+    def pool_for(self, pref: UserPreferenceSchema) -> array:
+        if pref.preference_item == PreferenceItem.MOVIE:
+            return self.by_movie.get(pref.kp_id, array("q"))
+        if pref.preference_item == PreferenceItem.GENRE:
+            return self.by_genre.get(pref.item_name.lower(), array("q"))
+        if pref.preference_item in (PreferenceItem.ACTOR, PreferenceItem.DIRECTOR):
+            return self.by_person.get(pref.kp_id, array("q"))
+        raise ValueError("Unknown preference item")
+
+    def require(self, prefs: Iterable[UserPreferenceSchema]) -> None:
+        """
+        :raises kp_utils.KpApiError: если пул кандидатов одного из предпочтений не загрузился —
+            пользователя нужно обработать повторно, а не рекомендовать ему популярное
+        """
+        missing = [key for key in map(_pool_key, prefs) if key in self.unavailable]
+        if missing:
+            raise kp_utils.KpApiError(f"Candidate pools are unavailable: {missing}")
+
+    def select_personalized(
+        self,
+        positive_prefs: list[UserPreferenceSchema],
+        watched_movies: Iterable[int],
+        limit: int,
+        loaded_only: bool = True,
+    ) -> tuple[list[int], list]:
+        """
+        Случайные фильмы из пулов предпочтений пользователя.
+
+        :param loaded_only: Выбирать только фильмы, данные которых уже есть в movies. С False похожие фильмы
+            выбираются по id, и выбранные нужно загрузить через load_movies
+        :return: (id фильмов, предпочтения, из пулов которых они выбраны)
+        """
+        positive_prefs = list(positive_prefs)
+        random.shuffle(positive_prefs)
+        watched_movies = set(watched_movies)
+        movie_ids = []
+        source_prefs = []
+        i = 0
+        while i < limit and positive_prefs:
+            pref = positive_prefs[i % len(positive_prefs)]
+            candidates = [
+                movie_id for movie_id in self.pool_for(pref)
+                if movie_id not in watched_movies and (movie_id in self.movies or not loaded_only)
+            ]
+            if not candidates:
+                positive_prefs.pop(i % len(positive_prefs))
+                continue
+            movie_id = random.choice(candidates)
+            movie_ids.append(movie_id)
+            source_prefs.append(pref)
+            watched_movies.add(movie_id)
+            i += 1
+        return movie_ids, source_prefs
+
+    def select_popular(self, watched_movies: Iterable[int], limit: int) -> list[int]:
+        if POPULAR_POOL in self.unavailable:
+            raise kp_utils.KpApiError("Popular movies pool is unavailable")
+        watched_movies = set(watched_movies)
+        candidates = [movie_id for movie_id in self.popular if movie_id not in watched_movies]
+        return random.sample(candidates, min(limit, len(candidates)))
+
+
+async def load_movies(client: kp_utils.AsyncKpClient, pools: CandidatePools, movie_ids: Iterable[int]) -> None:
+    """Загружает в pools.movies фильмы, которых там ещё нет, пачками по MAX_PAGE_LIMIT id на запрос"""
+    missing_ids = sorted(set(movie_ids) - pools.movies.keys())
+    if missing_ids:
+        pools.add_movies(await get_movies_by_ids(client, missing_ids))
+
+
+async def build_candidate_pools(
+    client: kp_utils.AsyncKpClient,
+    users: list[UserSchema],
+    search_limit: int = 50,
+    concurrency: int = 8,
+    load_similar: bool = True,
+) -> CandidatePools:
+    """
+    :param load_similar: Загрузить данные всех фильмов, похожих на понравившиеся. Нужно RecommenderEngine,
+        который оценивает каждого кандидата; случайному выбору достаточно id, выбранные фильмы загружаются
+        потом через load_movies
+    """
+    liked_genres: set[str] = set()
+    liked_persons: set[int] = set()
+    liked_movies: set[int] = set()
+    for user in users:
+        for pref in user.preferences:
+            if pref.preference_type != PreferenceType.LIKE:
+                continue
+            if pref.preference_item == PreferenceItem.GENRE:
+                liked_genres.add(pref.item_name.lower())
+            elif pref.preference_item in (PreferenceItem.ACTOR, PreferenceItem.DIRECTOR):
+                liked_persons.add(pref.kp_id)
+            elif pref.preference_item == PreferenceItem.MOVIE:
+                liked_movies.add(pref.kp_id)
+
+    pools = CandidatePools()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def search(pool: tuple, param_key: str, param_value, limit: int = search_limit, **extra) -> list:
+        params = copy.deepcopy(kp_utils.DEFAULT_SEARCH_PARAMS)
+        params[param_key] = param_value
+        params["limit"] = limit
+        params.update(extra)
+        try:
+            async with semaphore:
+                api_response = await client.get(kp_utils.MOVIE_SEARCH_URL, params=params)
+        except kp_utils.KpApiError:
+            pools.unavailable.add(pool)
+            return []
+        return api_response["docs"] if api_response else []
+
+    async def similar(movie_id: int) -> list[int]:
+        try:
+            async with semaphore:
+                return await get_similar_movie_ids(client, movie_id)
+        except kp_utils.KpApiError:
+            pools.unavailable.add(("movie", movie_id))
+            return []
+
+    genres = sorted(liked_genres)
+    persons = sorted(liked_persons)
+    movies = sorted(liked_movies)
+    genre_docs, person_docs, similar_ids, popular_docs = await asyncio.gather(
+        asyncio.gather(*(search(("genre", genre), "genres.name", [genre]) for genre in genres)),
+        asyncio.gather(*(search(("person", person), "persons.id", [person]) for person in persons)),
+        asyncio.gather(*(similar(movie) for movie in movies)),
+        search(POPULAR_POOL, "lists", ["top250"], limit=kp_utils.MAX_PAGE_LIMIT),
+    )
+
+    for genre, docs in zip(genres, genre_docs):
+        pools.by_genre[genre] = pools.add_movies(docs)
+    for person, docs in zip(persons, person_docs):
+        pools.by_person[person] = pools.add_movies(docs)
+    pools.popular = pools.add_movies(popular_docs)
+
+    if load_similar:
+        # Liked movies themselves are candidates for users with similar taste
+        try:
+            await load_movies(client, pools, {movie_id for ids in similar_ids for movie_id in ids} | liked_movies)
+        except kp_utils.KpApiError:
+            pools.unavailable.update(("movie", movie) for movie in movies)
+    for movie, ids in zip(movies, similar_ids):
+        pools.by_movie[movie] = array("q", ids)
+
+    return pools
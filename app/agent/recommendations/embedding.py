@@ -0,0 +1,108 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.agent.nodes.movie import Movie
+from app.core.index_db import collection, observe
+from app.models.user import PreferenceItem, PreferenceType
+from app.schemas.user import User as UserSchema, UserPreference as UserPreferenceSchema
+
+
+@dataclass(slots=True)
+class EmbeddingRecommendation:
+    movie_id: int
+    distance: float
+    movie: Movie
+    source_pref: UserPreferenceSchema | None  # liked movie closest to the recommendation
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def get_movie_embeddings(movie_ids: set[int]) -> dict[int, np.ndarray]:
+    if not movie_ids:
+        return {}
+    with observe("get", ids=len(movie_ids)):
+        response = collection.get(ids=[str(movie_id) for movie_id in movie_ids], include=["embeddings"])
+    return {
+        int(movie_id): np.asarray(embedding, dtype=np.float32)
+        for movie_id, embedding in zip(response["ids"], response["embeddings"])
+    }
+
+
+def recommend_by_embedding(
+    users: list[UserSchema],
+    k: int,
+    dislike_weight: float = 0.5,
+    batch_size: int = 64,
+) -> dict[int, list[EmbeddingRecommendation]]:
+    """
+    Рекомендации по вектору вкуса пользователя: среднее эмбеддингов понравившихся фильмов
+    минус dislike_weight * среднее эмбеддингов непонравившихся.
+
+    Пользователи, у которых нет понравившихся фильмов в индексе, в результат не попадают.
+    """
+    movie_prefs = {
+        user.id: [pref for pref in user.preferences if pref.preference_item == PreferenceItem.MOVIE]
+        for user in users
+    }
+    embeddings = get_movie_embeddings({pref.kp_id for prefs in movie_prefs.values() for pref in prefs})
+
+    taste_users, taste_vectors, liked = [], [], {}
+    for user in users:
+        liked_prefs = [
+            pref for pref in movie_prefs[user.id]
+            if pref.preference_type == PreferenceType.LIKE and pref.kp_id in embeddings
+        ]
+        if not liked_prefs:
+            continue
+        disliked = [
+            embeddings[pref.kp_id] for pref in movie_prefs[user.id]
+            if pref.preference_type == PreferenceType.DISLIKE and pref.kp_id in embeddings
+        ]
+        vector = np.mean([embeddings[pref.kp_id] for pref in liked_prefs], axis=0)
+        if disliked:
+            vector = vector - dislike_weight * np.mean(disliked, axis=0)
+        taste_users.append(user)
+        taste_vectors.append(vector)
+        liked[user.id] = liked_prefs
+
+    result: dict[int, list[EmbeddingRecommendation]] = {}
+    if not taste_users:
+        return result
+    taste_matrix = _normalize(np.stack(taste_vectors))
+
+    for start in range(0, len(taste_users), batch_size):
+        batch_users = taste_users[start:start + batch_size]
+        watched = [{pref.kp_id for pref in movie_prefs[user.id]} for user in batch_users]
+        # Over-fetch so that every user still has k results after removing watched movies
+        n_results = k + max(len(ids) for ids in watched)
+        with observe("query", n_results=n_results, queries=len(batch_users)):
+            response = collection.query(
+                query_embeddings=taste_matrix[start:start + batch_size].tolist(),
+                n_results=n_results,
+                include=["metadatas", "distances", "embeddings"],
+            )
+        for i, user in enumerate(batch_users):
+            liked_prefs = liked[user.id]
+            liked_matrix = _normalize(np.stack([embeddings[pref.kp_id] for pref in liked_prefs]))
+            recs = []
+            for movie_id, distance, metadata, embedding in zip(
+                response["ids"][i], response["distances"][i], response["metadatas"][i], response["embeddings"][i]
+            ):
+                if int(movie_id) in watched[i]:
+                    continue
+                closest = int(np.argmax(liked_matrix @ _normalize(np.asarray(embedding, dtype=np.float32))))
+                recs.append(EmbeddingRecommendation(
+                    movie_id=int(movie_id),
+                    distance=float(distance),
+                    movie=Movie.from_chroma(metadata),
+                    source_pref=liked_prefs[closest],
+                ))
+                if len(recs) == k:
+                    break
+            result[user.id] = recs
+    return result
@@ -0,0 +1,206 @@
+import math
+from dataclasses import dataclass
+
+import numpy as np
+import scipy.sparse as sp
+
+from app.models.user import PreferenceItem, PreferenceType
+from app.schemas.user import User as UserSchema, UserPreference as UserPreferenceSchema
+from .candidate_pools import CandidatePools
+
+
+# Weight of a preference feature when it matches a candidate
+FEATURE_WEIGHTS = {
+    "movie": 1.0,   # candidate is similar to a liked/disliked movie
+    "person": 0.8,  # candidate is in the filmography of a liked/disliked person
+    "genre": 0.3,   # candidate has a liked/disliked genre
+}
+
+
+@dataclass(slots=True)
+class Recommendation:
+    movie_id: int
+    score: float
+    source_pref: UserPreferenceSchema | None  # None when driven by popularity or similar users
+
+
+def _matrix(rows: list[int], cols: list[int], values: list[float], shape: tuple[int, int]) -> sp.csr_matrix:
+    return sp.csr_matrix((values, (rows, cols)), shape=shape, dtype=np.float32)
+
+
+def _pref_feature(pref: UserPreferenceSchema) -> str:
+    if pref.preference_item == PreferenceItem.MOVIE:
+        return f"movie:{pref.kp_id}"
+    if pref.preference_item == PreferenceItem.GENRE:
+        return f"genre:{pref.item_name.lower()}"
+    return f"person:{pref.kp_id}"
+
+
+class RecommenderEngine:
+    """
+    Векторизованный рекомендатель поверх матрицы пользователь×признак.
+
+    Оценка кандидата: совпадение признаков с предпочтениями пользователя (похожие фильмы, персоны, жанры),
+    item-item сходство по лайкам всех пользователей и априорная популярность.
+    Совпадения с дизлайками (жанры, персоны, похожие фильмы) вычитаются с весом dislike_weight: кандидат
+    отбрасывается, только если дизлайки перевешивают всё остальное. Уже оценённые фильмы, в том числе
+    дизлайкнутые, не рекомендуются никогда.
+    """
+
+    def __init__(
+        self,
+        pools: CandidatePools,
+        cf_weight: float = 0.5,
+        popularity_weight: float = 0.2,
+        dislike_weight: float = 1.0,
+        chunk_size: int = 1024,
+    ):
+        self._pools = pools
+        self._cf_weight = cf_weight
+        self._popularity_weight = popularity_weight
+        self._dislike_weight = dislike_weight
+        self._chunk_size = chunk_size
+
+    def _build_candidates(self) -> None:
+        pools = self._pools
+        self._candidate_ids = np.fromiter(pools.movies.keys(), dtype=np.int64, count=len(pools.movies))
+        self._candidate_index = {int(movie_id): i for i, movie_id in enumerate(self._candidate_ids)}
+
+        # Candidate features: genres, persons whose filmography contains it, movies it is similar to
+        self._candidate_features: list[set[str]] = [
+            {f"genre:{genre.lower()}" for genre in pools.features[int(movie_id)].genres}
+            for movie_id in self._candidate_ids
+        ]
+        for person, ids in pools.by_person.items():
+            for movie_id in ids:
+                if movie_id in self._candidate_index:
+                    self._candidate_features[self._candidate_index[movie_id]].add(f"person:{person}")
+        for source, ids in pools.by_movie.items():
+            for movie_id in ids:
+                if movie_id in self._candidate_index:
+                    self._candidate_features[self._candidate_index[movie_id]].add(f"movie:{source}")
+
+        popularity = np.array(
+            [
+                pools.features[int(movie_id)].rating * math.log1p(pools.features[int(movie_id)].votes)
+                for movie_id in self._candidate_ids
+            ],
+            dtype=np.float32,
+        )
+        self._popularity = popularity / popularity.max() if len(popularity) and popularity.max() > 0 else popularity
+
+    def fit(self, users: list[UserSchema]) -> "RecommenderEngine":
+        self._users = users
+        self._build_candidates()
+
+        vocabulary: dict[str, int] = {}
+        for features in self._candidate_features:
+            for feature in features:
+                vocabulary.setdefault(feature, len(vocabulary))
+        for user in users:
+            for pref in user.preferences:
+                vocabulary.setdefault(_pref_feature(pref), len(vocabulary))
+        self._vocabulary = vocabulary
+
+        # Candidate x feature
+        rows, cols, values = [], [], []
+        for i, features in enumerate(self._candidate_features):
+            for feature in features:
+                rows.append(i)
+                cols.append(vocabulary[feature])
+                values.append(FEATURE_WEIGHTS[feature.split(":", 1)[0]])
+        self._item_features = _matrix(rows, cols, values, (len(self._candidate_ids), len(vocabulary)))
+
+        # User x feature (likes and dislikes separately), user x candidate likes for item-item similarity
+        like_rows, like_cols, dislike_rows, dislike_cols = [], [], [], []
+        seen_rows, seen_cols, liked_rows, liked_cols = [], [], [], []
+        for u, user in enumerate(users):
+            for pref in user.preferences:
+                feature = vocabulary[_pref_feature(pref)]
+                if pref.preference_type == PreferenceType.LIKE:
+                    like_rows.append(u)
+                    like_cols.append(feature)
+                else:
+                    dislike_rows.append(u)
+                    dislike_cols.append(feature)
+                if pref.preference_item == PreferenceItem.MOVIE and pref.kp_id in self._candidate_index:
+                    seen_rows.append(u)
+                    seen_cols.append(self._candidate_index[pref.kp_id])
+                    if pref.preference_type == PreferenceType.LIKE:
+                        liked_rows.append(u)
+                        liked_cols.append(self._candidate_index[pref.kp_id])
+
+        shape = (len(users), len(vocabulary))
+        self._likes = _matrix(like_rows, like_cols, [1.0] * len(like_rows), shape)
+        self._dislikes = _matrix(dislike_rows, dislike_cols, [1.0] * len(dislike_rows), shape)
+
+        shape = (len(users), len(self._candidate_ids))
+        self._seen = _matrix(seen_rows, seen_cols, [1.0] * len(seen_rows), shape)
+        liked = _matrix(liked_rows, liked_cols, [1.0] * len(liked_rows), shape)
+        self._liked_movies = liked
+
+        # Item-item cosine similarity from co-likes
+        norms = np.sqrt(np.asarray(liked.sum(axis=0)).ravel())
+        norms[norms == 0] = 1.0
+        normalized = liked.multiply(1 / norms).tocsr()
+        self._item_similarity = normalized.T @ normalized
+        return self
+
+    def _score_chunk(self, start: int, stop: int) -> np.ndarray:
+        likes = self._likes[start:stop]
+        dislikes = self._dislikes[start:stop]
+        item_features_t = self._item_features.T
+
+        scores = (likes @ item_features_t).toarray()
+        if self._cf_weight:
+            scores += self._cf_weight * (self._liked_movies[start:stop] @ self._item_similarity).toarray()
+        scores += self._popularity_weight * self._popularity
+
+        # Dislike penalty: a candidate sharing a disliked genre, person or similar-to-disliked movie ranks lower
+        # and is dropped only when the penalty outweighs everything in its favour
+        penalty = (dislikes @ item_features_t).toarray()
+        scores -= self._dislike_weight * penalty
+        scores[(penalty > 0) & (scores <= 0)] = -np.inf
+        # Already rated movies are never recommended again
+        scores[self._seen[start:stop].toarray() > 0] = -np.inf
+        return scores
+
+    def _source_pref(self, user: UserSchema, candidate: int) -> UserPreferenceSchema | None:
+        features = self._candidate_features[candidate]
+        best, best_weight = None, 0.0
+        for pref in user.preferences:
+            if pref.preference_type != PreferenceType.LIKE:
+                continue
+            feature = _pref_feature(pref)
+            weight = FEATURE_WEIGHTS[feature.split(":", 1)[0]]
+            if feature in features and weight > best_weight:
+                best, best_weight = pref, weight
+        return best
+
+    def recommend(self, k: int) -> dict[int, list[Recommendation]]:
+        result: dict[int, list[Recommendation]] = {}
+        n_candidates = len(self._candidate_ids)
+        if not n_candidates:
+            return {user.id: [] for user in self._users}
+        k = min(k, n_candidates)
+
+        for start in range(0, len(self._users), self._chunk_size):
+            stop = min(start + self._chunk_size, len(self._users))
+            scores = self._score_chunk(start, stop)
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+            for row, user in enumerate(self._users[start:stop]):
+                result[user.id] = [
+                    Recommendation(
+                        movie_id=int(self._candidate_ids[candidate]),
+                        score=float(score),
+                        source_pref=self._source_pref(user, int(candidate)),
+                    )
+                    for candidate, score in zip(top[row], top_scores[row])
+                    if np.isfinite(score)
+                ]
+        return result
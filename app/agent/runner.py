@@ -0,0 +1,122 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Literal
+
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+from app.core import tracing
+from app.core.config import settings
+from app.core.metrics import registry
+from .graph.movie_agent import MovieAgent
+from .graph.state import AgentState
+
+
+ExecutionMode = Literal["thread", "process"]
+
+
+def serialize_state(state: AgentState) -> dict:
+    return {
+        "history": messages_to_dict(state.history),
+        "user_id": state.user_id,
+        "user_preferences": [pref.model_dump(mode="json") for pref in state.user_preferences],
+        "summary": state.summary,
+    }
+
+
+def deserialize_state(data: dict) -> AgentState:
+    return AgentState(
+        history=messages_from_dict(data["history"]),
+        user_id=data["user_id"],
+        user_preferences=data["user_preferences"],
+        summary=data["summary"],
+    )
+
+
+def _init_worker() -> None:
+    # Building the agent (LLM clients, graph, prompts) happens once per worker process
+    import app.agent  # noqa: F401
+
+
+def _invoke_in_worker(data: dict, trace_context: dict | None = None) -> tuple[dict, list[tuple]]:
+    from app.agent import agent_instance
+
+    # Spans of the worker continue the trace of the bot turn
+    with tracing.attach(trace_context):
+        state = serialize_state(agent_instance.invoke(deserialize_state(data)))
+    # Node, tool and LLM metrics recorded here are exported by the bot process.
+    # Metrics of a failed run stay in the worker until its next successful run
+    return state, registry.drain()
+
+
+class AgentRunner:
+    """
+    Запускает MovieAgent вне event loop бота.
+
+    В режиме "thread" агент выполняется в пуле потоков текущего процесса,
+    в режиме "process" — в пуле процессов, которым передаётся сериализованный AgentState.
+    """
+
+    def __init__(
+        self,
+        agent: MovieAgent,
+        mode: ExecutionMode = "thread",
+        workers: int = 4,
+    ):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unsupported agent execution mode: {mode}")
+        self._agent = agent
+        self._mode = mode
+        self._workers = workers
+        self._pool: ProcessPoolExecutor | None = None
+
+    @property
+    def mode(self) -> ExecutionMode:
+        return self._mode
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self._workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return self._pool
+
+    async def ainvoke(self, state: AgentState) -> AgentState:
+        if self._mode == "thread":
+            return await asyncio.to_thread(self._agent.invoke, state)
+        loop = asyncio.get_running_loop()
+        data, metrics = await loop.run_in_executor(
+            self._get_pool(), _invoke_in_worker, serialize_state(state), tracing.current_context()
+        )
+        registry.merge(metrics)
+        return deserialize_state(data)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+async def compare_execution_modes(question: str, runs: int = 16, workers: int = settings.AGENT_WORKERS) -> None:
+    import time
+    from langchain_core.messages import HumanMessage
+    from app.agent import agent_instance
+
+    for mode in ("thread", "process"):
+        runner = AgentRunner(agent_instance, mode, workers)
+        if mode == "process":
+            # Warm up the worker processes so start-up cost is not measured
+            await asyncio.gather(*(runner.ainvoke(AgentState(history=[HumanMessage(question)], user_id=0, user_preferences=[]))
+                                   for _ in range(workers)))
+        start = time.perf_counter()
+        await asyncio.gather(*(runner.ainvoke(AgentState(history=[HumanMessage(question)], user_id=0, user_preferences=[]))
+                               for _ in range(runs)))
+        elapsed = time.perf_counter() - start
+        runner.shutdown()
+        print(f"{mode}: {runs} runs in {elapsed:.2f}s, {runs / elapsed * 60:.1f} runs/min")
+
+
+if __name__ == "__main__":
+    asyncio.run(compare_execution_modes("Расскажи о фильме Интерстеллар"))
@@ -1,10 +1,7 @@
 from aiogram import Bot, Router, html
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
 from aiogram.filters import Command
 from aiogram.types import Message, BotCommand
 
-from app.core.config import settings
 from app.core.database import async_session_factory
 from app import crud
 from app.agent.llms import LLMFactory
@@ -63,6 +60,9 @@ async def start(message: Message):
         curr_user = await crud.user.get_by_tg_chat_id(session, tg_chat_id)
         if not curr_user:
             curr_user = await crud.user.create(session, {"full_name": message.from_user.full_name, "tg_chat_id": tg_chat_id})
+        elif not curr_user.is_active:
+            # The user was deactivated after blocking the bot and came back
+            await crud.user.set_active_by_tg_chat_id(session, tg_chat_id, True)
 
     text = HELLO_MESSAGE.format(user_name=html.bold(curr_user.full_name))
     await message.answer(text)
@@ -72,15 +72,11 @@ async def start(message: Message):
     Command("test_autonomous_task")
 )
 async def test_autonomous_task(message: Message):
-    bot = Bot(
-        settings.TELEGRAM_TOKEN,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
-    llm = LLMFactory.get_llm(settings.LLM_NAME)
+    llm = LLMFactory.get_role_llm("autonomous")
 
     async with async_session_factory() as session:
         task = RecommendUsersAutonomousTask(llm, show_logs=True)
-        await task.ainvoke(session, bot, message.chat.id)
+        await task.ainvoke(session, message.bot, message.chat.id)
 
     await message.answer("Test autonomous task triggered.")
 
@@ -1,59 +1,95 @@
+import time
 import traceback
 from aiogram import Router
 from aiogram.types import Message
 
 from app.core.config import settings
-from app.agent import agent_instance, build_state
+from app.agent import agent_runner, build_state, conversation_memory
+from app.core import tracing
 from app.core.database import async_session_factory
+from app.core.metrics import registry
 from app import crud
+from .work_queue import ChatWorkQueue
 
 
 router = Router(name="messages-router")
 
+TURN_LATENCY = registry.histogram(
+    "agent_turn_latency_seconds", "Time from taking a turn off the queue to the answer sent", ("status",),
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 20.0, 30.0, 45.0, 60.0, 120.0),
+)
+
+
+async def process_turn(messages: list[Message], status_message: Message | None = None) -> None:
+    message = messages[-1]
+    start = time.perf_counter()
+    status = "ok"
+    with tracing.span("general_handler", {"chat.id": message.chat.id, "turn.messages": len(messages)}, kind="SERVER") as span:
+        try:
+            if status_message:
+                await status_message.edit_text("Обрабатываю Ваш запрос, подождите... 🔎")
+            else:
+                status_message = await message.answer("Обрабатываю Ваш запрос, подождите... 🔎")
+
+            async with async_session_factory() as session:
+                # Save user's messages
+                curr_user = await crud.user.get_by_tg_chat_id(session, message.chat.id)
+                if not curr_user:
+                    curr_user = await crud.user.create(session, {"full_name": message.from_user.full_name, "tg_chat_id": message.chat.id})
+                for msg in messages:
+                    await crud.message.create(
+                        session,
+                        {
+                            "user_id": curr_user.id,
+                            "content": msg.text,
+                            "message_type": "human",
+                            "trace_id": span.trace_id,
+                        }
+                    )
+
+                summary, history = await conversation_memory.load(session, curr_user.id, len(messages))
+                state = build_state(
+                    [(msg.message_type.value, msg.content) for msg in history], curr_user.id, curr_user.preferences, summary
+                )
+                new_state = await agent_runner.ainvoke(state)
+
+                answ_type, answ_text = new_state.history[-1].type, new_state.history[-1].content
+
+                # Save bot's response
+                await crud.message.create(
+                    session,
+                    {
+                        "user_id": curr_user.id,
+                        "content": answ_text,
+                        "message_type": answ_type,
+                        "trace_id": span.trace_id,
+                    }
+                )
+
+                # Edit the status message with the final response
+                await status_message.edit_text(answ_text)
+
+            # Messages leaving the history window are folded into the summary while the user reads the answer
+            conversation_memory.schedule_update(curr_user.id)
+
+        except Exception as e:
+            status = "error"
+            span.record_exception(e)
+            print(e)
+            traceback.print_exc()
+            await message.answer("Internal error")
+        finally:
+            TURN_LATENCY.observe(time.perf_counter() - start, status=status)
+
+
+work_queue = ChatWorkQueue(
+    process_turn,
+    max_concurrent_runs=settings.MAX_CONCURRENT_AGENT_RUNS,
+    max_pending=settings.MAX_PENDING_MESSAGES,
+    coalesce_delay=settings.MESSAGE_COALESCE_DELAY,
+)
+
+
 @router.message()
 async def general_handler(message: Message) -> None:
-    text = message.text
-    try:
-
-        status_message = await message.answer("Обрабатываю Ваш запрос, подождите... 🔎")
-
-        async with async_session_factory() as session:
-            # Save user's message
-            curr_user = await crud.user.get_by_tg_chat_id(session, message.chat.id)
-            if not curr_user:
-                curr_user = await crud.user.create(session, {"full_name": message.from_user.full_name, "tg_chat_id": message.chat.id})
-            await crud.message.create(
-                session, 
-                {
-                    "user_id": curr_user.id,
-                    "content": text,
-                    "message_type": "human"
-                }
-            )
-
-            # Refresh user
-            curr_user = await crud.user.get_by_tg_chat_id(session, message.chat.id)
-        
-            messages = curr_user.messages[-settings.USER_HISTORY_LIMIT:]
-            state = build_state([(msg.message_type.value, msg.content) for msg in messages], curr_user.id, curr_user.preferences)
-            new_state = agent_instance.invoke(state)
-
-            answ_type, answ_text = new_state.history[-1].type, new_state.history[-1].content
-            
-            # Save bot's response
-            await crud.message.create(
-                session,
-                {
-                    "user_id": curr_user.id,
-                    "content": answ_text,
-                    "message_type": answ_type
-                }
-            )
-            
-            # Edit the status message with the final response
-            await status_message.edit_text(answ_text)
-
-    except Exception as e:
-        print(e)
-        traceback.print_exc()
-        await message.answer("Internal error")
+    await work_queue.submit(message)
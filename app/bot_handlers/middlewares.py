@@ -0,0 +1,56 @@
+import asyncio
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+
+class InFlightTracker:
+    """Counts updates that are still being processed so shutdown can wait for them"""
+
+    def __init__(self):
+        self._count = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.draining = False
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @contextmanager
+    def track(self):
+        self._count += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._count -= 1
+            if self._count == 0:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class InFlightMiddleware(BaseMiddleware):
+    def __init__(self, tracker: InFlightTracker):
+        self._tracker = tracker
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        with self._tracker.track():
+            return await handler(event, data)
+
+
+in_flight = InFlightTracker()
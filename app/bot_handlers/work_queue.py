@@ -0,0 +1,141 @@
+import asyncio
+import time
+import traceback
+from typing import Awaitable, Callable
+
+from aiogram.types import Message
+
+from app.core.metrics import registry
+from .middlewares import in_flight
+
+
+QUEUE_WAIT = registry.histogram(
+    "agent_queue_wait_seconds", "Time from receiving a message to the start of its agent run"
+)
+COALESCED_MESSAGES = registry.counter(
+    "agent_queue_coalesced_messages_total", "Messages merged into another message's agent run"
+)
+SHED_MESSAGES = registry.counter(
+    "agent_queue_shed_messages_total", "Messages rejected because the queue was full"
+)
+
+QUEUED_MESSAGE = "Сейчас много запросов. Ваш запрос в очереди (позиция {position}), ответ скоро будет ⏳"
+SHED_MESSAGE = "Извините, сейчас я получаю слишком много запросов 🙏 Пожалуйста, повторите сообщение через пару минут."
+
+
+TurnProcessor = Callable[[list[Message], Message | None], Awaitable[None]]
+
+
+class ChatWorkQueue:
+    """
+    Очередь запусков агента.
+
+    Сообщения одного чата обрабатываются строго по порядку, пачка сообщений, пришедших подряд,
+    объединяется в один запуск. Число одновременных запусков агента ограничено семафором.
+    """
+
+    def __init__(
+        self,
+        process_turn: TurnProcessor,
+        max_concurrent_runs: int,
+        max_pending: int,
+        coalesce_delay: float,
+    ):
+        self._process_turn = process_turn
+        self._semaphore = asyncio.Semaphore(max_concurrent_runs)
+        self._max_pending = max_pending
+        self._coalesce_delay = coalesce_delay
+
+        self._pending: dict[int, list[tuple[Message, float]]] = {}
+        self._workers: dict[int, asyncio.Task] = {}
+        self._pending_count = 0
+        self._waiting_runs = 0
+        self._active_runs = 0
+
+        registry.gauge("agent_queue_depth", "Messages waiting for an agent run").set_function(
+            lambda: self._pending_count
+        )
+        registry.gauge("agent_queue_waiting_chats", "Chats waiting for a free agent slot").set_function(
+            lambda: self._waiting_runs
+        )
+        registry.gauge("agent_runs_active", "Agent runs currently executing").set_function(
+            lambda: self._active_runs
+        )
+
+    @property
+    def depth(self) -> int:
+        return self._pending_count
+
+    async def submit(self, message: Message) -> bool:
+        if self._pending_count >= self._max_pending:
+            SHED_MESSAGES.inc()
+            await message.answer(SHED_MESSAGE)
+            return False
+
+        chat_id = message.chat.id
+        self._pending.setdefault(chat_id, []).append((message, time.monotonic()))
+        self._pending_count += 1
+        if chat_id not in self._workers:
+            worker = asyncio.create_task(self._chat_worker(chat_id))
+            worker.add_done_callback(self._log_worker_error)
+            self._workers[chat_id] = worker
+        return True
+
+    @staticmethod
+    def _log_worker_error(worker: asyncio.Task) -> None:
+        if not worker.cancelled() and worker.exception() is not None:
+            print(f"Chat worker {worker.get_name()} failed: {worker.exception()!r}")
+            traceback.print_exception(worker.exception())
+
+    async def _notify_queued(self, chat_id: int) -> Message | None:
+        first_message = self._pending[chat_id][0][0]
+        try:
+            return await first_message.answer(QUEUED_MESSAGE.format(position=self._waiting_runs + 1))
+        except Exception as e:
+            # The turn still runs, process_turn sends its own status message
+            print(f"Chat {chat_id}: failed to send the queue notification: {e!r}")
+            return None
+
+    async def _chat_worker(self, chat_id: int) -> None:
+        with in_flight.track():
+            try:
+                while chat_id in self._pending:
+                    # A burst of messages is still arriving, give it a moment to be answered in one turn.
+                    # A single message starts at once
+                    if len(self._pending[chat_id]) > 1:
+                        await asyncio.sleep(self._coalesce_delay)
+
+                    status_message = None
+                    if self._semaphore.locked():
+                        status_message = await self._notify_queued(chat_id)
+
+                    self._waiting_runs += 1
+                    try:
+                        await self._semaphore.acquire()
+                    finally:
+                        self._waiting_runs -= 1
+
+                    self._active_runs += 1
+                    try:
+                        batch = self._pending.pop(chat_id)
+                        self._pending_count -= len(batch)
+                        now = time.monotonic()
+                        for _, received_at in batch:
+                            QUEUE_WAIT.observe(now - received_at)
+                        if len(batch) > 1:
+                            COALESCED_MESSAGES.inc(len(batch) - 1)
+
+                        await self._process_turn([message for message, _ in batch], status_message)
+                    except Exception as e:
+                        # The next messages of the chat are still answered
+                        print(f"Chat {chat_id}: turn of {len(batch)} messages failed: {e!r}")
+                        traceback.print_exc()
+                    finally:
+                        self._active_runs -= 1
+                        self._semaphore.release()
+            finally:
+                del self._workers[chat_id]
+                dropped = self._pending.pop(chat_id, None)
+                if dropped:
+                    self._pending_count -= len(dropped)
+                    print(f"Chat {chat_id}: dropped {len(dropped)} pending messages")
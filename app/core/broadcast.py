@@ -0,0 +1,268 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from enum import StrEnum
+from typing import Any, Awaitable, Callable, Iterable
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+from app import crud
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.core.metrics import registry
+from app.core.rate_limit import AsyncTokenBucket, telegram_broadcast_limiter
+
+
+BROADCAST_MESSAGES = registry.counter(
+    "broadcast_messages_total", "Bulk messages by delivery status", ("status",)
+)
+BROADCAST_THROTTLED = registry.counter(
+    "broadcast_throttled_total", "RetryAfter responses received during bulk sends"
+)
+
+
+class DeliveryStatus(StrEnum):
+    DELIVERED = "delivered"
+    BLOCKED = "blocked"  # the user blocked the bot or the chat is gone
+    FAILED = "failed"
+
+
+@dataclass
+class BroadcastMessage:
+    chat_id: int
+    text: str
+    key: Any = None  # caller's id of the message (e.g. user id), passed back to on_result
+    attempts: int = 0
+
+
+@dataclass
+class BroadcastStats:
+    delivered: int = 0
+    blocked: int = 0
+    failed: int = 0
+    throttled: int = 0  # RetryAfter responses
+    retried: int = 0
+    elapsed: float = 0.0
+
+    def record(self, status: DeliveryStatus) -> None:
+        if status == DeliveryStatus.DELIVERED:
+            self.delivered += 1
+        elif status == DeliveryStatus.BLOCKED:
+            self.blocked += 1
+        else:
+            self.failed += 1
+
+    def add(self, other: "BroadcastStats") -> None:
+        self.delivered += other.delivered
+        self.blocked += other.blocked
+        self.failed += other.failed
+        self.throttled += other.throttled
+        self.retried += other.retried
+        self.elapsed += other.elapsed
+
+
+@dataclass
+class FloodControl:
+    """
+    Ограничения Telegram, общие для всех рассылок процесса.
+
+    paused_until — до какого момента (time.monotonic) действует пауза после TelegramRetryAfter,
+    chat_next_send — когда в чат можно писать следующий раз.
+    """
+    paused_until: float = 0.0
+    chat_next_send: dict[int, float] = field(default_factory=dict)
+    max_chats: int = 100_000
+
+    def pause(self, delay: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+    async def wait_pause(self) -> None:
+        while (delay := self.paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+    def reserve_chat(self, chat_id: int, interval: float) -> float:
+        """Занимает следующее окно отправки в чат и возвращает его начало"""
+        now = time.monotonic()
+        if len(self.chat_next_send) >= self.max_chats and chat_id not in self.chat_next_send:
+            # Chats whose interval has passed need no entry
+            self.chat_next_send = {key: value for key, value in self.chat_next_send.items() if value > now}
+        send_at = max(now, self.chat_next_send.get(chat_id, now))
+        self.chat_next_send[chat_id] = send_at + interval
+        return send_at
+
+
+# Flood control applies to the whole bot, so a RetryAfter seen by one broadcast pauses every sender
+flood_control = FloodControl()
+
+
+class BroadcastSender:
+    """
+    Массовая отправка сообщений с учётом лимитов Telegram.
+
+    Общий для процесса token bucket ограничивает скорость отправки всего бота, в один чат пишем не чаще раза
+    в per_chat_interval секунд. TelegramRetryAfter приостанавливает все отправки процесса на retry_after секунд,
+    сообщение повторяется не более max_retries раз. Пользователи, заблокировавшие бота, помечаются неактивными.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        limiter: AsyncTokenBucket = telegram_broadcast_limiter,
+        limits: FloodControl = flood_control,
+        per_chat_interval: float = settings.BROADCAST_PER_CHAT_INTERVAL,
+        max_retries: int = settings.BROADCAST_MAX_RETRIES,
+        retry_queue_size: int = settings.BROADCAST_RETRY_QUEUE_SIZE,
+        show_logs: bool = False,
+    ):
+        self._bot = bot
+        self._bucket = limiter
+        self._limits = limits
+        self._per_chat_interval = per_chat_interval
+        self._max_retries = max_retries
+        self._retry_queue_size = retry_queue_size
+        self._show_logs = show_logs
+
+    async def _wait_turn(self, chat_id: int) -> None:
+        delay = self._limits.reserve_chat(chat_id, self._per_chat_interval) - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        await self._bucket.acquire()
+        await self._limits.wait_pause()
+
+    async def _deactivate(self, chat_id: int) -> None:
+        try:
+            async with async_session_factory() as session:
+                await crud.user.set_active_by_tg_chat_id(session, chat_id, False)
+        except Exception as e:
+            print(f"Broadcast: failed to deactivate chat {chat_id}: {e}")
+
+    async def _deliver(self, message: BroadcastMessage, stats: BroadcastStats) -> DeliveryStatus | float:
+        """Одна попытка отправки: статус доставки или задержка в секундах перед повтором"""
+        await self._wait_turn(message.chat_id)
+        message.attempts += 1
+        try:
+            await self._bot.send_message(message.chat_id, message.text)
+        except TelegramRetryAfter as e:
+            stats.throttled += 1
+            BROADCAST_THROTTLED.inc()
+            self._limits.pause(e.retry_after)
+            if self._show_logs:
+                print(f"Broadcast: flood control, pausing for {e.retry_after}s")
+            return float(e.retry_after)
+        except TelegramForbiddenError:
+            await self._deactivate(message.chat_id)
+            return DeliveryStatus.BLOCKED
+        except TelegramBadRequest as e:
+            if "chat not found" in e.message.lower():
+                await self._deactivate(message.chat_id)
+                return DeliveryStatus.BLOCKED
+            print(f"Broadcast: failed to send to chat {message.chat_id}: {e}")
+            return DeliveryStatus.FAILED
+        except (TelegramNetworkError, TelegramServerError):
+            return float(2 ** message.attempts)
+        except Exception as e:
+            print(f"Broadcast: failed to send to chat {message.chat_id}: {e}")
+            return DeliveryStatus.FAILED
+        return DeliveryStatus.DELIVERED
+
+    def _finish(self, status: DeliveryStatus, stats: BroadcastStats) -> DeliveryStatus:
+        stats.record(status)
+        BROADCAST_MESSAGES.inc(status=status.value)
+        return status
+
+    async def send(self, chat_id: int, text: str, stats: BroadcastStats | None = None) -> DeliveryStatus:
+        """Отправляет одно сообщение, повторяя его после RetryAfter и сетевых ошибок"""
+        stats = stats if stats is not None else BroadcastStats()
+        message = BroadcastMessage(chat_id, text)
+        while True:
+            result = await self._deliver(message, stats)
+            if isinstance(result, DeliveryStatus):
+                return self._finish(result, stats)
+            if message.attempts > self._max_retries:
+                return self._finish(DeliveryStatus.FAILED, stats)
+            stats.retried += 1
+            await asyncio.sleep(result)
+
+    async def broadcast(
+        self,
+        messages: Iterable[BroadcastMessage],
+        on_result: Callable[[BroadcastMessage, DeliveryStatus], Awaitable[None]] | None = None,
+        workers: int = 8,
+    ) -> BroadcastStats:
+        """
+        Рассылает сообщения пулом воркеров.
+
+        Сообщения, которые нужно повторить, ждут своего времени вне воркеров; одновременно ждать могут
+        не больше retry_queue_size сообщений, остальные сразу считаются недоставленными.
+        """
+        stats = BroadcastStats()
+        start = time.perf_counter()
+        queue: asyncio.Queue[BroadcastMessage] = asyncio.Queue()
+        for message in messages:
+            queue.put_nowait(message)
+        pending = queue.qsize()
+        all_done = asyncio.Event()
+        retrying: set[asyncio.Task] = set()
+
+        async def done(message: BroadcastMessage, status: DeliveryStatus) -> None:
+            nonlocal pending
+            try:
+                self._finish(status, stats)
+                if on_result:
+                    await on_result(message, status)
+            except Exception as e:
+                print(f"Broadcast: result callback failed for chat {message.chat_id}: {e}")
+            finally:
+                # Every message is accounted for exactly once, whatever failed, or broadcast() would wait forever
+                pending -= 1
+                if not pending:
+                    all_done.set()
+
+        async def requeue(message: BroadcastMessage, delay: float) -> None:
+            await asyncio.sleep(delay)
+            queue.put_nowait(message)
+
+        async def worker() -> None:
+            while True:
+                message = await queue.get()
+                try:
+                    result = await self._deliver(message, stats)
+                    if isinstance(result, DeliveryStatus):
+                        status = result
+                    elif message.attempts > self._max_retries or len(retrying) >= self._retry_queue_size:
+                        status = DeliveryStatus.FAILED
+                    else:
+                        stats.retried += 1
+                        task = asyncio.create_task(requeue(message, result))
+                        retrying.add(task)
+                        task.add_done_callback(retrying.discard)
+                        continue
+                except Exception as e:
+                    # E.g. the rate limiter failed: the message fails, the worker goes on with the next one
+                    print(f"Broadcast: failed to send to chat {message.chat_id}: {e}")
+                    status = DeliveryStatus.FAILED
+                await done(message, status)
+
+        if not pending:
+            return stats
+        tasks = [asyncio.create_task(worker()) for _ in range(min(workers, pending))]
+        try:
+            await all_done.wait()
+        finally:
+            for task in [*tasks, *retrying]:
+                task.cancel()
+            await asyncio.gather(*tasks, *retrying, return_exceptions=True)
+
+        stats.elapsed = time.perf_counter() - start
+        if self._show_logs:
+            print(f"Broadcast: delivered {stats.delivered}, blocked {stats.blocked}, failed {stats.failed}, "
+                  f"throttled {stats.throttled} ({stats.elapsed:.1f}s)")
+        return stats
@@ -1,4 +1,5 @@
 import os
+from typing import Literal
 
 from pydantic import (
     Field,
@@ -19,22 +20,113 @@ class Settings(BaseSettings):
     ASYNC_DB_URI: str
     DROP_DB: bool = False
     VERBOSE_DB: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 10.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 500
 
     # Telegram bot
     TELEGRAM_TOKEN: str
     USE_WEBHOOK: bool = False
+    WEBHOOK_BASE_URL: str = ""
+    WEBHOOK_PATH: str = "/webhook"
+    WEBHOOK_SECRET: str = ""
+    WEBHOOK_WORKERS: int = 1
+    WEBAPP_HOST: str = "0.0.0.0"
+    WEBAPP_PORT: int = 8080
+    HEALTH_PATH: str = "/health"
+    METRICS_PATH: str = "/metrics"
+    # Prometheus metrics, 0 (default) disables them. Served on METRICS_PORT in polling mode and on WEBAPP_PORT
+    # with one webhook worker. With WEBHOOK_WORKERS > 1 every worker has its own registry, so worker i listens
+    # on METRICS_PORT + i and each one is scraped separately instead of a random worker behind the shared port
+    METRICS_PORT: int = 0
+    SHUTDOWN_GRACE_PERIOD: float = 5.0  # seconds /health reports draining before the webhook listener closes
+    SHUTDOWN_DRAIN_TIMEOUT: float = 60.0
+    MAX_CONCURRENT_AGENT_RUNS: int = 8
+    MAX_PENDING_MESSAGES: int = 200
+    MESSAGE_COALESCE_DELAY: float = 1.0  # seconds to wait for more messages when several from one chat are queued
 
     # LLM agent
     KP_API_KEY: str
+    KP_BASE_URL: str = "https://api.kinopoisk.dev/v1.4"
     LLM_NAME: str
     OPENAI_API_KEY: str
+    # Models of the agent roles, empty - LLM_NAME
+    LLM_PLANNER: str = ""
+    LLM_PARAMS: str = ""  # Kinopoisk/people API parameters
+    LLM_PREFERENCES: str = ""
+    LLM_TOOL_ANSWER: str = ""
+    LLM_EXECUTOR: str = ""  # final answer
+    LLM_AUTONOMOUS: str = ""
+    LLM_SUMMARY: str = ""  # conversation summary
+    LLM_CASCADE_MODEL: str = ""  # structured outputs that fail validation are retried on this model, empty disables
     VERBOSE_AGENT: bool = False
-    USER_HISTORY_LIMIT: int = 5
+    USER_HISTORY_LIMIT: int = 5  # messages in the prompt when the conversation summary is disabled
+    # Older messages are folded into a rolling summary after each turn,
+    # the recent ones go to the prompt as is while they fit in HISTORY_WINDOW_TOKENS
+    CONVERSATION_SUMMARY_ENABLED: bool = False
+    CONVERSATION_SUMMARY_MAX_TOKENS: int = 400
+    HISTORY_WINDOW_TOKENS: int = 1500
+    HISTORY_WINDOW_MAX_MESSAGES: int = 50  # unsummarized messages read from the database
+    AGENT_EXECUTION_MODE: Literal["thread", "process"] = "thread"
+    AGENT_WORKERS: int = 4
+    AUTONOMOUS_TASK_WORKERS: int = 8
+    RECOMMENDER_MODE: Literal["random", "engine", "embedding"] = "random"
+    # "llm" - one LLM call per user, "batch" - the same prompts generated a batch of users at a time,
+    # "fragments" - messages assembled from cached per-movie blurbs
+    AUTONOMOUS_MESSAGE_MODE: Literal["llm", "batch", "fragments"] = "llm"
+    AUTONOMOUS_BATCH_SIZE: int = 64  # users per batched generation step
+    AUTONOMOUS_TASK_SCHEDULE: str = ""  # cron expression in UTC, e.g. "0 16 * * 5"; empty disables the scheduler
+    AUTONOMOUS_TASK_SHARDS: int = 4  # users are split by user.id % shards
+    AUTONOMOUS_TASK_SHARD_WINDOW: float = 3600.0  # seconds over which shard starts are spread
+    AUTONOMOUS_TASK_JITTER: float = 300.0
+    AUTONOMOUS_TASK_MAX_ATTEMPTS: int = 3  # attempts of a scheduled run before its failed users are given up
+    AUTONOMOUS_TASK_RETRY_DELAY: float = 600.0  # seconds before a run with failed users is retried
+    # Kinopoisk requests per second available to background tasks. The budget is per process:
+    # with N replicas running shards at once the API sees up to N * KP_BACKGROUND_RPS
+    KP_BACKGROUND_RPS: float = 2.0
+    KP_BACKGROUND_BURST: int = 5
+    BROADCAST_RATE: float = 25.0  # messages per second, Telegram allows about 30 for bulk sends
+    BROADCAST_PER_CHAT_INTERVAL: float = 1.0
+    BROADCAST_MAX_RETRIES: int = 3
+    BROADCAST_RETRY_QUEUE_SIZE: int = 1000  # messages waiting for a retry at the same time
+    PLANNER_MODE: Literal["text", "structured"] = "text"
+    PLANNER_REASONING: bool = False  # ask for a short reasoning before the plan in structured mode
+    PLANNER_STRUCTURED_METHOD: Literal["function_calling", "json_schema", "json_mode"] = "function_calling"
+    TIKTOKEN_ENCODING: str = "o200k_base"  # gpt-4o tokenizer, used to count prompt tokens
+    PROMPT_BUDGET_EXECUTOR: int = 8000  # tokens of the final answer prompt
+    PROMPT_BUDGET_TOOL: int = 8000  # tokens of a tool answer prompt
+    # "llm" - a tool answers in prose with its own LLM call, "raw" - it returns compact API facts
+    # and only ExecutorNode writes the answer
+    TOOL_ANSWER_MODE: Literal["llm", "raw"] = "llm"
+    # Per-tool overrides, e.g. {"PeopleSearchByName": "llm"}. MovieSemanticSearch has no answer LLM of its own
+    TOOL_ANSWER_MODES: dict[str, Literal["llm", "raw"]] = {"MovieSemanticSearch": "raw"}
+    USE_FAST_ROUTER: bool = False  # answer simple requests without the LLM planner
+    FAST_ROUTER_MIN_CONFIDENCE: float = 0.8
+
+    # Chat history retention
+    MESSAGES_RETENTION_ENABLED: bool = False  # moves old messages to messages_archive, opt-in
+    MESSAGES_RETENTION_DAYS: int = 30
+    MESSAGES_RETENTION_KEEP_LAST: int = 50  # last messages of a user stay in the hot table whatever their age
+    MESSAGES_RETENTION_BATCH_SIZE: int = 500
+    MESSAGES_RETENTION_INTERVAL: int = 3600  # seconds between retention runs
+
+    WIKI_CACHE_TTL: int = 24 * 3600
+    WIKI_MAX_CHARS: int = 4000  # wiki text passed to the answer prompt
+    WIKI_STORE_PATH: str = "data/wiki_store.sqlite3"  # built with `python -m app.core.wiki_store ingest <dump>`
 
     ENCODER_MODEL_NAME: str = "text-embedding-3-small"
+    INDEX_DB_BACKEND: Literal["chroma", "memory"] = "chroma"  # "memory" - in-process index, e.g. for benchmarks
     INDEX_DB_HOST: str = "index_db"
     INDEX_DB_PORT: int = 8000
     MOVIES_COLLECTION_NAME: str = "movies_collection"
 
+    # Tracing, see app/core/tracing.py
+    TRACE_EXPORTER: Literal["none", "stdout", "jsonl"] = "none"
+    TRACE_FILE: str = "traces.jsonl"
+    TRACE_SAMPLE_RATIO: float = 1.0  # share of turns whose spans are exported
+
 
 settings = Settings()
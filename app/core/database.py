@@ -1,25 +1,148 @@
-from sqlalchemy import create_engine
+import hashlib
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from sqlalchemy import create_engine, event, exc, make_url, select, func
+from sqlalchemy.engine import URL
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app import crud
 from app.core.config import settings
+from app.core import tracing
+from app.core.metrics import registry
 from app.models.base import Base
 from app.models.user import PreferenceItem, PreferenceType
 from app.models.message import MessageType
 
 
+POOL_CHECKOUT_LATENCY = registry.histogram(
+    "db_pool_checkout_seconds",
+    "Time spent waiting for a connection from the async pool",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+POOL_OVERFLOW_EVENTS = registry.counter(
+    "db_pool_overflow_total", "Connections opened beyond DB_POOL_SIZE"
+)
+POOL_TIMEOUTS = registry.counter(
+    "db_pool_timeouts_total", "Checkouts that failed after DB_POOL_TIMEOUT"
+)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Async queue pool that records checkout latency, overflow and timeouts"""
+
+    def _do_get(self):
+        overflow_before = self.overflow()
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            POOL_CHECKOUT_LATENCY.observe(time.perf_counter() - start)
+        if self.overflow() > max(overflow_before, 0):
+            POOL_OVERFLOW_EVENTS.inc()
+        return conn
+
+
+def trace_queries(engine) -> None:
+    """Span на каждый запрос, выполненный внутри трассы (ход бота), фоновые задачи не трассируются"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is None or tracing.current_trace_id() is None:
+            return
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "QUERY"
+        context._trace_span = tracing.start_span(
+            f"db {operation}",
+            {"db.system": engine.dialect.name, "db.operation": operation, "db.statement": statement[:500]},
+            kind="CLIENT",
+        )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        span = getattr(context, "_trace_span", None)
+        if span is not None:
+            if cursor.rowcount >= 0:
+                span.set_attribute("db.rows", cursor.rowcount)
+            span.end()
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        span = getattr(exception_context.execution_context, "_trace_span", None)
+        if span is not None:
+            span.record_exception(exception_context.original_exception)
+            span.end()
+
+
+def _async_db_url() -> URL:
+    url = make_url(settings.ASYNC_DB_URI)
+    if url.get_driver_name() == "asyncpg":
+        url = url.update_query_dict(
+            {"prepared_statement_cache_size": str(settings.DB_STATEMENT_CACHE_SIZE)}
+        )
+    return url
+
+
 async_engine = create_async_engine(
-    settings.ASYNC_DB_URI,
+    _async_db_url(),
     echo=settings.VERBOSE_DB,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
 )
 
 engine = create_engine(
         settings.DB_URI,
         echo=settings.VERBOSE_DB,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
     )
 
+trace_queries(async_engine.sync_engine)
+trace_queries(engine)
+
+registry.gauge("db_pool_size", "Configured async pool size").set_function(
+    lambda: async_engine.pool.size()
+)
+registry.gauge("db_pool_checked_out", "Async pool connections currently in use").set_function(
+    lambda: async_engine.pool.checkedout()
+)
+registry.gauge("db_pool_overflow", "Async pool connections currently in overflow").set_function(
+    lambda: max(async_engine.pool.overflow(), 0)
+)
+
 async_session_factory = async_sessionmaker(async_engine)
 
+
+@asynccontextmanager
+async def advisory_lock(name: str) -> AsyncIterator[bool]:
+    """
+    Неблокирующий advisory lock Postgres на время блока, отдаёт True, если блокировка получена.
+
+    На других СУБД (SQLite в локальном запуске) блокировка всегда считается полученной.
+    """
+    if async_engine.dialect.name != "postgresql":
+        yield True
+        return
+    key = int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), "big", signed=True)
+    # Session-level lock lives on this connection, so it is held until the block exits
+    async with async_engine.connect() as conn:
+        acquired = (await conn.execute(select(func.pg_try_advisory_lock(key)))).scalar()
+        await conn.commit()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await conn.execute(select(func.pg_advisory_unlock(key)))
+                await conn.commit()
+
 def init_db() -> None:
 
     engine = create_engine(
@@ -82,3 +205,44 @@ async def populate_db_with_fake_data() -> None:
                 await crud.message.create(session, message_data)
 
     print("Database populated with fake data")
+
+
+async def pool_load_test(concurrency: int = 50, requests_per_worker: int = 20, query_seconds: float = 0.01) -> None:
+    import asyncio
+    from sqlalchemy import text
+
+    is_postgres = async_engine.dialect.name == "postgresql"
+    query = text("SELECT pg_sleep(:s)") if is_postgres else text("SELECT 1")
+    max_in_use = 0
+    latencies = []
+
+    async def worker() -> None:
+        nonlocal max_in_use
+        for _ in range(requests_per_worker):
+            start = time.perf_counter()
+            async with async_session_factory() as session:
+                await session.execute(query, {"s": query_seconds} if is_postgres else {})
+                max_in_use = max(max_in_use, async_engine.pool.checkedout())
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    checkouts = POOL_CHECKOUT_LATENCY.count()
+    print(f"Concurrency: {concurrency}, requests: {len(latencies)}, elapsed: {elapsed:.2f}s")
+    print(f"Throughput: {len(latencies) / elapsed:.1f} req/s")
+    print(f"Request latency p50: {latencies[len(latencies) // 2] * 1000:.1f}ms, "
+          f"p99: {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms")
+    print(f"Mean checkout wait: {POOL_CHECKOUT_LATENCY.sum() / max(checkouts, 1) * 1000:.2f}ms over {checkouts} checkouts")
+    print(f"Max in use: {max_in_use} (pool size {settings.DB_POOL_SIZE}, max overflow {settings.DB_MAX_OVERFLOW})")
+    print(f"Overflow events: {POOL_OVERFLOW_EVENTS.value()}, timeouts: {POOL_TIMEOUTS.value()}")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+
+    asyncio.run(pool_load_test(*[int(arg) for arg in sys.argv[1:3]]))
@@ -1,50 +1,101 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
 import chromadb
 import chromadb.utils.embedding_functions as embedding_functions
 
+from app.core import tracing
 from app.core.config import settings
+from app.core.metrics import registry
+from app.core.vector_index import InMemoryCollection
 
 openai_ef = embedding_functions.OpenAIEmbeddingFunction(
     api_key=settings.OPENAI_API_KEY,
     model_name=settings.ENCODER_MODEL_NAME,
 )
 
-client = chromadb.HttpClient(host=settings.INDEX_DB_HOST, port=settings.INDEX_DB_PORT)
+if settings.INDEX_DB_BACKEND == "memory":
+    collection = InMemoryCollection(embedding_function=openai_ef)
+else:
+    client = chromadb.HttpClient(host=settings.INDEX_DB_HOST, port=settings.INDEX_DB_PORT)
 
+    collection = client.create_collection(
+        name=settings.MOVIES_COLLECTION_NAME,
+        embedding_function=openai_ef,
+        metadata={
+            "description": "Movies DB",
+            "hnsw:space": "cosine",
+        },
+        get_or_create=True,
+    )
 
-collection = client.create_collection(
-    name=settings.MOVIES_COLLECTION_NAME,
-    embedding_function=openai_ef,
-    metadata={
-        "description": "Movies DB",
-        "hnsw:space": "cosine",
-    },
-    get_or_create=True,
+CHROMA_LATENCY = registry.histogram(
+    "chroma_request_latency_seconds", "Chroma request latency by operation", ("operation",)
 )
 
 
+@contextmanager
+def observe(operation: str, **attributes) -> Iterator[tracing.Span]:
+    """Span и метрика запроса к коллекции, например `with observe("query", n_results=5):`"""
+    attributes = {"db.system": "chromadb", "db.collection.name": settings.MOVIES_COLLECTION_NAME,
+                  **{f"chroma.{key}": value for key, value in attributes.items()}}
+    start = time.perf_counter()
+    try:
+        with tracing.span(f"chroma {operation}", attributes, kind="CLIENT") as span:
+            yield span
+    finally:
+        CHROMA_LATENCY.observe(time.perf_counter() - start, operation=operation)
+
+
+def delete_legacy_entries(batch_size: int = 1000) -> int:
+    """
+    Удаляет документы, проиндексированные до перехода на id Кинопоиска: у них нет kp_id в метаданных,
+    и Movie.from_chroma не может их разобрать.
+    """
+    if settings.INDEX_DB_BACKEND == "memory":
+        return 0  # nothing outlives the process
+    legacy_ids = []
+    offset = 0
+    while True:
+        with observe("get", limit=batch_size, offset=offset):
+            response = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+        legacy_ids.extend(
+            id_ for id_, metadata in zip(response["ids"], response["metadatas"]) if "kp_id" not in (metadata or {})
+        )
+        if len(response["ids"]) < batch_size:
+            break
+        offset += batch_size
+    if legacy_ids:
+        with observe("delete", ids=len(legacy_ids)):
+            collection.delete(ids=legacy_ids)
+        print(f"Deleted {len(legacy_ids)} index entries without kp_id")
+    return len(legacy_ids)
+
+
 def populate_index_db() -> None:
     import copy
-    import requests
     from app.agent.nodes import kp_utils
+    from app.agent.nodes.movie import Movie
 
+    delete_legacy_entries()
 
     params = copy.deepcopy(kp_utils.DEFAULT_SEARCH_PARAMS)
     params["limit"] = 50
     params["lists"] = ["top250"]
 
-    api_response = requests.get(kp_utils.MOVIE_SEARCH_URL, params=params, headers=kp_utils.HEADERS)
+    api_response = kp_utils.kp_get(kp_utils.MOVIE_SEARCH_URL, params)
     if not api_response.ok:
         print("Произошла ошибка при обращении к API")
 
     docs = api_response.json()["docs"]
-    for i, doc in enumerate(docs):
-        collection.add(
+    for doc in docs:
+        # Kinopoisk id is the document id, so liked movies can be looked up in the index.
+        # Upsert replaces the metadata of movies indexed before it became structured
+        collection.upsert(
             documents=doc["description"],
-            metadatas={
-                "movie_name": doc.get("name", "Unknown Title"),
-                "movie_data": kp_utils.transform_movie_data(doc),
-            },
-            ids=str(i),
+            metadatas=Movie.from_kp(doc).to_chroma(),
+            ids=str(doc["id"]),
         )
     print("Index DB population complete")
 
@@ -58,5 +109,7 @@ def test_index_db() -> None:
 
 
 def drop_index_db() -> None:
+    if settings.INDEX_DB_BACKEND == "memory":
+        return  # nothing outlives the process
     client.delete_collection(settings.MOVIES_COLLECTION_NAME)
     print("Index DB drop complete")
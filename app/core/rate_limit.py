@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+
+RATE_LIMIT_WAIT = registry.histogram(
+    "rate_limit_wait_seconds", "Time spent waiting for a rate limiter token", ("limiter",)
+)
+
+
+class AsyncTokenBucket:
+    """
+    Token bucket для asyncio: rate токенов в секунду, не больше capacity подряд.
+
+    rate <= 0 отключает ограничение.
+    """
+
+    def __init__(self, name: str, rate: float, capacity: float | None = None):
+        self.name = name
+        self._rate = rate
+        self._capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        if self._rate <= 0:
+            return True
+        self._refill()
+        if self._tokens < tokens:
+            return False
+        self._tokens -= tokens
+        return True
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """Ждёт, пока наберётся tokens токенов, и возвращает время ожидания"""
+        if self._rate <= 0:
+            return 0.0
+        start = time.monotonic()
+        # The lock keeps waiters in FIFO order
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self._rate)
+                self._refill()
+            self._tokens -= tokens
+        waited = time.monotonic() - start
+        RATE_LIMIT_WAIT.observe(waited, limiter=self.name)
+        return waited
+
+
+# Share of the Kinopoisk API quota reserved for background tasks, so they never starve user requests.
+# The bucket lives in this process only, every replica running a shard has its own KP_BACKGROUND_RPS
+kp_background_limiter = AsyncTokenBucket(
+    "kp_background", settings.KP_BACKGROUND_RPS, settings.KP_BACKGROUND_BURST
+)
+
+# Telegram limits bulk sends of the whole bot, every broadcast in the process takes tokens from this bucket
+telegram_broadcast_limiter = AsyncTokenBucket("telegram_broadcast", settings.BROADCAST_RATE, 1.0)
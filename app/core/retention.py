@@ -0,0 +1,83 @@
+import asyncio
+import time
+from dataclasses import dataclass
+
+from app import crud
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.core.metrics import registry
+
+
+RETENTION_ROWS_MOVED = registry.counter(
+    "messages_retention_rows_total", "Messages moved from the hot table to the archive"
+)
+RETENTION_BYTES_RECLAIMED = registry.counter(
+    "messages_retention_reclaimed_bytes_total", "Message bytes saved by archiving with compression"
+)
+
+
+@dataclass
+class RetentionStats:
+    rows_moved: int = 0
+    raw_bytes: int = 0
+    archived_bytes: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def bytes_reclaimed(self) -> int:
+        return self.raw_bytes - self.archived_bytes
+
+
+async def run_retention(
+    retention_days: int = settings.MESSAGES_RETENTION_DAYS,
+    keep_last: int = settings.MESSAGES_RETENTION_KEEP_LAST,
+    batch_size: int = settings.MESSAGES_RETENTION_BATCH_SIZE,
+    pause: float = 0.1,
+) -> RetentionStats:
+    # Never archive what the agent still reads as history, however old it is
+    keep_last = max(keep_last, settings.USER_HISTORY_LIMIT)
+
+    stats = RetentionStats()
+    start = time.perf_counter()
+    after_id = 0
+    while True:
+        # Short transaction per batch so hot rows are never locked for long
+        async with async_session_factory() as session:
+            moved, raw_bytes, archived_bytes, after_id = await crud.message.archive_batch(
+                session, retention_days, keep_last, batch_size, after_id
+            )
+        if not moved:
+            break
+        stats.rows_moved += moved
+        stats.raw_bytes += raw_bytes
+        stats.archived_bytes += archived_bytes
+        stats.batches += 1
+        RETENTION_ROWS_MOVED.inc(moved)
+        RETENTION_BYTES_RECLAIMED.inc(raw_bytes - archived_bytes)
+        if not after_id:
+            break
+        await asyncio.sleep(pause)
+
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+
+async def retention_worker(interval: int = settings.MESSAGES_RETENTION_INTERVAL) -> None:
+    while True:
+        try:
+            stats = await run_retention()
+            if stats.rows_moved:
+                print(
+                    f"Messages retention: moved {stats.rows_moved} rows in {stats.batches} batches, "
+                    f"reclaimed {stats.bytes_reclaimed} bytes ({stats.elapsed:.1f}s)"
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Messages retention failed: {e}")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    print(asyncio.run(run_retention()))
@@ -0,0 +1,208 @@
+import asyncio
+import datetime
+import random
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from app.core.database import advisory_lock
+from app.core.metrics import registry
+
+
+SCHEDULER_RUNS = registry.counter(
+    "scheduler_shard_runs_total", "Scheduled shard runs by outcome", ("job", "status")
+)
+
+
+def _parse_field(value: str, low: int, high: int) -> frozenset[int]:
+    result = set()
+    for part in value.split(","):
+        expr, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if step <= 0:
+            raise ValueError(f"Invalid step in cron field: {value!r}")
+        if expr == "*":
+            start, stop = low, high
+        elif "-" in expr:
+            start, stop = (int(i) for i in expr.split("-", 1))
+        else:
+            start = int(expr)
+            stop = high if step > 1 else start
+        if start < low or stop > high or start > stop:
+            raise ValueError(f"Cron field {value!r} is out of range {low}-{high}")
+        result.update(range(start, stop + 1, step))
+    return frozenset(result)
+
+
+@dataclass(frozen=True)
+class CronSchedule:
+    """
+    Расписание в формате cron: "минута час день месяц день_недели" (время UTC).
+
+    Поддерживаются *, списки, диапазоны и шаги: "*/15 9-18 * * 1-5".
+    День недели: 0 или 7 — воскресенье.
+    """
+    minutes: frozenset[int]
+    hours: frozenset[int]
+    days: frozenset[int]
+    months: frozenset[int]
+    weekdays: frozenset[int]
+    any_day: bool
+    any_weekday: bool
+
+    @classmethod
+    def parse(cls, expression: str) -> "CronSchedule":
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression must have 5 fields: {expression!r}")
+        minute, hour, day, month, weekday = fields
+        weekdays = _parse_field(weekday, 0, 7)
+        return cls(
+            minutes=_parse_field(minute, 0, 59),
+            hours=_parse_field(hour, 0, 23),
+            days=_parse_field(day, 1, 31),
+            months=_parse_field(month, 1, 12),
+            weekdays=frozenset(0 if i == 7 else i for i in weekdays),
+            any_day=day == "*",
+            any_weekday=weekday == "*",
+        )
+
+    def _day_matches(self, dt: datetime.datetime) -> bool:
+        weekday = (dt.weekday() + 1) % 7  # cron counts from Sunday
+        if self.any_day or self.any_weekday:
+            return dt.day in self.days and weekday in self.weekdays
+        # Like cron: when both are restricted, either one matches
+        return dt.day in self.days or weekday in self.weekdays
+
+    def next_after(self, dt: datetime.datetime) -> datetime.datetime:
+        dt = dt.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        limit = dt + datetime.timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + datetime.timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + datetime.timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt += datetime.timedelta(minutes=1)
+            else:
+                return dt
+        raise ValueError("Cron schedule never fires")
+
+
+# func(shard, shards, run_key) -> False, если часть выполнена не полностью и её стоит повторить
+ShardFunc = Callable[[int, int, str], Awaitable[bool | None]]
+
+
+@dataclass
+class ScheduledJob:
+    name: str
+    schedule: CronSchedule
+    func: ShardFunc
+    shards: int = 1
+    window: float = 0.0  # seconds over which shard starts are spread
+    jitter: float = 0.0  # random extra delay of every shard start, seconds
+    retries: int = 0  # extra attempts of a failed shard
+    retry_delay: float = 0.0  # seconds between the attempts
+    runs: set[asyncio.Task] = field(default_factory=set)
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+
+
+class Scheduler:
+    """
+    Планировщик фоновых задач.
+
+    Каждое срабатывание расписания делит работу на shards частей, старты частей распределены по window секундам
+    со случайной задержкой. Каждую часть выполняет только одна реплика: её держит advisory lock
+    с ключом "<job>:<shard>", а run_key срабатывания позволяет задаче не повторять уже завершённую часть.
+    Часть, которая упала или выполнена не полностью, повторяется до retries раз через retry_delay секунд.
+    """
+
+    def __init__(self, show_logs: bool = False):
+        self._jobs: list[ScheduledJob] = []
+        self._show_logs = show_logs
+
+    def add_job(
+        self,
+        name: str,
+        schedule: str,
+        func: ShardFunc,
+        shards: int = 1,
+        window: float = 0.0,
+        jitter: float = 0.0,
+        retries: int = 0,
+        retry_delay: float = 0.0,
+    ) -> ScheduledJob:
+        job = ScheduledJob(
+            name, CronSchedule.parse(schedule), func, max(shards, 1), window, jitter, max(retries, 0), retry_delay
+        )
+        self._jobs.append(job)
+        return job
+
+    async def _try_shard(self, job: ScheduledJob, shard: int, run_key: str) -> str:
+        """:return: статус попытки для метрики: done, partial, failed или locked"""
+        async with advisory_lock(f"{job.name}:{shard}") as acquired:
+            if not acquired:
+                if self._show_logs:
+                    print(f"Scheduler: {job.name} shard {shard}/{job.shards} is run by another replica")
+                return "locked"
+            try:
+                completed = await job.func(shard, job.shards, run_key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Scheduler: {job.name} shard {shard}/{job.shards} failed: {e}")
+                return "failed"
+        return "partial" if completed is False else "done"
+
+    async def _run_shard(self, job: ScheduledJob, shard: int, run_key: str, delay: float) -> None:
+        await asyncio.sleep(delay)
+        for attempt in range(job.retries + 1):
+            if attempt:
+                await asyncio.sleep(job.retry_delay)
+                if self._show_logs:
+                    print(f"Scheduler: retrying {job.name} shard {shard}/{job.shards}, attempt {attempt + 1}")
+            status = await self._try_shard(job, shard, run_key)
+            SCHEDULER_RUNS.inc(job=job.name, status=status)
+            if status in ("done", "locked"):
+                return
+
+    async def _fire(self, job: ScheduledJob, fire_time: datetime.datetime) -> None:
+        run_key = fire_time.strftime("%Y-%m-%dT%H:%M")
+        step = job.window / job.shards
+        await asyncio.gather(*(
+            self._run_shard(job, shard, run_key, shard * step + random.uniform(0, job.jitter))
+            for shard in range(job.shards)
+        ))
+
+    async def _job_loop(self, job: ScheduledJob) -> None:
+        while True:
+            now = _utcnow()
+            fire_time = job.schedule.next_after(now)
+            if self._show_logs:
+                print(f"Scheduler: next {job.name} run at {fire_time:%Y-%m-%d %H:%M} UTC")
+            await asyncio.sleep((fire_time - now).total_seconds())
+            # A long run must not delay the next schedule check
+            run = asyncio.create_task(self._fire(job, fire_time))
+            job.runs.add(run)
+            run.add_done_callback(job.runs.discard)
+
+    async def run(self) -> None:
+        try:
+            await asyncio.gather(*(self._job_loop(job) for job in self._jobs))
+        finally:
+            runs = [run for job in self._jobs for run in job.runs]
+            for run in runs:
+                run.cancel()
+            await asyncio.gather(*runs, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    schedule = CronSchedule.parse("*/15 9-18 * * 1-5")
+    dt = _utcnow()
+    for _ in range(5):
+        dt = schedule.next_after(dt)
+        print(dt)
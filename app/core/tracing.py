@@ -0,0 +1,319 @@
+"""
+Трассировка ходов бота без коллектора.
+
+Span-ы пишутся в формате OTLP/JSON (traceId, spanId, parentSpanId, startTimeUnixNano, attributes, ...)
+по одному на строку в stdout или в файл TRACE_FILE, экспорт идёт в фоновом потоке.
+Текущий span хранится в contextvar, поэтому он переходит в asyncio-задачи и asyncio.to_thread;
+в пулы потоков контекст передаётся через wrap(), в другие процессы — через current_context()/attach().
+
+python -m app.core.tracing show <trace_id> [--file traces.jsonl] — дерево span-ов трассы с длительностями
+python -m app.core.tracing slowest [--limit 10] — самые долгие трассы в файле
+"""
+import atexit
+import contextvars
+import functools
+import json
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+
+TRACE_EXPORT_FAILURES = registry.counter(
+    "trace_export_failures_total", "Spans lost because the trace exporter could not write them"
+)
+
+SPAN_KINDS = {"INTERNAL": 1, "SERVER": 2, "CLIENT": 3}
+
+
+@dataclass(frozen=True, slots=True)
+class SpanContext:
+    """Родительский span из другого процесса"""
+    trace_id: str
+    span_id: str
+    sampled: bool = True
+
+
+class Span:
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "kind", "sampled",
+        "start_ns", "end_ns", "attributes", "status", "status_message",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        parent: "Span | SpanContext | None" = None,
+        kind: str = "INTERNAL",
+        attributes: dict | None = None,
+    ):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.kind = kind
+        # The sampling decision is made once per trace
+        self.sampled = parent.sampled if parent else random.random() < settings.TRACE_SAMPLE_RATIO
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.status = "UNSET"
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: dict) -> None:
+        self.attributes.update(attributes)
+
+    def record_exception(self, error: BaseException) -> None:
+        self.status = "ERROR"
+        self.status_message = f"{type(error).__name__}: {error}"[:500]
+
+    def end(self) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self.sampled:
+            _exporter.export(self)
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_otlp(self) -> dict:
+        data = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KINDS[self.kind],
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": {"UNSET": 0, "OK": 1, "ERROR": 2}[self.status]},
+        }
+        if self.parent_id:
+            data["parentSpanId"] = self.parent_id
+        if self.status_message:
+            data["status"]["message"] = self.status_message
+        return data
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # OTLP/JSON encodes 64-bit integers as strings
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class _SpanExporter:
+    """Пишет завершённые span-ы в фоновом потоке, чтобы запись не задерживала ход агента"""
+
+    def __init__(self, target: str, path: str):
+        self._target = target
+        self._path = path
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        if self._target == "none":
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.shutdown)
+        self._queue.put(span)
+
+    def _write(self, lines: list[str]) -> None:
+        if self._target == "stdout":
+            sys.stdout.write("".join(lines))
+            sys.stdout.flush()
+            return
+        # Append mode, so the worker processes of the agent may share one file
+        with open(self._path, "a", encoding="utf-8") as f:
+            f.write("".join(lines))
+
+    def _run(self) -> None:
+        while True:
+            spans = [self._queue.get()]
+            while True:
+                try:
+                    spans.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in spans
+            lines = [json.dumps(span.to_otlp(), ensure_ascii=False) + "\n" for span in spans if span is not None]
+            try:
+                if lines:
+                    self._write(lines)
+            except Exception as e:
+                TRACE_EXPORT_FAILURES.inc(len(lines))
+                # stdout may be the trace stream itself
+                print(f"Tracing: failed to export {len(lines)} spans: {e}", file=sys.stderr)
+            if stop:
+                return
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+
+_exporter = _SpanExporter(settings.TRACE_EXPORTER, settings.TRACE_FILE)
+_current: contextvars.ContextVar[Span | SpanContext | None] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span() -> Span | None:
+    current = _current.get()
+    return current if isinstance(current, Span) else None
+
+
+def current_trace_id() -> str | None:
+    current = _current.get()
+    return current.trace_id if current else None
+
+
+def current_context() -> dict | None:
+    """Контекст текущего span-а для передачи в другой процесс, см. attach()"""
+    current = _current.get()
+    if current is None:
+        return None
+    return {"trace_id": current.trace_id, "span_id": current.span_id, "sampled": current.sampled}
+
+
+@contextmanager
+def attach(context: dict | None) -> Iterator[None]:
+    token = _current.set(SpanContext(**context) if context else None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def start_span(name: str, attributes: dict | None = None, kind: str = "INTERNAL") -> Span:
+    """Span, дочерний к текущему, но не становящийся текущим: для событий с началом и концом в разных колбэках"""
+    return Span(name, _current.get(), kind, attributes)
+
+
+@contextmanager
+def span(name: str, attributes: dict | None = None, kind: str = "INTERNAL") -> Iterator[Span]:
+    current = start_span(name, attributes, kind)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_exception(e)
+        raise
+    finally:
+        _current.reset(token)
+        current.end()
+
+
+def traced(name: str, attributes: dict | None = None) -> Callable:
+    """Декоратор: вызов функции в отдельном span-е"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def wrap(func: Callable) -> Callable:
+    """Функция для пула потоков: span-ы внутри неё станут дочерними к текущему span-у вызывающего потока"""
+    parent = _current.get()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _current.set(parent)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return wrapper
+
+
+def shutdown() -> None:
+    """Дописывает накопленные span-ы, вызывается при остановке бота"""
+    _exporter.shutdown()
+
+
+def _load_spans(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _span_seconds(data: dict) -> float:
+    return (int(data["endTimeUnixNano"]) - int(data["startTimeUnixNano"])) / 1e9
+
+
+def _format_attributes(data: dict) -> str:
+    values = (f"{a['key']}={next(iter(a['value'].values()))}" for a in data["attributes"])
+    return " ".join(value if len(value) <= 80 else value[:77] + "..." for value in values)
+
+
+def show_trace(trace_id: str, path: str) -> None:
+    spans = [s for s in _load_spans(path) if s["traceId"] == trace_id]
+    if not spans:
+        print(f"Trace {trace_id} not found in {path}")
+        return
+    children: dict[str | None, list[dict]] = {}
+    ids = {s["spanId"] for s in spans}
+    for s in spans:
+        # Spans of the parent that was not exported are shown as roots
+        parent = s.get("parentSpanId") if s.get("parentSpanId") in ids else None
+        children.setdefault(parent, []).append(s)
+    start = min(int(s["startTimeUnixNano"]) for s in spans)
+
+    def walk(parent: str | None, depth: int) -> None:
+        for s in sorted(children.get(parent, []), key=lambda s: int(s["startTimeUnixNano"])):
+            offset = (int(s["startTimeUnixNano"]) - start) / 1e6
+            error = " ERROR " + s["status"].get("message", "").split("\n")[0] if s["status"]["code"] == 2 else ""
+            print(f"{offset:>9.1f}ms {_span_seconds(s) * 1000:>9.1f}ms {'  ' * depth}{s['name']}  "
+                  f"{_format_attributes(s)}{error}")
+            walk(s["spanId"], depth + 1)
+
+    print(f"{'start':>11} {'duration':>11} span")
+    walk(None, 0)
+
+
+def slowest_traces(path: str, limit: int) -> None:
+    roots = [s for s in _load_spans(path) if not s.get("parentSpanId")]
+    for s in sorted(roots, key=_span_seconds, reverse=True)[:limit]:
+        print(f"{s['traceId']} {_span_seconds(s):>8.2f}s {s['name']}  {_format_attributes(s)}")
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("show", "slowest"))
+    parser.add_argument("trace_id", nargs="?")
+    parser.add_argument("--file", default=settings.TRACE_FILE)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+    if args.command == "show":
+        if not args.trace_id:
+            parser.error("show needs a trace_id")
+        show_trace(args.trace_id, args.file)
+    else:
+        slowest_traces(args.file, args.limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import threading
+from typing import Callable, Sequence
+
+import numpy as np
+
+
+DEFAULT_INCLUDE = ("metadatas", "documents", "distances")
+
+
+def _as_list(value) -> list:
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class InMemoryCollection:
+    """
+    Коллекция в памяти процесса с тем же интерфейсом, что и коллекция Chroma (upsert, query, get, count),
+    и косинусным расстоянием, как у movies_collection. Используется при INDEX_DB_BACKEND="memory":
+    локальный запуск и бенчмарки без сервера Chroma.
+    """
+
+    def __init__(self, embedding_function: Callable[[list[str]], Sequence[Sequence[float]]]):
+        self.embedding_function = embedding_function
+        self._ids: list[str] = []
+        self._positions: dict[str, int] = {}
+        self._documents: list[str | None] = []
+        self._metadatas: list[dict | None] = []
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._lock = threading.Lock()
+
+    def _embed(self, texts: list[str]) -> np.ndarray:
+        return np.asarray(self.embedding_function(texts), dtype=np.float32)
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def upsert(self, ids, documents=None, metadatas=None, embeddings=None) -> None:
+        ids = _as_list(ids)
+        documents = _as_list(documents) if documents is not None else [None] * len(ids)
+        metadatas = _as_list(metadatas) if metadatas is not None else [None] * len(ids)
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+                             if embeddings is not None else self._embed(documents))
+        with self._lock:
+            if not self._ids:
+                self._matrix = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            new_rows = []
+            for id_, document, metadata, vector in zip(ids, documents, metadatas, vectors):
+                position = self._positions.get(id_)
+                if position is None:
+                    self._positions[id_] = len(self._ids) + len(new_rows)
+                    new_rows.append(vector)
+                    self._ids.append(id_)
+                    self._documents.append(document)
+                    self._metadatas.append(metadata)
+                else:
+                    self._matrix[position] = vector
+                    self._documents[position] = document
+                    self._metadatas[position] = metadata
+            if new_rows:
+                self._matrix = np.vstack([self._matrix, np.stack(new_rows)])
+
+    def query(
+        self,
+        query_texts=None,
+        query_embeddings=None,
+        n_results: int = 10,
+        include: Sequence[str] = DEFAULT_INCLUDE,
+    ) -> dict:
+        if not self._ids:
+            # Like Chroma, an empty collection returns an empty result for every query
+            if query_embeddings is not None:
+                n_queries = 1 if np.ndim(query_embeddings) == 1 else len(query_embeddings)
+            else:
+                n_queries = len(_as_list(query_texts))
+            return {"ids": [[] for _ in range(n_queries)], **{key: [[] for _ in range(n_queries)] for key in include}}
+        queries = (
+            np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self._matrix.shape[1])
+            if query_embeddings is not None else self._embed(_as_list(query_texts))
+        )
+        with self._lock:
+            matrix = self._matrix
+            n_results = min(n_results, len(self._ids))
+            distances = 1.0 - _normalize(queries) @ matrix.T
+            if n_results:
+                # Only the top n_results of every row are sorted
+                top = np.argpartition(distances, n_results - 1, axis=1)[:, :n_results]
+                order = np.take_along_axis(top, np.argsort(np.take_along_axis(distances, top, axis=1), axis=1), axis=1)
+            else:
+                order = np.zeros((len(queries), 0), dtype=int)
+            result = {"ids": [[self._ids[i] for i in row] for row in order]}
+            if "distances" in include:
+                result["distances"] = [[float(distances[q, i]) for i in row] for q, row in enumerate(order)]
+            if "metadatas" in include:
+                result["metadatas"] = [[self._metadatas[i] for i in row] for row in order]
+            if "documents" in include:
+                result["documents"] = [[self._documents[i] for i in row] for row in order]
+            if "embeddings" in include:
+                result["embeddings"] = [[matrix[i].tolist() for i in row] for row in order]
+        return result
+
+    def get(self, ids=None, include: Sequence[str] = ("metadatas", "documents")) -> dict:
+        with self._lock:
+            positions = (
+                [self._positions[id_] for id_ in _as_list(ids) if id_ in self._positions]
+                if ids is not None else list(range(len(self._ids)))
+            )
+            result = {"ids": [self._ids[i] for i in positions]}
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadatas[i] for i in positions]
+            if "documents" in include:
+                result["documents"] = [self._documents[i] for i in positions]
+            if "embeddings" in include:
+                result["embeddings"] = [self._matrix[i].tolist() for i in positions]
+        return result
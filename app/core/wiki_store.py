@@ -0,0 +1,342 @@
+import bz2
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Iterator
+from xml.etree.ElementTree import iterparse
+
+from app.core.config import settings
+
+
+WIKI_SEARCH_KEYWORDS = (
+        "актёр",
+        "актер",
+        "актриса",
+        "режиссер",
+        "режиссёр",
+        "сценарист",
+        "продюсер",
+        "оператор",
+        "композитор",
+        "художник-постановщик",
+        "гримёр",
+        "костюмер",
+        "звукорежиссёр",
+        "монтажёр",
+        "каскадёр",
+        "хореограф",
+        "дубляж",
+        "театр",
+        "кино",
+        "мульт",
+        "аниме",
+        "сериал",
+    )
+
+
+# Version 1: pages.id is the page id of the dump, so a re-ingest updates pages in place
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    kp_id INTEGER,
+    revision INTEGER NOT NULL,
+    content BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_pages_kp_id ON pages (kp_id);
+CREATE TABLE IF NOT EXISTS keys (
+    key TEXT PRIMARY KEY,
+    page_id INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+@dataclass(frozen=True)
+class StoredArticle:
+    title: str
+    revision: int
+    kp_id: int | None
+    content: str
+
+
+@dataclass
+class IngestStats:
+    pages_seen: int = 0
+    pages_stored: int = 0
+    redirects: int = 0
+    raw_bytes: int = 0
+    stored_bytes: int = 0
+    elapsed: float = 0.0
+
+
+_PARENTHESES = re.compile(r"\([^)]*\)")
+_WORD = re.compile(r"\w+")
+
+
+def normalize_title(title: str) -> str:
+    """
+    Ключ поиска по имени: "Ривз, Киану" и "Киану Ривз" дают один и тот же ключ.
+
+    Уточнения в скобках, регистр, "ё" и порядок слов не учитываются.
+    """
+    words = _WORD.findall(_PARENTHESES.sub(" ", title).lower().replace("ё", "е"))
+    return " ".join(sorted(words))
+
+
+def title_keys(title: str) -> set[str]:
+    keys = {normalize_title(title)}
+    # "Михалков, Никита Сергеевич" is also found as "Никита Михалков"
+    surname, _, names = title.partition(",")
+    if names.split():
+        keys.add(normalize_title(f"{surname} {names.split()[0]}"))
+    return keys
+
+
+# --- Wikitext to plain text ---
+
+_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+_REF = re.compile(r"<ref[^>/]*/>|<ref[^>]*>.*?</ref>", re.DOTALL | re.IGNORECASE)
+_INNER_LINK = re.compile(r"\[\[([^\[\]]*)\]\]")
+_INNER_TEMPLATE = re.compile(r"\{\{([^{}]*)\}\}")
+_INNER_TABLE = re.compile(r"\{\|(?:(?!\{\|).)*?\|\}", re.DOTALL)
+_EXTERNAL_LINK = re.compile(r"\[(?:https?:)?//[^\s\]]+\s*([^\]]*)\]")
+_TAG = re.compile(r"<[^>]+>")
+_EMPHASIS = re.compile(r"'{2,}")
+_BLANK_LINES = re.compile(r"\n{3,}")
+# Person links only: film templates ({{Kinopoisk film|...}}) and /film/ URLs carry movie ids
+_KP_PERSON_ID = re.compile(
+    r"kinopoisk\.ru/(?:name|level/4/people)/(\d+)"
+    r"|\{\{\s*(?:kinopoisk[ _]name|кинопоиск[ _](?:персона|имя))\s*\|\s*(?:id\s*=\s*)?(\d+)",
+    re.IGNORECASE,
+)
+
+_SKIPPED_LINK_PREFIXES = ("файл:", "file:", "изображение:", "image:", "категория:", "category:")
+_INFOBOX_NAMES = ("карточка", "персона", "актёр", "актер", "кинематографист", "режиссёр", "музыкант", "писатель")
+_DATE_TEMPLATES = ("датарождения", "датасмерти", "др", "дс")
+
+
+def _link(match: re.Match) -> str:
+    target, _, text = match.group(1).partition("|")
+    if target.strip().lower().startswith(_SKIPPED_LINK_PREFIXES):
+        return ""
+    return text.rsplit("|", 1)[-1] if text else target
+
+
+def _template(match: re.Match) -> str:
+    name, *params = match.group(1).split("|")
+    name = name.strip().lower()
+    if name.replace(" ", "") in _DATE_TEMPLATES:
+        return ".".join(param.strip() for param in params if param.strip().isdigit())
+    if name.startswith(_INFOBOX_NAMES):
+        lines = []
+        for param in params:
+            key, sep, value = param.partition("=")
+            value = value.strip()
+            if sep and value and not key.strip().lower().startswith(("изображение", "подпись", "ширина")):
+                lines.append(f"{key.strip()}: {value}")
+        return "\n".join(lines) + "\n"
+    return ""
+
+
+def _replace_innermost(pattern: re.Pattern, repl, text: str) -> str:
+    while True:
+        text, count = pattern.subn(repl, text)
+        if not count:
+            return text
+
+
+def wikitext_to_text(wikitext: str) -> str:
+    """Упрощённое преобразование вики-разметки в текст: заголовки разделов вида == Заголовок == сохраняются"""
+    text = _COMMENT.sub("", wikitext)
+    text = _REF.sub("", text)
+    text = _replace_innermost(_INNER_LINK, _link, text)
+    text = _replace_innermost(_INNER_TEMPLATE, _template, text)
+    text = _replace_innermost(_INNER_TABLE, "", text)
+    text = _EXTERNAL_LINK.sub(r"\1", text)
+    text = _TAG.sub("", text)
+    text = _EMPHASIS.sub("", text)
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def _lead(text: str) -> str:
+    return text.split("\n==", 1)[0]
+
+
+def _is_cinema_person(wikitext: str, text: str, keywords: tuple[str, ...]) -> bool:
+    is_person = "Категория:Родившиеся" in wikitext or "Категория:Умершие" in wikitext
+    lead = _lead(text)
+    return is_person and any(kw in lead for kw in keywords)
+
+
+def _iter_dump_pages(path: str) -> Iterator[tuple[int, str, int, str | None, str]]:
+    """(page id, title, revision, redirect target, wikitext) статей основного пространства имён"""
+    opener = bz2.open if path.endswith(".bz2") else open
+    with opener(path, "rb") as dump:
+        page = {}
+        root = None
+        for event, elem in iterparse(dump, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = elem
+                continue
+            tag = elem.tag.rsplit("}", 1)[-1]
+            if tag in ("title", "ns", "text"):
+                page[tag] = elem.text or ""
+            elif tag == "id" and "revision" not in page and "id" in page:
+                page["revision"] = int(elem.text)  # the first id is the page id, the second one the revision id
+            elif tag == "id" and "id" not in page:
+                page["id"] = int(elem.text)
+            elif tag == "redirect":
+                page["redirect"] = elem.get("title")
+            elif tag == "page":
+                if page.get("ns") == "0":
+                    yield (
+                        page["id"], page["title"], page.get("revision", 0), page.get("redirect"), page.get("text", "")
+                    )
+                page = {}
+                root.clear()  # keeps memory flat over the whole dump
+
+
+class WikiStore:
+    """
+    Локальное хранилище статей Википедии о людях кино: SQLite, текст сжат zlib.
+
+    Статья ищется по нормализованному названию (в том числе по редиректам) или по id персоны на Кинопоиске.
+    """
+
+    def __init__(self, path: str = settings.WIKI_STORE_PATH):
+        self._path = path
+        self._local = threading.local()
+
+    @property
+    def available(self) -> bool:
+        return bool(self._path) and os.path.exists(self._path)
+
+    def _connection(self) -> sqlite3.Connection | None:
+        # sqlite3 connections can't be shared between threads, tools run in a thread pool
+        connection = getattr(self._local, "connection", None)
+        if connection is None and self.available:
+            connection = sqlite3.connect(f"file:{self._path}?mode=ro", uri=True)
+            self._local.connection = connection
+        return connection
+
+    def get(self, name: str | None = None, kp_id: int | None = None) -> StoredArticle | None:
+        connection = self._connection()
+        if connection is None:
+            return None
+        row = None
+        if kp_id is not None:
+            row = connection.execute(
+                "SELECT title, revision, kp_id, content FROM pages WHERE kp_id = ?", (kp_id,)
+            ).fetchone()
+        if row is None and name:
+            row = connection.execute(
+                "SELECT p.title, p.revision, p.kp_id, p.content FROM keys k JOIN pages p ON p.id = k.page_id "
+                "WHERE k.key = ?",
+                (normalize_title(name),),
+            ).fetchone()
+        if row is None:
+            return None
+        title, revision, kp_id, content = row
+        return StoredArticle(title, revision, kp_id, zlib.decompress(content).decode())
+
+    def ingest(
+        self,
+        dump_path: str,
+        keywords: tuple[str, ...] = WIKI_SEARCH_KEYWORDS,
+        batch_size: int = 1000,
+        show_logs: bool = True,
+    ) -> IngestStats:
+        """
+        Загружает статьи о людях кино из дампа ruwiki (pages-articles.xml[.bz2]).
+
+        Повторная загрузка обновляет статьи по id страницы в дампе и переназначает ключи поиска.
+        """
+        stats = IngestStats()
+        start = time.perf_counter()
+        if os.path.dirname(self._path):
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        connection = sqlite3.connect(self._path)
+        if connection.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            # Older stores numbered pages themselves, their ids can't be matched with the dump
+            connection.executescript("DROP TABLE IF EXISTS pages; DROP TABLE IF EXISTS keys;")
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        connection.executescript(SCHEMA)
+        connection.execute("CREATE TEMP TABLE redirects (key TEXT NOT NULL, target_key TEXT NOT NULL)")
+
+        pages, keys, redirects = [], [], []
+
+        def flush() -> None:
+            connection.executemany("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)", pages)
+            connection.executemany("INSERT OR REPLACE INTO keys VALUES (?, ?)", keys)
+            connection.executemany("INSERT INTO redirects VALUES (?, ?)", redirects)
+            connection.commit()
+            pages.clear()
+            keys.clear()
+            redirects.clear()
+
+        for page_id, title, revision, redirect, wikitext in _iter_dump_pages(dump_path):
+            stats.pages_seen += 1
+            if redirect:
+                redirects.extend((key, normalize_title(redirect)) for key in title_keys(title))
+                stats.redirects += 1
+            else:
+                text = wikitext_to_text(wikitext)
+                if _is_cinema_person(wikitext, text, keywords):
+                    kp_match = _KP_PERSON_ID.search(wikitext)
+                    kp_id = int(kp_match.group(1) or kp_match.group(2)) if kp_match else None
+                    content = zlib.compress(text.encode(), 9)
+                    pages.append((page_id, title, kp_id, revision, content))
+                    keys.extend((key, page_id) for key in title_keys(title))
+                    stats.pages_stored += 1
+                    stats.raw_bytes += len(text.encode())
+                    stats.stored_bytes += len(content)
+            if len(pages) + len(redirects) >= batch_size:
+                flush()
+            if show_logs and stats.pages_seen % 100_000 == 0:
+                print(f"Wiki ingest: {stats.pages_seen} pages seen, {stats.pages_stored} stored "
+                      f"({time.perf_counter() - start:.0f}s)")
+        flush()
+
+        # Redirects to stored articles become lookup keys as well
+        connection.execute(
+            "INSERT OR IGNORE INTO keys SELECT r.key, k.page_id FROM redirects r JOIN keys k ON k.key = r.target_key"
+        )
+        connection.commit()
+        connection.execute("VACUUM")
+        connection.close()
+
+        stats.elapsed = time.perf_counter() - start
+        if show_logs:
+            print(f"Wiki ingest: stored {stats.pages_stored} of {stats.pages_seen} pages, "
+                  f"{stats.raw_bytes} -> {stats.stored_bytes} bytes ({stats.elapsed:.0f}s)")
+        return stats
+
+
+wiki_store = WikiStore()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local store of Wikipedia articles about cinema persons")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = subparsers.add_parser("ingest", help="Load articles from a ruwiki pages-articles dump")
+    ingest_parser.add_argument("dump", help="Path to ruwiki-latest-pages-articles.xml.bz2")
+    ingest_parser.add_argument("--store", default=settings.WIKI_STORE_PATH)
+    get_parser = subparsers.add_parser("get", help="Print a stored article")
+    get_parser.add_argument("name")
+    get_parser.add_argument("--store", default=settings.WIKI_STORE_PATH)
+    args = parser.parse_args()
+
+    store = WikiStore(args.store)
+    if args.command == "ingest":
+        store.ingest(args.dump)
+    else:
+        article = store.get(args.name)
+        print(article.content if article else "Not found")
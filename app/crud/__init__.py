@@ -1,11 +1,18 @@
 from app.models.user import User as UserModel
 from app.models.message import Message as MessageModel
+from app.models.message import ConversationSummary as ConversationSummaryModel
+from app.models.task_run import TaskRun as TaskRunModel
 
 from app.schemas.user import User as UserSchema
 from app.schemas.message import Message as MessageSchema
+from app.schemas.message import ConversationSummary as ConversationSummarySchema
+from app.schemas.task_run import TaskRun as TaskRunSchema
 
 from .user import CRUDUser
-from .message import CRUDMessage
+from .message import CRUDMessage, CRUDConversationSummary
+from .task_run import CRUDTaskRun
 
 user = CRUDUser(UserModel, UserSchema)
 message = CRUDMessage(MessageModel, MessageSchema)
+conversation_summary = CRUDConversationSummary(ConversationSummaryModel, ConversationSummarySchema)
+task_run = CRUDTaskRun(TaskRunModel, TaskRunSchema)
@@ -1,11 +1,16 @@
 from typing import Optional, Sequence, Type
+import datetime
+import zlib
 
 from pydantic import BaseModel
-from sqlalchemy import select
+from sqlalchemy import select, delete, insert, update, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
 from app.models.base import Base
-from app.models.message import Message, MessageType
+from app.models.message import ConversationSummary, Message, MessageArchive, MessageType
+from app.schemas.message import ConversationSummary as ConversationSummarySchema
 from .base import CRUDBase
 
 
@@ -18,3 +23,143 @@ class CRUDMessage(CRUDBase):
             query = query.where(self.model.message_type == message_type)
         result = await db.execute(query)
         return [self.schema.model_validate(i) for i in result.scalars().all()]
+
+    async def get_last_user_messages(
+        self, db: AsyncSession, user_id: int, limit: int, after_id: int = 0
+    ) -> Sequence[BaseModel]:
+        """Последние limit сообщений пользователя с id больше after_id в хронологическом порядке"""
+        query = (
+            select(self.model)
+            .where(self.model.user_id == user_id, self.model.id > after_id)
+            .order_by(self.model.created_at.desc(), self.model.id.desc())
+            .limit(limit)
+        )
+        result = await db.execute(query)
+        return [self.schema.model_validate(i) for i in reversed(result.scalars().all())]
+
+    async def get_user_messages_between(
+        self, db: AsyncSession, user_id: int, after_id: int, before_id: int, limit: int
+    ) -> Sequence[BaseModel]:
+        """Первые limit сообщений пользователя с id строго между after_id и before_id по возрастанию id"""
+        query = (
+            select(self.model)
+            .where(self.model.user_id == user_id, self.model.id > after_id, self.model.id < before_id)
+            .order_by(self.model.id)
+            .limit(limit)
+        )
+        result = await db.execute(query)
+        return [self.schema.model_validate(i) for i in result.scalars().all()]
+
+    async def archive_batch(
+        self,
+        db: AsyncSession,
+        retention_days: int,
+        keep_last: int,
+        batch_size: int,
+        after_id: int = 0,
+    ) -> tuple[int, int, int, int]:
+        """
+        Переносит одну пачку сообщений в messages_archive.
+
+        Переносятся сообщения старше retention_days дней, кроме последних keep_last сообщений пользователя:
+        у давно не писавшего пользователя недавняя история остаётся в горячей таблице. Возраст считается
+        по часам БД, которыми заполняется created_at. Строки, заблокированные другими транзакциями, пропускаются.
+
+        :param after_id: просматриваются только сообщения с id больше after_id, так проход по таблице
+            проверяет каждую строку один раз
+        :return: (количество перенесённых строк, байт текста до сжатия, байт после сжатия,
+            after_id для следующей пачки или 0, если пачка последняя)
+        """
+        if db.bind.dialect.name == "sqlite":
+            older_than = func.datetime("now", f"-{retention_days} days")
+        else:
+            older_than = func.now() - datetime.timedelta(days=retention_days)
+        newer = aliased(Message)
+        # Per-user lookup over ix_messages_user_id_created_at instead of ranking the whole table
+        last_ids = (
+            select(newer.id)
+            .where(newer.user_id == Message.user_id)
+            .order_by(newer.created_at.desc(), newer.id.desc())
+            .limit(keep_last)
+        )
+        query = (
+            select(Message.id, Message.user_id, Message.message_type, Message.content, Message.created_at)
+            .where(Message.id > after_id, Message.created_at < older_than, Message.id.not_in(last_ids))
+            .order_by(Message.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True, of=Message)
+        )
+        rows = (await db.execute(query)).all()
+        if not rows:
+            await db.rollback()
+            return 0, 0, 0, 0
+
+        raw_bytes = 0
+        archived_bytes = 0
+        archive_rows = []
+        for row in rows:
+            raw = row.content.encode("utf-8")
+            compressed = zlib.compress(raw, 9)
+            raw_bytes += len(raw)
+            archived_bytes += len(compressed)
+            archive_rows.append({
+                "id": row.id,
+                "user_id": row.user_id,
+                "message_type": row.message_type,
+                "content": compressed,
+                "created_at": row.created_at,
+            })
+
+        await db.execute(insert(MessageArchive), archive_rows)
+        await db.execute(delete(Message).where(Message.id.in_([row.id for row in rows])))
+        await db.commit()
+        next_after_id = rows[-1].id if len(rows) == batch_size else 0
+        return len(rows), raw_bytes, archived_bytes, next_after_id
+
+    async def get_archived_user_messages(
+        self, db: AsyncSession, user_id: int
+    ) -> list[tuple[MessageType, str, datetime.datetime]]:
+        query = (
+            select(MessageArchive)
+            .where(MessageArchive.user_id == user_id)
+            .order_by(MessageArchive.created_at)
+        )
+        result = await db.execute(query)
+        return [
+            (i.message_type, zlib.decompress(i.content).decode("utf-8"), i.created_at)
+            for i in result.scalars().all()
+        ]
+
+
+class CRUDConversationSummary(CRUDBase):
+    async def get_by_user_id(self, db: AsyncSession, user_id: int) -> Optional[ConversationSummarySchema]:
+        result = await db.execute(select(self.model).where(self.model.user_id == user_id))
+        scalar = result.scalar_one_or_none()
+        if scalar is None:
+            return None
+        return self.schema.model_validate(scalar)
+
+    async def save(self, db: AsyncSession, user_id: int, content: str, last_message_id: int) -> bool:
+        """
+        Сохраняет краткое содержание, если оно покрывает более новые сообщения, чем сохранённое.
+
+        :return: False, если другой процесс уже сохранил более новое
+        """
+        result = await db.execute(
+            update(self.model)
+            .where(self.model.user_id == user_id, self.model.last_message_id < last_message_id)
+            .values(content=content, last_message_id=last_message_id)
+        )
+        if result.rowcount:
+            await db.commit()
+            return True
+        if await db.get(self.model, user_id) is not None:
+            await db.rollback()
+            return False
+        db.add(self.model(user_id=user_id, content=content, last_message_id=last_message_id))
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            return False
+        return True
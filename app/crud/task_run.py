@@ -0,0 +1,62 @@
+import datetime
+from typing import Optional
+
+from sqlalchemy import select, update, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.task_run import TaskRun, TaskRunItem, TaskRunStatus
+from app.schemas.task_run import TaskRun as TaskRunSchema
+from .base import CRUDBase
+
+
+class CRUDTaskRun(CRUDBase):
+    async def get_by_run_key(self, db: AsyncSession, name: str, run_key: str) -> Optional[TaskRunSchema]:
+        query = select(self.model).where(self.model.name == name, self.model.run_key == run_key)
+        result = await db.execute(query)
+        scalar = result.scalar_one_or_none()
+        if scalar is None:
+            return None
+        return self.schema.model_validate(scalar)
+
+    async def get_done_user_ids(self, db: AsyncSession, run_id: int) -> set[int]:
+        query = select(TaskRunItem.user_id).where(TaskRunItem.run_id == run_id)
+        result = await db.execute(query)
+        return set(result.scalars().all())
+
+    async def mark_user_done(self, db: AsyncSession, run_id: int, user_id: int) -> None:
+        await db.execute(insert(TaskRunItem).values(run_id=run_id, user_id=user_id))
+        await db.execute(
+            update(TaskRun).where(TaskRun.id == run_id).values(processed=TaskRun.processed + 1)
+        )
+        await db.commit()
+
+    async def abandon_stale(self, db: AsyncSession, name: str, run_key: str) -> int:
+        """Запуски других срабатываний, оставшиеся RUNNING после остановки реплики, помечаются FAILED"""
+        result = await db.execute(
+            update(TaskRun)
+            .where(TaskRun.name == name, TaskRun.run_key != run_key, TaskRun.status == TaskRunStatus.RUNNING)
+            .values(status=TaskRunStatus.FAILED)
+        )
+        await db.commit()
+        return result.rowcount
+
+    async def start_attempt(self, db: AsyncSession, run_id: int) -> TaskRunSchema:
+        await db.execute(
+            update(TaskRun)
+            .where(TaskRun.id == run_id)
+            .values(status=TaskRunStatus.RUNNING, attempts=TaskRun.attempts + 1, finished_at=None)
+        )
+        await db.commit()
+        return await self.get(db, run_id)
+
+    async def finish(self, db: AsyncSession, run_id: int, status: TaskRunStatus, failed: int = 0) -> None:
+        await db.execute(
+            update(TaskRun)
+            .where(TaskRun.id == run_id)
+            .values(
+                status=status,
+                failed=failed,
+                finished_at=datetime.datetime.now(datetime.UTC).replace(tzinfo=None),
+            )
+        )
+        await db.commit()
@@ -1,7 +1,7 @@
 from typing import Optional, Sequence, Type
 
 from pydantic import BaseModel
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.base import Base
@@ -27,6 +27,12 @@ class CRUDUser(CRUDBase):
             return None
         return self.schema.model_validate(scalar)
 
+    async def set_active_by_tg_chat_id(self, db: AsyncSession, tg_chat_id: int, is_active: bool) -> None:
+        await db.execute(
+            update(self.model).where(self.model.tg_chat_id == tg_chat_id).values(is_active=is_active)
+        )
+        await db.commit()
+
     async def get_preferences_by_user_id(self, db: AsyncSession, user_id: int) -> list[UserPreferenceSchema]:
         query = select(UserPreference).where(UserPreference.user_id == user_id)
         result = await db.execute(query)
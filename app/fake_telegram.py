@@ -0,0 +1,80 @@
+"""
+Posts fake Telegram updates to a locally running webhook server.
+
+python -m app.fake_telegram --count 20 --concurrency 5 --text "Расскажи о фильме Интерстеллар"
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+import aiohttp
+
+from app.core.config import settings
+
+
+_update_ids = itertools.count(int(time.time()))
+
+
+def build_message_update(text: str, chat_id: int, full_name: str = "Local Tester") -> dict:
+    update_id = next(_update_ids)
+    first_name, _, last_name = full_name.partition(" ")
+    user = {"id": chat_id, "is_bot": False, "first_name": first_name, "last_name": last_name or None}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": first_name},
+            "from": user,
+            "text": text,
+        },
+    }
+
+
+async def post_updates(
+    url: str,
+    text: str,
+    count: int,
+    concurrency: int,
+    secret: str | None,
+    chat_id: int,
+) -> None:
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses: dict[int, int] = {}
+    latencies = []
+
+    async with aiohttp.ClientSession() as session:
+        async def post_one(i: int) -> None:
+            async with semaphore:
+                start = time.perf_counter()
+                async with session.post(url, json=build_message_update(text, chat_id + i), headers=headers) as response:
+                    await response.read()
+                    statuses[response.status] = statuses.get(response.status, 0) + 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(post_one(i) for i in range(count)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"Posted {count} updates in {elapsed:.2f}s, statuses: {statuses}")
+    print(f"Ack latency p50: {latencies[len(latencies) // 2] * 1000:.1f}ms, max: {latencies[-1] * 1000:.1f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Telegram update poster for webhook mode")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{settings.WEBAPP_PORT}{settings.WEBHOOK_PATH}")
+    parser.add_argument("--text", default="Привет!")
+    parser.add_argument("--count", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--secret", default=settings.WEBHOOK_SECRET or None)
+    parser.add_argument("--chat-id", type=int, default=100000)
+    args = parser.parse_args()
+
+    asyncio.run(post_updates(args.url, args.text, args.count, args.concurrency, args.secret, args.chat_id))
+
+
+if __name__ == "__main__":
+    main()
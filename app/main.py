@@ -3,6 +3,7 @@ import logging
 import sys
 import os
 
+from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
@@ -10,17 +11,72 @@ from aiogram.enums import ParseMode
 
 from app.core.config import settings
 import app.core.database as db
-from app.core import index_db
-from app import bot_handlers
+from app.core import index_db, retention
+from app.core.scheduler import Scheduler
+from app import bot_handlers, webhook
+from app.agent import agent_runner, conversation_memory
+from app.agent.llms import LLMFactory
+from app.agent.nodes.autonomous_task import RecommendUsersAutonomousTask
 from app.bot_handlers.commands import setup_bot_commands
+from app.bot_handlers.middlewares import InFlightMiddleware, in_flight
+
+
+def create_bot() -> Bot:
+    return Bot(
+        settings.TELEGRAM_TOKEN,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
 
 
 def setup_handlers(dp: Dispatcher) -> None:
+    dp.update.outer_middleware(InFlightMiddleware(in_flight))
     dp.include_routers(bot_handlers.CommandRouter, bot_handlers.MessageRouter)
 
 
+background_tasks: set[asyncio.Task] = set()
+metrics_server: web.AppRunner | None = None
+
+
+def create_scheduler(bot: Bot) -> Scheduler:
+    scheduler = Scheduler()
+    task = RecommendUsersAutonomousTask(LLMFactory.get_role_llm("autonomous"))
+
+    async def recommend_users(shard: int, shards: int, run_key: str) -> bool:
+        async with db.async_session_factory() as session:
+            return await task.ainvoke(session, bot, shard=shard, shards=shards, run_key=run_key)
+
+    scheduler.add_job(
+        "recommend_users",
+        settings.AUTONOMOUS_TASK_SCHEDULE,
+        recommend_users,
+        shards=settings.AUTONOMOUS_TASK_SHARDS,
+        window=settings.AUTONOMOUS_TASK_SHARD_WINDOW,
+        jitter=settings.AUTONOMOUS_TASK_JITTER,
+        retries=settings.AUTONOMOUS_TASK_MAX_ATTEMPTS - 1,
+        retry_delay=settings.AUTONOMOUS_TASK_RETRY_DELAY,
+    )
+    return scheduler
+
+
+def start_background_tasks(bot: Bot) -> None:
+    if settings.MESSAGES_RETENTION_ENABLED:
+        background_tasks.add(asyncio.create_task(retention.retention_worker()))
+    if settings.AUTONOMOUS_TASK_SCHEDULE:
+        background_tasks.add(asyncio.create_task(create_scheduler(bot).run()))
+
+
+async def stop_background_tasks() -> None:
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+
+
 async def aiogram_on_startup_polling(dispatcher: Dispatcher, bot: Bot) -> None:
+    global metrics_server
     await bot.delete_webhook(drop_pending_updates=True)
+    if settings.METRICS_PORT:
+        metrics_server = await webhook.start_metrics_server()
     setup_handlers(dispatcher)
     await setup_bot_commands(bot)
     db.setup_db()
@@ -28,27 +84,83 @@ async def aiogram_on_startup_polling(dispatcher: Dispatcher, bot: Bot) -> None:
     #index_db.drop_index_db()
     index_db.populate_index_db()
     #index_db.test_index_db()
+    start_background_tasks(bot)
 
 
 async def aiogram_on_shutdown_polling(dispatcher: Dispatcher, bot: Bot) -> None:
     #await close_db_connections(dispatcher)
+    if not await in_flight.drain(settings.SHUTDOWN_DRAIN_TIMEOUT):
+        print(f"Shutdown: {in_flight.count} updates still in flight after drain timeout")
+    if not await conversation_memory.drain(settings.SHUTDOWN_DRAIN_TIMEOUT):
+        print("Shutdown: conversation summary updates are still running after drain timeout")
+    await stop_background_tasks()
+    agent_runner.shutdown()
+    if metrics_server is not None:
+        await metrics_server.cleanup()
     await bot.session.close()
 
 
-def main() -> None:
-    logging.basicConfig(level=logging.CRITICAL, stream=sys.stdout)
+async def prepare_webhook() -> None:
+    # One-time setup shared by all webhook workers and replicas
+    bot = create_bot()
+    try:
+        await setup_bot_commands(bot)
+        await bot.set_webhook(
+            settings.WEBHOOK_BASE_URL.rstrip("/") + settings.WEBHOOK_PATH,
+            secret_token=settings.WEBHOOK_SECRET or None,
+            drop_pending_updates=True,
+        )
+    finally:
+        await bot.session.close()
+    db.setup_db()
+    index_db.populate_index_db()
+
+
+async def aiogram_on_startup_webhook(dispatcher: Dispatcher, bot: Bot, worker_index: int) -> None:
+    global metrics_server
+    if settings.WEBHOOK_WORKERS > 1 and settings.METRICS_PORT:
+        metrics_server = await webhook.start_metrics_server(port=settings.METRICS_PORT + worker_index)
+    setup_handlers(dispatcher)
+    if worker_index == 0:
+        start_background_tasks(bot)
+
+
+async def aiogram_on_shutdown_webhook(dispatcher: Dispatcher, bot: Bot) -> None:
+    if not await in_flight.drain(settings.SHUTDOWN_DRAIN_TIMEOUT):
+        print(f"Shutdown: {in_flight.count} updates still in flight after drain timeout")
+    if not await conversation_memory.drain(settings.SHUTDOWN_DRAIN_TIMEOUT):
+        print("Shutdown: conversation summary updates are still running after drain timeout")
+    await stop_background_tasks()
+    agent_runner.shutdown()
+    if metrics_server is not None:
+        await metrics_server.cleanup()
+    await bot.session.close()
 
-    bot = Bot(
-        settings.TELEGRAM_TOKEN,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
 
+def run_webhook_worker(worker_index: int) -> None:
+    logging.basicConfig(level=logging.CRITICAL, stream=sys.stdout)
+
+    bot = create_bot()
     dp = Dispatcher()
+    dp.startup.register(aiogram_on_startup_webhook)
+    dp.shutdown.register(aiogram_on_shutdown_webhook)
+
+    shared_port = settings.WEBHOOK_WORKERS > 1
+    # Workers sharing the port expose metrics on their own METRICS_PORT + worker_index
+    serve_metrics = bool(settings.METRICS_PORT) and not shared_port
+    app = webhook.build_webhook_app(dp, bot, worker_index, serve_metrics=serve_metrics)
+    webhook.serve_webhook_app(app, reuse_port=shared_port)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.CRITICAL, stream=sys.stdout)
 
     if settings.USE_WEBHOOK:
-        #TODO: Implement webhook mode
-        raise NotImplementedError
+        asyncio.run(prepare_webhook())
+        webhook.run_webhook_workers(run_webhook_worker, settings.WEBHOOK_WORKERS)
     else:
+        bot = create_bot()
+        dp = Dispatcher()
         dp.startup.register(aiogram_on_startup_polling)
         dp.shutdown.register(aiogram_on_shutdown_polling)
         
@@ -1 +1 @@
-from . import base, user, message
+from . import base, user, message, task_run
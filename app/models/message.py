@@ -1,6 +1,8 @@
 from enum import StrEnum
+import datetime
 
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index, LargeBinary, String
+from sqlalchemy.sql import func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base, created_at
@@ -21,8 +23,41 @@ class Message(Base):
     message_type: Mapped[MessageType] = mapped_column(nullable=False)
     content: Mapped[str] = mapped_column(nullable=False)
     created_at: Mapped[created_at]
+    trace_id: Mapped[str | None] = mapped_column(String(32), nullable=True)  # turn that stored the message, see app/core/tracing.py
 
     user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete="CASCADE"), nullable=False)
     user: Mapped["User"] = relationship(back_populates='messages', lazy="joined")
 
     repr_cols = ('user_id', 'content', 'message_type', 'created_at')
+
+    __table_args__ = (
+        Index('ix_messages_user_id_created_at', 'user_id', 'created_at'),
+    )
+
+
+class MessageArchive(Base):
+    """Messages moved out of the hot table by the retention job, content is zlib-compressed"""
+    __tablename__ = 'messages_archive'
+
+    id: Mapped[int] = mapped_column(primary_key=True)  # id of the original message
+
+    message_type: Mapped[MessageType] = mapped_column(nullable=False)
+    content: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    created_at: Mapped[datetime.datetime] = mapped_column(nullable=False)
+    archived_at: Mapped[datetime.datetime] = mapped_column(server_default=func.now())
+
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete="CASCADE"), nullable=False, index=True)
+
+    repr_cols = ('user_id', 'message_type', 'created_at')
+
+
+class ConversationSummary(Base):
+    """Rolling summary of a user's messages up to last_message_id, the newer ones go to the prompt as is"""
+    __tablename__ = 'conversation_summaries'
+
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete="CASCADE"), primary_key=True)
+    content: Mapped[str] = mapped_column(nullable=False, default="")
+    last_message_id: Mapped[int] = mapped_column(nullable=False, default=0)
+    updated_at: Mapped[datetime.datetime] = mapped_column(server_default=func.now(), onupdate=func.now())
+
+    repr_cols = ('user_id', 'last_message_id', 'updated_at')
@@ -0,0 +1,47 @@
+from enum import StrEnum
+import datetime
+
+from sqlalchemy import ForeignKey, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base, created_at
+
+
+class TaskRunStatus(StrEnum):
+    RUNNING = "running"
+    DONE = "done"
+    PARTIAL = "partial"  # finished, some users failed and are retried by the next attempt
+    FAILED = "failed"  # aborted by an error or abandoned by a stopped replica
+
+
+class TaskRun(Base):
+    __tablename__ = "task_runs"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(nullable=False, index=True)
+    run_key: Mapped[str | None] = mapped_column(nullable=True)  # schedule slot of a scheduled run
+    status: Mapped[TaskRunStatus] = mapped_column(nullable=False, default=TaskRunStatus.RUNNING)
+    processed: Mapped[int] = mapped_column(nullable=False, default=0)
+    failed: Mapped[int] = mapped_column(nullable=False, default=0)  # users failed by the last attempt
+    attempts: Mapped[int] = mapped_column(nullable=False, default=0)
+    created_at: Mapped[created_at]
+    finished_at: Mapped[datetime.datetime | None] = mapped_column(nullable=True)
+
+    repr_cols = ('name', 'run_key', 'status', 'processed', 'failed', 'attempts')
+
+    __table_args__ = (
+        UniqueConstraint('name', 'run_key', name='uq_task_runs_name_run_key'),
+    )
+
+
+class TaskRunItem(Base):
+    """User already handled by a run, used to resume an interrupted run"""
+    __tablename__ = "task_run_items"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    run_id: Mapped[int] = mapped_column(ForeignKey("task_runs.id", ondelete="CASCADE"), nullable=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('run_id', 'user_id', name='uq_task_run_items_run_user'),
+    )
@@ -1 +1 @@
-from . import message, user
+from . import message, user, task_run
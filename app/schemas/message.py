@@ -15,5 +15,15 @@ class Message(MessageBase):
     user_id: int
     #user: "User"
     created_at: datetime
+    trace_id: str | None = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ConversationSummary(BaseModel):
+    user_id: int
+    content: str
+    last_message_id: int
+    updated_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,18 @@
+from datetime import datetime
+from pydantic import BaseModel, ConfigDict
+
+from app.models.task_run import TaskRunStatus
+
+
+class TaskRun(BaseModel):
+    id: int
+    name: str
+    run_key: str | None
+    status: TaskRunStatus
+    processed: int
+    failed: int
+    attempts: int
+    created_at: datetime
+    finished_at: datetime | None
+
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,120 @@
+import asyncio
+import multiprocessing
+import signal
+from typing import Callable
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.bot_handlers.middlewares import in_flight
+
+
+async def health_handler(request: web.Request) -> web.Response:
+    status = 503 if in_flight.draining else 200
+    return web.json_response(
+        {
+            "status": "draining" if in_flight.draining else "ok",
+            "worker": request.app["worker_index"],
+            "in_flight": in_flight.count,
+        },
+        status=status,
+    )
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(
+        body=registry.render().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+async def start_metrics_server(host: str = settings.WEBAPP_HOST, port: int = settings.METRICS_PORT) -> web.AppRunner:
+    """Отдельный HTTP-сервер с /metrics: в режиме polling и у каждого из нескольких воркеров вебхука"""
+    app = web.Application()
+    app.router.add_get(settings.METRICS_PATH, metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def build_webhook_app(
+    dispatcher: Dispatcher,
+    bot: Bot,
+    worker_index: int = 0,
+    serve_metrics: bool = False,
+) -> web.Application:
+    """
+    :param serve_metrics: Отдавать /metrics на порту вебхука, по умолчанию метрики не открываются.
+        Не подходит для нескольких воркеров на одном порту: запрос попадает в случайный воркер
+        со своими значениями счётчиков
+    """
+    app = web.Application()
+    app["worker_index"] = worker_index
+    app.router.add_get(settings.HEALTH_PATH, health_handler)
+    if serve_metrics:
+        app.router.add_get(settings.METRICS_PATH, metrics_handler)
+
+    # Requests without the matching X-Telegram-Bot-Api-Secret-Token header are rejected with 401
+    SimpleRequestHandler(
+        dispatcher=dispatcher,
+        bot=bot,
+        secret_token=settings.WEBHOOK_SECRET or None,
+    ).register(app, path=settings.WEBHOOK_PATH)
+    setup_application(app, dispatcher, bot=bot, worker_index=worker_index)
+    return app
+
+
+async def _serve(app: web.Application, reuse_port: bool, grace_period: float) -> None:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, settings.WEBAPP_HOST, settings.WEBAPP_PORT, reuse_port=reuse_port).start()
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        await stop.wait()
+        # /health answers 503 while the socket is still open, so the load balancer sees the worker
+        # draining and stops sending traffic before the listener goes away
+        in_flight.draining = True
+        await asyncio.sleep(grace_period)
+    finally:
+        # Closes the listener, then on_shutdown drains the updates in flight
+        await runner.cleanup()
+
+
+def serve_webhook_app(
+    app: web.Application, reuse_port: bool = False, grace_period: float = settings.SHUTDOWN_GRACE_PERIOD
+) -> None:
+    asyncio.run(_serve(app, reuse_port, grace_period))
+
+
+def run_webhook_workers(worker_target: Callable[[int], None], workers: int = settings.WEBHOOK_WORKERS) -> None:
+    if workers <= 1:
+        worker_target(0)
+        return
+
+    # Every worker binds the same port with SO_REUSEPORT, the kernel balances connections
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=worker_target, args=(i,), name=f"webhook-worker-{i}") for i in range(workers)]
+    for process in processes:
+        process.start()
+
+    def terminate_workers(*args) -> None:
+        # Workers handle SIGTERM as a graceful shutdown and drain in-flight updates
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, terminate_workers)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        terminate_workers()
+        for process in processes:
+            process.join()
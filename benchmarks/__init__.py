@@ -0,0 +1,14 @@
+"""
+Офлайн-бенчмарки бота: настоящие MovieAgent, ExecutorNode, тулы, CRUD и хендлеры aiogram
+на локальных заменах внешних сервисов.
+
+- LLM и эмбеддинги — локальный OpenAI-совместимый сервер с заданной задержкой и потоком токенов (fake_openai.py),
+  ответы по сценариям (scenarios.py)
+- Кинопоиск — HTTP-сервер с записанными ответами API (kinopoisk.py, data/kinopoisk.json)
+- Chroma — индекс в памяти процесса (INDEX_DB_BACKEND=memory)
+- Википедия — локальное хранилище статей из небольшого дампа (data/wiki.xml)
+- Telegram — сессия aiogram без сети (telegram.py)
+- БД — временный файл SQLite
+
+python -m benchmarks.run --concurrency 1 4 16 --turns 64
+"""
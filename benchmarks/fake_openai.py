@@ -0,0 +1,171 @@
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import re
+import time
+from typing import Callable
+
+import numpy as np
+from aiohttp import web
+
+
+CHARS_PER_TOKEN = 3  # Cyrillic text is about 3 characters per token
+EMBEDDING_DIM = 256
+
+# (prompt, names of the tools offered to the model) -> answer text, or tool/JSON arguments
+Responder = Callable[[str, list[str]], str | dict]
+
+_ids = itertools.count(1)
+_WORD = re.compile(r"\w+")
+
+
+def split_tokens(text: str) -> list[str]:
+    return [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)] or [""]
+
+
+def embed(text: str) -> np.ndarray:
+    """Эмбеддинг по хэшам символьных триграмм: тексты с общими словами близки по косинусу"""
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for word in _WORD.findall(text.lower().replace("ё", "е")):
+        word = f" {word} "
+        for i in range(len(word) - 2):
+            digest = hashlib.blake2b(word[i:i + 3].encode(), digest_size=4).digest()
+            vector[int.from_bytes(digest, "little") % EMBEDDING_DIM] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _content(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content)
+    return content
+
+
+class FakeOpenAI:
+    """
+    OpenAI-совместимый сервер для ChatOpenAI и эмбеддингов Chroma.
+
+    Ответ приходит через latency секунд (время до первого токена), затем по token_latency на токен;
+    при stream=true токены отдаются отдельными SSE-чанками. Текст ответа или аргументы вызова тула
+    возвращает responder.
+    """
+
+    def __init__(
+        self,
+        responder: Responder,
+        latency: float = 0.3,
+        token_latency: float = 0.01,
+        embedding_latency: float = 0.05,
+    ):
+        self._responder = responder
+        self._latency = latency
+        self._token_latency = token_latency
+        self._embedding_latency = embedding_latency
+        self.requests = 0  # chat completions
+        self.embedding_requests = 0
+
+    def build_app(self) -> web.Application:
+        app = web.Application(client_max_size=32 * 1024 ** 2)
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_post("/v1/embeddings", self.embeddings)
+        return app
+
+    def _reply(self, body: dict) -> tuple[str | None, dict | None]:
+        """:return: (текст ответа, вызов тула {"name", "arguments"})"""
+        prompt = "\n".join(_content(message) for message in body["messages"])
+        tools = [tool["function"]["name"] for tool in body.get("tools") or []]
+        reply = self._responder(prompt, tools)
+        if isinstance(reply, str):
+            return reply, None
+        arguments = json.dumps(reply, ensure_ascii=False)
+        if not tools:
+            return arguments, None  # json_schema and json_mode answers are JSON in the content
+        tool_choice = body.get("tool_choice")
+        name = tool_choice["function"]["name"] if isinstance(tool_choice, dict) else tools[0]
+        return None, {"name": name, "arguments": arguments}
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        self.requests += 1
+        text, tool_call = self._reply(body)
+        prompt_tokens = sum(len(_content(message)) for message in body["messages"]) // CHARS_PER_TOKEN
+        tokens = split_tokens(tool_call["arguments"] if tool_call else text)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        }
+        completion_id = f"chatcmpl-bench-{next(_ids)}"
+        tool_calls = [{"id": f"call_{next(_ids)}", "type": "function", "function": tool_call}] if tool_call else None
+        finish_reason = "tool_calls" if tool_call else "stop"
+
+        if not body.get("stream"):
+            await asyncio.sleep(self._latency + self._token_latency * len(tokens))
+            message = {"role": "assistant", "content": text, **({"tool_calls": tool_calls} if tool_calls else {})}
+            return web.json_response({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason, "logprobs": None}],
+                "usage": usage,
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(delta: dict, finish: str | None = None) -> None:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish, "logprobs": None}],
+            }
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+
+        await asyncio.sleep(self._latency)
+        for i, token in enumerate(tokens):
+            if tool_call:
+                call = {"index": 0, "function": {"arguments": token}}
+                if i == 0:
+                    call.update(id=tool_calls[0]["id"], type="function")
+                    call["function"]["name"] = tool_call["name"]
+                delta = {"tool_calls": [call]}
+            else:
+                delta = {"content": token}
+            await send({"role": "assistant", **delta} if i == 0 else delta)
+            await asyncio.sleep(self._token_latency)
+        await send({}, finish_reason)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": body["model"], "choices": [], "usage": usage}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.embedding_requests += 1
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        await asyncio.sleep(self._embedding_latency)
+        data = []
+        for i, text in enumerate(texts):
+            vector = embed(text)
+            # The openai client asks for base64 unless the caller sets encoding_format
+            value = (
+                base64.b64encode(vector.tobytes()).decode()
+                if body.get("encoding_format") == "base64" else vector.tolist()
+            )
+            data.append({"object": "embedding", "index": i, "embedding": value})
+        tokens = sum(len(text) for text in texts) // CHARS_PER_TOKEN
+        return web.json_response({
+            "object": "list",
+            "data": data,
+            "model": body["model"],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
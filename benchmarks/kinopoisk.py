@@ -0,0 +1,125 @@
+import asyncio
+import json
+import re
+from pathlib import Path
+
+from aiohttp import web
+
+
+DATA_PATH = Path(__file__).parent / "data" / "kinopoisk.json"
+
+_WORD = re.compile(r"\w+")
+
+
+def _words(text: str | None) -> set[str]:
+    return set(_WORD.findall((text or "").lower().replace("ё", "е")))
+
+
+def _in_range(value, bounds: str) -> bool:
+    low, _, high = bounds.partition("-")
+    return value is not None and float(low) <= float(value) <= float(high or low)
+
+
+class RecordedKinopoisk:
+    """
+    API Кинопоиска v1.4 на записанных ответах: документы фильмов, персон и отзывов в формате API
+    из data/kinopoisk.json. Поиск по названию и фильтры выполняются над ними, как это делает API
+    для использованных агентом параметров; остальные параметры игнорируются.
+    """
+
+    def __init__(self, path: Path = DATA_PATH, latency: float = 0.1):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        self._movies: list[dict] = data["movies"]
+        self._persons: list[dict] = data["persons"]
+        self._reviews: list[dict] = data["reviews"]
+        self._latency = latency
+        self.requests = 0
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/v1.4/movie", self.movie)
+        app.router.add_get("/v1.4/movie/search", self.movie_search)
+        app.router.add_get("/v1.4/person/search", self.person_search)
+        app.router.add_get("/v1.4/review", self.review)
+        app.middlewares.append(self._middleware)
+        return app
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        self.requests += 1
+        if not request.headers.get("X-API-KEY"):
+            return web.json_response({"message": "В запросе не указан токен!"}, status=401)
+        await asyncio.sleep(self._latency)
+        return await handler(request)
+
+    @staticmethod
+    def _page(request: web.Request, docs: list[dict]) -> web.Response:
+        limit = int(request.query.get("limit", 10))
+        page = int(request.query.get("page", 1))
+        return web.json_response({
+            "docs": docs[(page - 1) * limit:page * limit],
+            "total": len(docs),
+            "limit": limit,
+            "page": page,
+            "pages": (len(docs) + limit - 1) // limit,
+        })
+
+    @staticmethod
+    def _search(items: list[dict], query: str, fields: tuple[str, ...]) -> list[dict]:
+        query_words = _words(query)
+        scored = []
+        for item in items:
+            score = max(len(query_words & _words(item.get(name))) for name in fields)
+            if score:
+                scored.append((score, item))
+        # The API puts the best match first
+        scored.sort(key=lambda pair: -pair[0])
+        return [item for _, item in scored]
+
+    async def movie_search(self, request: web.Request) -> web.Response:
+        docs = self._search(self._movies, request.query.get("query", ""), ("name", "enName", "alternativeName"))
+        return self._page(request, docs)
+
+    async def person_search(self, request: web.Request) -> web.Response:
+        docs = self._search(self._persons, request.query.get("query", ""), ("name", "enName"))
+        return self._page(request, docs)
+
+    async def review(self, request: web.Request) -> web.Response:
+        movie_ids = {int(movie_id) for movie_id in request.query.getall("movieId", [])}
+        return self._page(request, [review for review in self._reviews if review["movieId"] in movie_ids])
+
+    @staticmethod
+    def _matches(values: list[str], names: set[str]) -> bool:
+        """Значения вида "драма", "!ужасы", "+боевик", как в фильтрах API"""
+        included = [value.lstrip("+") for value in values if not value.startswith("!")]
+        excluded = [value[1:] for value in values if value.startswith("!")]
+        return (not included or any(value in names for value in included)) and not any(value in names for value in excluded)
+
+    def _filter(self, request: web.Request, movie: dict) -> bool:
+        query = request.query
+        if "lists" in query and not set(query.getall("lists")) & set(movie.get("lists", [])):
+            return False
+        if "type" in query and movie.get("type") not in query.getall("type"):
+            return False
+        if "genres.name" in query and not self._matches(query.getall("genres.name"), {g["name"] for g in movie["genres"]}):
+            return False
+        if "countries.name" in query and not self._matches(
+            query.getall("countries.name"), {c["name"] for c in movie["countries"]}
+        ):
+            return False
+        if "persons.id" in query and not self._matches(
+            query.getall("persons.id"), {str(p["id"]) for p in movie.get("persons", [])}
+        ):
+            return False
+        for key, value in (("year", movie.get("year")), ("rating.kp", movie["rating"].get("kp")),
+                           ("rating.imdb", movie["rating"].get("imdb")), ("votes.kp", movie["votes"].get("kp"))):
+            if key in query and not _in_range(value, query[key]):
+                return False
+        return True
+
+    async def movie(self, request: web.Request) -> web.Response:
+        docs = [movie for movie in self._movies if self._filter(request, movie)]
+        if request.query.get("sortField") == "rating.kp":
+            docs.sort(key=lambda movie: movie["rating"].get("kp") or 0, reverse=request.query.get("sortType") == "-1")
+        return self._page(request, docs)
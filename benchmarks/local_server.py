@@ -0,0 +1,72 @@
+import asyncio
+import socket
+import threading
+
+from aiohttp import web
+
+
+class LocalServer:
+    """aiohttp-приложение на 127.0.0.1 в отдельном потоке со своим event loop, чтобы не делить loop с ботом"""
+
+    def __init__(self, app: web.Application, name: str):
+        self._app = app
+        self._name = name
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._runner: web.AppRunner | None = None
+        self._thread: threading.Thread | None = None
+        self.port = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "LocalServer":
+        started = threading.Event()
+
+        def run() -> None:
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._runner = web.AppRunner(self._app, access_log=None)
+            self._loop.run_until_complete(self._runner.setup())
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+            self._loop.run_until_complete(web.SockSite(self._runner, sock).start())
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._runner.cleanup())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name=self._name, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(5)
+
+
+_LOOPBACK = ("127.0.0.1", "::1", "localhost")
+
+
+def forbid_network() -> None:
+    """Запрещает соединения не с localhost: бенчмарк не должен незаметно ходить во внешние сервисы"""
+    connect = socket.socket.connect
+    connect_ex = socket.socket.connect_ex
+
+    def check(address) -> None:
+        if isinstance(address, tuple) and address[0] not in _LOOPBACK:
+            raise ConnectionRefusedError(f"Network access is disabled in benchmarks: {address[0]}")
+
+    def guarded_connect(self, address):
+        check(address)
+        return connect(self, address)
+
+    def guarded_connect_ex(self, address):
+        check(address)
+        return connect_ex(self, address)
+
+    socket.socket.connect = guarded_connect
+    socket.socket.connect_ex = guarded_connect_ex
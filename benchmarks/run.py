@@ -0,0 +1,244 @@
+"""
+Офлайн-бенчмарк хода бота: задержка хода (от апдейта Telegram до ответа) p50/p95/p99 и пропускная способность
+при разном числе одновременных пользователей. Каждый пользователь пишет в свой чат и отправляет следующее
+сообщение после ответа на предыдущее; сообщения по кругу берутся из сценариев scenarios.SCENARIOS.
+
+python -m benchmarks.run --concurrency 1 4 16 --turns 64 --save baseline.json
+python -m benchmarks.run --compare baseline.json --max-regression 0.2 — код возврата 1 при регрессии
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from .fake_openai import FakeOpenAI
+from .kinopoisk import RecordedKinopoisk
+from .local_server import LocalServer, forbid_network
+from .scenarios import SCENARIOS, ScriptedResponder
+
+
+WIKI_DUMP = Path(__file__).parent / "data" / "wiki.xml"
+LLM_ROLES = ("PLANNER", "PARAMS", "PREFERENCES", "TOOL_ANSWER", "EXECUTOR", "AUTONOMOUS", "SUMMARY", "CASCADE_MODEL")
+NODES = ("router", "planner", "executor")
+
+
+@dataclass
+class LevelResult:
+    concurrency: int
+    turns: int
+    errors: int
+    p50: float
+    p95: float
+    p99: float
+    mean: float
+    throughput: float  # turns per second
+    llm_requests: float  # per turn
+    kp_requests: float  # per turn
+    nodes: dict[str, float]  # mean seconds per turn
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Перцентиль по ближайшему рангу"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] if ordered else 0.0
+
+
+def configure_environment(workdir: str, openai_url: str, kp_url: str) -> None:
+    # External services always point to the local stand-ins, the agent settings may be tuned from the environment
+    db_path = os.path.join(workdir, "bench.db")
+    os.environ.update({
+        "ASYNC_DB_URI": f"sqlite+aiosqlite:///{db_path}",
+        "DB_URI": f"sqlite:///{db_path}",
+        "TELEGRAM_TOKEN": "123456:benchmark",
+        "KP_API_KEY": "benchmark",
+        "KP_BASE_URL": f"{kp_url}/v1.4",
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        "INDEX_DB_BACKEND": "memory",
+        "WIKI_STORE_PATH": os.path.join(workdir, "wiki_store.sqlite3"),
+        "TRACE_EXPORTER": os.environ.get("TRACE_EXPORTER", "none"),
+        # Empty role models fall back to LLM_NAME
+        **{f"LLM_{role}": "" for role in LLM_ROLES},
+    })
+    os.environ.pop("OPENAI_API_BASE", None)  # langchain prefers it to OPENAI_BASE_URL
+    os.environ.setdefault("LLM_NAME", "gpt-4o-mini")
+    os.environ.setdefault("MESSAGE_COALESCE_DELAY", "0")
+
+
+class Benchmark:
+    def __init__(self, dispatcher, bot, session, llm: FakeOpenAI, kinopoisk: RecordedKinopoisk, timeout: float):
+        self._dispatcher = dispatcher
+        self._bot = bot
+        self._session = session
+        self._llm = llm
+        self._kinopoisk = kinopoisk
+        self._timeout = timeout
+        self._next_chat_id = 1_000_000
+
+    async def _turn(self, chat_id: int, text: str) -> tuple[bool, float]:
+        from app.fake_telegram import build_message_update
+
+        answer = self._session.wait_answer(chat_id)
+        start = time.perf_counter()
+        await self._dispatcher.feed_raw_update(self._bot, build_message_update(text, chat_id, "Bench User"))
+        try:
+            ok, _ = await asyncio.wait_for(answer, self._timeout)
+        except asyncio.TimeoutError:
+            ok = False
+        return ok, time.perf_counter() - start
+
+    async def run_level(self, concurrency: int, turns: int) -> LevelResult:
+        from app.agent import conversation_memory
+        from app.agent.graph.movie_agent import NODE_LATENCY
+
+        latencies: list[float] = []
+        errors = 0
+        issued = 0
+        llm_requests, kp_requests = self._llm.requests, self._kinopoisk.requests
+        node_sums = {node: NODE_LATENCY.sum(node=node) for node in NODES}
+
+        async def user(chat_id: int) -> None:
+            nonlocal errors, issued
+            while issued < turns:
+                scenario = SCENARIOS[issued % len(SCENARIOS)]
+                issued += 1
+                ok, latency = await self._turn(chat_id, scenario.question)
+                latencies.append(latency)
+                errors += not ok
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user(self._next_chat_id + i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        self._next_chat_id += concurrency
+        # Summary updates of this level must not slow down the next one
+        await conversation_memory.drain(self._timeout)
+
+        return LevelResult(
+            concurrency=concurrency,
+            turns=len(latencies),
+            errors=errors,
+            p50=percentile(latencies, 50),
+            p95=percentile(latencies, 95),
+            p99=percentile(latencies, 99),
+            mean=sum(latencies) / len(latencies),
+            throughput=len(latencies) / elapsed,
+            llm_requests=(self._llm.requests - llm_requests) / len(latencies),
+            kp_requests=(self._kinopoisk.requests - kp_requests) / len(latencies),
+            nodes={node: (NODE_LATENCY.sum(node=node) - node_sums[node]) / len(latencies) for node in NODES},
+        )
+
+
+def print_results(results: list[LevelResult]) -> None:
+    print(f"{'users':>5} {'turns':>5} {'errors':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'mean':>8} {'turns/s':>8} "
+          f"{'llm/turn':>8} {'kp/turn':>8}  node time per turn")
+    for r in results:
+        nodes = " ".join(f"{node}={seconds * 1000:.0f}ms" for node, seconds in r.nodes.items())
+        print(f"{r.concurrency:>5} {r.turns:>5} {r.errors:>6} {r.p50:>7.3f}s {r.p95:>7.3f}s {r.p99:>7.3f}s "
+              f"{r.mean:>7.3f}s {r.throughput:>8.2f} {r.llm_requests:>8.1f} {r.kp_requests:>8.1f}  {nodes}")
+
+
+def compare(results: list[LevelResult], baseline_path: str, max_regression: float) -> bool:
+    """:return: True, если p95 и пропускная способность не хуже базовых больше чем на max_regression"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {level["concurrency"]: level for level in json.load(f)["levels"]}
+    ok = True
+    for r in results:
+        base = baseline.get(r.concurrency)
+        if base is None:
+            continue
+        p95_change = r.p95 / base["p95"] - 1
+        throughput_change = r.throughput / base["throughput"] - 1
+        regressed = p95_change > max_regression or throughput_change < -max_regression
+        ok &= not regressed
+        print(f"{r.concurrency:>5} users: p95 {base['p95']:.3f}s -> {r.p95:.3f}s ({p95_change:+.1%}), "
+              f"throughput {base['throughput']:.2f} -> {r.throughput:.2f} ({throughput_change:+.1%})"
+              f"{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+async def run(args: argparse.Namespace) -> bool:
+    forbid_network()
+    workdir = tempfile.mkdtemp(prefix="movie-bench-")
+    llm = FakeOpenAI(
+        ScriptedResponder(answer_tokens=args.answer_tokens),
+        latency=args.llm_latency,
+        token_latency=args.token_latency,
+        embedding_latency=args.embedding_latency,
+    )
+    kinopoisk = RecordedKinopoisk(latency=args.kp_latency)
+    servers = [LocalServer(llm.build_app(), "fake-openai").start(), LocalServer(kinopoisk.build_app(), "fake-kp").start()]
+    configure_environment(workdir, servers[0].url, servers[1].url)
+
+    # The app reads its settings on import
+    from aiogram import Bot, Dispatcher
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.enums import ParseMode
+    from app.core import database as db, index_db
+    from app.core.config import settings
+    from app.core.wiki_store import wiki_store
+    from app.main import setup_handlers
+    from app.agent import agent_runner
+    from .telegram import FakeTelegramSession
+
+    wiki_store.ingest(str(WIKI_DUMP), show_logs=False)
+    db.setup_db()
+    index_db.populate_index_db()
+
+    session = FakeTelegramSession(latency=args.telegram_latency)
+    bot = Bot(settings.TELEGRAM_TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    dispatcher = Dispatcher()
+    setup_handlers(dispatcher)
+    benchmark = Benchmark(dispatcher, bot, session, llm, kinopoisk, args.timeout)
+
+    print(f"LLM {settings.LLM_NAME}: {args.llm_latency}s + {args.token_latency}s/token, Kinopoisk {args.kp_latency}s, "
+          f"agent {settings.AGENT_EXECUTION_MODE} x{settings.AGENT_WORKERS}, "
+          f"max concurrent runs {settings.MAX_CONCURRENT_AGENT_RUNS}, planner {settings.PLANNER_MODE}")
+    try:
+        if args.warmup:
+            await benchmark.run_level(1, args.warmup)
+        results = []
+        for concurrency in args.concurrency:
+            results.append(await benchmark.run_level(concurrency, max(args.turns, concurrency)))
+        print_results(results)
+    finally:
+        agent_runner.shutdown()
+        await bot.session.close()
+        for server in servers:
+            server.stop()
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "levels": [asdict(r) for r in results]}, f, indent=2)
+    if args.compare:
+        return compare(results, args.compare, args.max_regression)
+    return all(r.errors == 0 for r in results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="simultaneous users per level")
+    parser.add_argument("--turns", type=int, default=40, help="turns per level")
+    parser.add_argument("--warmup", type=int, default=len(SCENARIOS), help="unmeasured turns before the first level")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds to the first token")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="seconds per output token")
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--answer-tokens", type=int, default=150, help="length of the final answer")
+    parser.add_argument("--kp-latency", type=float, default=0.1, help="Kinopoisk API latency")
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="Bot API call latency")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds to wait for an answer")
+    parser.add_argument("--save", help="write the results to a JSON file")
+    parser.add_argument("--compare", help="JSON file of a previous run to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed p95/throughput regression")
+    args = parser.parse_args()
+
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import json
+import re
+from dataclasses import dataclass, field
+
+from .fake_openai import CHARS_PER_TOKEN
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """Сообщение пользователя и ответы LLM для него"""
+    name: str
+    question: str
+    tasks: tuple[tuple[str, str], ...] = ()  # plan of the LLM planner: (agent, question)
+    params: dict = field(default_factory=dict)  # API params of MoviesSearch or PeopleSearchByName
+    preferences: tuple[dict, ...] = ()
+    answer: str = ""
+
+
+NOLAN_LIKE = {"item_name": "Кристофер Нолан", "preference_item": "director", "preference_type": "like"}
+
+# The fast router plans simple requests itself, the others go through the LLM planner,
+# so both paths of the graph are measured
+SCENARIOS = (
+    Scenario(
+        "greeting", "Привет!",
+        answer="Привет! Я помогу найти фильм, расскажу об актёрах и режиссёрах и подскажу, что посмотреть.",
+    ),
+    Scenario(
+        "movie_info", "Расскажи о фильме Интерстеллар",
+        tasks=(("MoviesSearch", "Расскажи о фильме Интерстеллар"),),
+        params={"title": ["Интерстеллар"]},
+        answer="«Интерстеллар» — научно-фантастический фильм Кристофера Нолана 2014 года.",
+    ),
+    Scenario(
+        "rating", "Какой рейтинг у фильма Начало?",
+        tasks=(("MoviesSearch", "Какой рейтинг у фильма Начало?"),),
+        params={"title": ["Начало"]},
+        answer="У фильма «Начало» рейтинг 8.7 на Кинопоиске и 8.8 на IMDb.",
+    ),
+    Scenario(
+        "reviews", "Что пишут о фильме Зеленая миля?",
+        tasks=(("MovieReviewsSummarizer", "Зеленая миля"),),
+        answer="Зрители называют «Зелёную милю» одним из самых трогательных фильмов.",
+    ),
+    Scenario(
+        "person", "Сколько лет Киану Ривзу?",
+        tasks=(("PeopleSearchByName", "Сколько лет Киану Ривзу?"),),
+        params={"query": "Киану Ривз"},
+        answer="Киану Ривз родился 2 сентября 1964 года в Бейруте.",
+    ),
+    Scenario(
+        "plot", "Как называется фильм, где астронавт застрял на Марсе и выращивал картошку?",
+        tasks=(("MovieSemanticSearch", "астронавт застрял на Марсе и выращивал картошку"),),
+        answer="Это фильм «Марсианин» Ридли Скотта с Мэттом Деймоном.",
+    ),
+    Scenario(
+        "recommendation", "Посоветуй американские фильмы в жанре фантастика, я люблю Нолана",
+        tasks=(
+            ("UserPreferencesManager", "Пользователь любит режиссёра Кристофера Нолана"),
+            ("MoviesSearch", "Составь подборку американских фильмов в жанре фантастика"),
+        ),
+        params={"genres.name": ["фантастика"], "countries.name": ["США"]},
+        preferences=(NOLAN_LIKE,),
+        answer="Вот американская фантастика с высоким рейтингом: «Интерстеллар», «Начало», «Матрица».",
+    ),
+    Scenario(
+        "filmography", "Какие фильмы снял Кристофер Нолан? Хочу посмотреть лучшие",
+        tasks=(("MoviesSearch", "Найди фильмы режиссёра Кристофера Нолана"),),
+        params={"persons.name": ["Кристофер Нолан"]},
+        answer="Лучшие фильмы Кристофера Нолана: «Интерстеллар», «Тёмный рыцарь», «Начало» и «Престиж».",
+    ),
+    Scenario(
+        "movie_and_reviews", "Расскажи о фильме Матрица и что о нем пишут зрители",
+        tasks=(
+            ("MoviesSearch", "Расскажи о фильме Матрица"),
+            ("MovieReviewsSummarizer", "Матрица"),
+        ),
+        params={"title": ["Матрица"]},
+        answer="«Матрица» — фантастический боевик братьев Вачовски 1999 года, зрители хвалят его за идеи и экшен.",
+    ),
+    Scenario(
+        "person_bio", "Расскажи о режиссере Кристофере Нолане",
+        tasks=(("PeopleSearchByName", "Расскажи о режиссере Кристофере Нолане"),),
+        params={"query": "Кристофер Нолан"},
+        answer="Кристофер Нолан — британско-американский режиссёр, сценарист и продюсер.",
+    ),
+)
+
+FILLER = (
+    "Фильм получил высокие оценки зрителей и критиков. ",
+    "Сюжет держит в напряжении до самого финала. ",
+    "Отдельно стоит отметить работу оператора и музыку. ",
+    "Актёрский состав раскрывает персонажей очень убедительно. ",
+)
+
+# {field}, but not the escaped braces of {{...}}
+_TEMPLATE_FIELD = re.compile(r"(?<!\{)\{[^{}]+\}(?!\})")
+
+
+def _prompt_templates() -> dict[str, str]:
+    # Imported lazily: the app reads its settings on import, run.py sets them first
+    from app.agent.nodes import (
+        conversation_summary, executor_node, movie_reviews_summarizer, movies_search, people_search_by_name,
+        planner_node, user_preferences,
+    )
+
+    return {
+        "planner": planner_node.PLANNER_PROMPT_TEMPLATE,
+        "planner_structured": planner_node.PLANNER_STRUCTURED_PROMPT_TEMPLATE,
+        "plan_repair": planner_node.PLAN_REPAIR_PROMPT_TEMPLATE,
+        "movies_params": movies_search.MOVIE_SEARCH_PROMPT_TEMPLATE,
+        "movies_answer": movies_search.MOVIE_SEARCH_ANSWER_PROMPT_TEMPLATE,
+        "people_params": people_search_by_name.PEOPLE_SEARCH_BY_NAME_PROMPT_TEMPLATE,
+        "people_answer": people_search_by_name.PEOPLE_SEARCH_BY_NAME_ANSWER_PROMPT_TEMPLATE,
+        "reviews": movie_reviews_summarizer.MOVIE_REVIEWS_SUMMARIZE_PROMPT_TEMPLATE,
+        "preferences": user_preferences.USER_PREFERENCES_MANAGER_PROMPT_TEMPLATE,
+        "executor": executor_node.EXECUTOR_PROMPT_TEMPLATE,
+        "summary": conversation_summary.CONVERSATION_SUMMARY_PROMPT_TEMPLATE,
+    }
+
+
+def _literal_chunks(template: str) -> list[str]:
+    chunks = (chunk.replace("{{", "{").replace("}}", "}").strip() for chunk in _TEMPLATE_FIELD.split(template))
+    return [chunk for chunk in chunks if chunk]
+
+
+class ScriptedResponder:
+    """
+    Ответы fake LLM. Тип промпта определяется по самому длинному неизменному куску его шаблона,
+    сценарий — по вопросу пользователя, который встречается в промпте последним.
+    """
+
+    def __init__(self, scenarios: tuple[Scenario, ...] = SCENARIOS, answer_tokens: int = 150, tool_answer_tokens: int = 80):
+        self._scenarios = scenarios
+        self._answer_tokens = answer_tokens
+        self._tool_answer_tokens = tool_answer_tokens
+        self._markers: dict[str, str] | None = None
+        self._template_sizes: dict[str, int] = {}
+        # Tool questions of the planner and the router both lead to the scenario
+        self._by_question = {}
+        for scenario in scenarios:
+            self._by_question[scenario.question] = scenario
+            for _, question in scenario.tasks:
+                self._by_question.setdefault(question, scenario)
+
+    def _kind(self, prompt: str) -> str | None:
+        if self._markers is None:
+            templates = _prompt_templates()
+            self._markers = {kind: max(_literal_chunks(t), key=len) for kind, t in templates.items()}
+            self._template_sizes = {kind: sum(map(len, _literal_chunks(t))) for kind, t in templates.items()}
+        kinds = [kind for kind, marker in self._markers.items() if marker in prompt]
+        # A template may quote a part of another one, the larger template wins
+        return max(kinds, key=self._template_sizes.get, default=None)
+
+    def _latest_scenario(self, prompt: str) -> Scenario:
+        return max(self._scenarios, key=lambda scenario: prompt.rfind(scenario.question))
+
+    def _tool_scenario(self, prompt: str, start: str, end: str) -> tuple[str, Scenario | None]:
+        """Вопрос тула — текст между последним start и следующим за ним end"""
+        question = prompt.rpartition(start)[2].partition(end)[0].strip().strip('"')
+        return question, self._by_question.get(question)
+
+    @staticmethod
+    def _text(start: str, tokens: int) -> str:
+        parts = [start + " " if start else ""]
+        size = len(parts[0])
+        i = 0
+        while size < tokens * CHARS_PER_TOKEN:
+            parts.append(FILLER[i % len(FILLER)])
+            size += len(parts[-1])
+            i += 1
+        return "".join(parts).strip()
+
+    def __call__(self, prompt: str, tools: list[str]) -> str | dict:
+        kind = self._kind(prompt)
+        if kind in ("planner", "planner_structured", "plan_repair"):
+            scenario = self._latest_scenario(prompt)
+            plan = {"tasks": [{"agent": agent, "question": question} for agent, question in scenario.tasks]}
+            if kind == "planner_structured":
+                if "ReasonedAgentTaskList" in tools:
+                    plan = {"reasoning": f"Нужны агенты: {len(scenario.tasks)}.", **plan}
+                return plan
+            if kind == "plan_repair":
+                return json.dumps(plan, ensure_ascii=False)
+            return (f"Пользователь спрашивает: {scenario.question}\n"
+                    f"```json\n{json.dumps(plan, ensure_ascii=False, indent=2)}\n```")
+        if kind == "movies_params":
+            question, scenario = self._tool_scenario(prompt, "QUESTION:", "COLLECTED_INFO:")
+            return json.dumps(scenario.params if scenario else {"title": [question]}, ensure_ascii=False)
+        if kind == "people_params":
+            question, scenario = self._tool_scenario(prompt, "QUESTION:", "COLLECTED_INFO:")
+            return json.dumps(scenario.params if scenario else {"query": question}, ensure_ascii=False)
+        if kind == "preferences":
+            _, scenario = self._tool_scenario(prompt, "Входное сообщение:", "Твой ответ:")
+            return json.dumps({"preferences": list(scenario.preferences) if scenario else []}, ensure_ascii=False)
+        if kind == "executor":
+            return self._text(self._latest_scenario(prompt).answer, self._answer_tokens)
+        if kind == "summary":
+            return self._text("Пользователь спрашивал о фильмах и людях кино.", self._tool_answer_tokens)
+        return self._text("", self._tool_answer_tokens)
@@ -0,0 +1,78 @@
+import asyncio
+import itertools
+import time
+from collections import Counter
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import EditMessageText, SendMessage, TelegramMethod
+from aiogram.types import Message
+
+from app.bot_handlers.work_queue import SHED_MESSAGE
+
+
+PROGRESS_PREFIX = "Обрабатываю"  # status message of process_turn, replaced by the answer
+ERROR_MESSAGES = ("Internal error", SHED_MESSAGE)
+
+
+class FakeTelegramSession(BaseSession):
+    """
+    Сессия aiogram без сети: запросы бота к Bot API завершаются локально через latency секунд.
+
+    Ход чата заканчивается, когда статусное сообщение заменено ответом или бот отправил сообщение об ошибке,
+    wait_answer() возвращает (успех, текст).
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self._latency = latency
+        self._message_ids = itertools.count(1)
+        self._waiters: dict[int, asyncio.Future] = {}
+        self.requests: Counter[str] = Counter()
+
+    def wait_answer(self, chat_id: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[chat_id] = future
+        return future
+
+    def _finish(self, chat_id: int, ok: bool, text: str) -> None:
+        future = self._waiters.pop(chat_id, None)
+        if future is not None and not future.done():
+            future.set_result((ok, text))
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: int | None = None):
+        self.requests[method.__api_method__] += 1
+        if self._latency:
+            await asyncio.sleep(self._latency)
+        if not isinstance(method, (SendMessage, EditMessageText)):
+            return True  # setMyCommands, deleteWebhook, ...
+
+        chat_id = int(method.chat_id)
+        if isinstance(method, SendMessage):
+            message_id = next(self._message_ids)
+            if method.text in ERROR_MESSAGES:
+                self._finish(chat_id, False, method.text)
+        else:
+            message_id = method.message_id
+            if not method.text.startswith(PROGRESS_PREFIX):
+                self._finish(chat_id, True, method.text)
+        return Message.model_validate(
+            {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": bot.id, "is_bot": True, "first_name": "Bench"},
+                "text": method.text,
+            },
+            context={"bot": bot},
+        )
+
+    async def stream_content(self, url: str, headers=None, timeout: int = 30, chunk_size: int = 65536,
+                             raise_for_status: bool = True):
+        raise NotImplementedError("Files are not used in benchmarks")
+        yield b""
+
+    async def close(self) -> None:
+        for future in self._waiters.values():
+            future.cancel()
+        self._waiters.clear()
@@ -0,0 +1,16 @@
+import os
+import tempfile
+
+# The app reads its settings on import, tests never reach the real services
+_workdir = tempfile.mkdtemp(prefix="movie-tests-")
+os.environ.update({
+    "ASYNC_DB_URI": f"sqlite+aiosqlite:///{os.path.join(_workdir, 'test.db')}",
+    "DB_URI": f"sqlite:///{os.path.join(_workdir, 'test.db')}",
+    "TELEGRAM_TOKEN": "123456:test",
+    "KP_API_KEY": "test",
+    "LLM_NAME": "gpt-4o-mini",
+    "OPENAI_API_KEY": "test",
+    "TRACE_EXPORTER": "none",
+    "INDEX_DB_BACKEND": "memory",
+    "WIKI_STORE_PATH": os.path.join(_workdir, "wiki_store.sqlite3"),
+})
@@ -0,0 +1,184 @@
+import asyncio
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+from sqlalchemy import insert
+
+from app import crud
+from app.agent.nodes import autonomous_task
+from app.agent.nodes.autonomous_task import (
+    FRAGMENTS_CLOSING, FRAGMENTS_GREETING, MOVIE_BLURB_CACHE, RecommendUsersAutonomousTask,
+)
+from app.agent.recommendations.candidate_pools import CandidatePools
+from app.core.database import async_engine, async_session_factory, engine
+from app.models.base import Base
+from app.models.task_run import TaskRun, TaskRunItem, TaskRunStatus
+from app.models.user import PreferenceItem, PreferenceType, User
+from app.schemas.user import UserPreference as UserPreferenceSchema
+
+
+class FakeLLM:
+    """Отвечает reply(prompt) и запоминает промпты; ошибка в reply попадает в ответ батча как исключение"""
+
+    def __init__(self, reply):
+        self.prompts: list[str] = []
+        self._reply = reply
+
+    def __call__(self, prompt) -> str:
+        prompt = prompt.to_string()
+        self.prompts.append(prompt)
+        return self._reply(prompt)
+
+
+def make_task(llm: FakeLLM, message_mode: str) -> RecommendUsersAutonomousTask:
+    return RecommendUsersAutonomousTask(RunnableLambda(llm), message_mode=message_mode, workers=2)
+
+
+def liked(item: PreferenceItem, name: str) -> UserPreferenceSchema:
+    return UserPreferenceSchema(
+        id=1, user_id=1, kp_id=1, item_name=name, preference_item=item, preference_type=PreferenceType.LIKE
+    )
+
+
+@pytest.fixture(autouse=True)
+def empty_blurb_cache():
+    MOVIE_BLURB_CACHE.clear()
+    yield
+    MOVIE_BLURB_CACHE.clear()
+
+
+def blurb(prompt: str) -> str:
+    if "Сломанный" in prompt:
+        raise RuntimeError("LLM is down")
+    title = prompt.split("Название: ")[1].split("\n")[0]
+    return f" **«{title}»** — описание. "
+
+
+def test_fragments_are_assembled_from_blurbs_generated_once_per_movie():
+    llm = FakeLLM(blurb)
+    task = make_task(llm, "fragments")
+    selections = [
+        (["Название: Матрица\n", "Название: Дюна\n"], [liked(PreferenceItem.GENRE, "фантастика"), None]),
+        (["Название: Дюна\n"], None),
+    ]
+
+    first, second = asyncio.run(task._prepare_answers(selections))
+
+    assert first == "\n\n".join([
+        FRAGMENTS_GREETING,
+        "1. **«Матрица»** — описание.\nПодобрал, потому что ты любишь жанр «фантастика».",
+        "2. **«Дюна»** — описание.",
+        FRAGMENTS_CLOSING,
+    ])
+    assert second == "\n\n".join([FRAGMENTS_GREETING, "1. **«Дюна»** — описание.", FRAGMENTS_CLOSING])
+    assert len(llm.prompts) == 2
+
+    # Cached blurbs are reused by the next run
+    asyncio.run(task._prepare_answers(selections))
+    assert len(llm.prompts) == 2
+
+
+def test_missing_blurb_fails_only_its_users():
+    task = make_task(FakeLLM(blurb), "fragments")
+
+    ok, failed = asyncio.run(task._prepare_answers([
+        (["Название: Матрица\n"], None),
+        (["Название: Матрица\n", "Название: Сломанный\n"], None),
+    ]))
+
+    assert ok.startswith(FRAGMENTS_GREETING)
+    assert isinstance(failed, RuntimeError)
+
+
+def test_batch_mode_sends_one_prompt_per_user():
+    def answer(prompt: str) -> str:
+        if "Сломанный" in prompt:
+            raise RuntimeError("LLM is down")
+        return "ответ про " + ", ".join(line.split(": ")[1] for line in prompt.splitlines() if line.startswith("Название"))
+
+    llm = FakeLLM(answer)
+    task = make_task(llm, "batch")
+
+    answers = asyncio.run(task._prepare_answers([
+        (["Название: Матрица", "Название: Дюна"], [liked(PreferenceItem.ACTOR, "Киану Ривз"), None]),
+        (["Название: Сломанный"], None),
+        (["Название: Дюна"], None),
+    ]))
+
+    assert answers[0] == "ответ про Матрица, Дюна"
+    assert isinstance(answers[1], RuntimeError)
+    assert answers[2] == "ответ про Дюна"
+    [prompt] = [prompt for prompt in llm.prompts if "Матрица" in prompt]
+    assert "## Рекомендация 1.\n### Причина рекомендации: Пользователю нравится актёр \"Киану Ривз\".\n" in prompt
+    assert "## Рекомендация 2.\n### Информация о рекомендованном фильме:\nНазвание: Дюна\n" in prompt
+
+
+RUN_KEY = "2024-05-03T16:00"
+
+
+class FakeBot:
+    def __init__(self):
+        self.chat_ids: list[int] = []
+
+    async def send_message(self, chat_id: int, text: str) -> None:
+        self.chat_ids.append(chat_id)
+
+
+@pytest.fixture
+def tables():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def popular_pools(monkeypatch):
+    async def build_candidate_pools(client, users, **kwargs):
+        pools = CandidatePools()
+        pools.popular = pools.add_movies({"id": movie_id, "name": f"Movie {movie_id}"} for movie_id in range(1, 11))
+        return pools
+
+    monkeypatch.setattr(autonomous_task, "build_candidate_pools", build_candidate_pools)
+
+
+def test_partial_run_resumes_with_the_users_not_done(tables, popular_pools):
+    name = "RecommendUsersAutonomousTask"
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": user_id, "tg_chat_id": 100 + user_id, "full_name": f"User {user_id}"} for user_id in range(1, 5)
+        ])
+        # The previous attempt sent users 1 and 2 their messages and failed the others,
+        # an attempt of an older schedule slot was interrupted by a stopped replica
+        conn.execute(insert(TaskRun), [
+            {"id": 1, "name": name, "run_key": RUN_KEY, "status": TaskRunStatus.PARTIAL,
+             "processed": 2, "failed": 2, "attempts": 1},
+            {"id": 2, "name": name, "run_key": "2024-04-26T16:00", "status": TaskRunStatus.RUNNING,
+             "processed": 0, "failed": 0, "attempts": 1},
+        ])
+        conn.execute(insert(TaskRunItem), [{"run_id": 1, "user_id": 1}, {"run_id": 1, "user_id": 2}])
+
+    bot = FakeBot()
+    task = RecommendUsersAutonomousTask(RunnableLambda(lambda prompt: "Подборка"), mode="random", message_mode="llm")
+
+    async def scenario():
+        try:
+            async with async_session_factory() as session:
+                resumed = await task.ainvoke(session, bot, run_key=RUN_KEY)
+                sent = list(bot.chat_ids)
+                repeated = await task.ainvoke(session, bot, run_key=RUN_KEY)
+                runs = [await crud.task_run.get(session, run_id) for run_id in (1, 2)]
+                return resumed, sent, repeated, runs, await crud.task_run.get_done_user_ids(session, 1)
+        finally:
+            await async_engine.dispose()
+
+    resumed, sent, repeated, (run, stale), done_user_ids = asyncio.run(scenario())
+
+    assert resumed is True
+    assert sorted(sent) == [103, 104]
+    assert (run.status, run.attempts, run.processed, run.failed) == (TaskRunStatus.DONE, 2, 4, 0)
+    assert done_user_ids == {1, 2, 3, 4}
+    assert stale.status == TaskRunStatus.FAILED
+    # A done run is not repeated
+    assert repeated is True
+    assert sorted(bot.chat_ids) == [103, 104]
@@ -0,0 +1,156 @@
+import asyncio
+import time
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from app import crud
+from app.core.broadcast import BroadcastMessage, BroadcastSender, DeliveryStatus, FloodControl
+from app.core.rate_limit import AsyncTokenBucket
+
+
+class FakeBot:
+    """Записывает время отправок; errors[chat_id] — исключения, которые бросят следующие отправки в чат"""
+
+    def __init__(self, errors: dict[int, list[Exception]] | None = None):
+        self.sent: list[tuple[int, float]] = []
+        self._errors = errors or {}
+
+    async def send_message(self, chat_id: int, text: str) -> None:
+        errors = self._errors.get(chat_id)
+        if errors:
+            raise errors.pop(0)
+        self.sent.append((chat_id, time.monotonic()))
+
+
+def retry_after(seconds: int) -> TelegramRetryAfter:
+    return TelegramRetryAfter(SendMessage(chat_id=0, text=""), "Too Many Requests", seconds)
+
+
+def make_sender(bot: FakeBot, limits: FloodControl | None = None, rate: float = 0, **kwargs) -> BroadcastSender:
+    return BroadcastSender(
+        bot, limiter=AsyncTokenBucket("test", rate, 1.0), limits=limits or FloodControl(), **kwargs
+    )
+
+
+def test_token_bucket_allows_burst_then_rate():
+    async def scenario():
+        bucket = AsyncTokenBucket("test", rate=20, capacity=3)
+        burst = [bucket.try_acquire() for _ in range(4)]
+        start = time.monotonic()
+        for _ in range(4):
+            await bucket.acquire()
+        return burst, time.monotonic() - start
+
+    burst, elapsed = asyncio.run(scenario())
+    assert burst == [True, True, True, False]
+    assert 0.18 <= elapsed < 0.5
+
+
+def test_token_bucket_without_rate_is_unlimited():
+    bucket = AsyncTokenBucket("test", rate=0)
+    assert all(bucket.try_acquire() for _ in range(1000))
+
+
+def test_retry_after_pauses_and_retries_the_message():
+    bot = FakeBot({1: [retry_after(1)]})
+    sender = make_sender(bot)
+
+    async def scenario():
+        start = time.monotonic()
+        stats = await sender.broadcast([BroadcastMessage(1, "hi"), BroadcastMessage(2, "hi")])
+        return stats, [(chat_id, sent_at - start) for chat_id, sent_at in bot.sent]
+
+    stats, sent = asyncio.run(scenario())
+    assert (stats.delivered, stats.throttled, stats.retried, stats.failed) == (2, 1, 1, 0)
+    # The other chat waits out the pause too
+    assert sorted(chat_id for chat_id, _ in sent) == [1, 2]
+    assert all(at >= 0.9 for _, at in sent)
+
+
+def test_retry_after_pauses_other_senders_sharing_the_limits():
+    limits = FloodControl()
+    throttled = make_sender(FakeBot({1: [retry_after(1)]}), limits, max_retries=0)
+    other_bot = FakeBot()
+    other = make_sender(other_bot, limits)
+
+    async def scenario():
+        start = time.monotonic()
+        assert await throttled.send(1, "hi") == DeliveryStatus.FAILED
+        assert await other.send(2, "hi") == DeliveryStatus.DELIVERED
+        return other_bot.sent[0][1] - start
+
+    assert asyncio.run(scenario()) >= 0.9
+
+
+def test_messages_to_one_chat_are_spaced():
+    bot = FakeBot()
+    sender = make_sender(bot, per_chat_interval=0.1)
+
+    async def scenario():
+        return await sender.broadcast([BroadcastMessage(1, str(i)) for i in range(3)] + [BroadcastMessage(2, "hi")])
+
+    stats = asyncio.run(scenario())
+    assert stats.delivered == 4
+    chat_times = [sent_at for chat_id, sent_at in bot.sent if chat_id == 1]
+    assert all(later - earlier >= 0.09 for earlier, later in zip(chat_times, chat_times[1:]))
+    # Other chats are not held back by the spacing
+    assert dict(bot.sent)[2] < chat_times[1]
+
+
+def test_chat_spacing_outlives_the_interval():
+    limits = FloodControl()
+    first = limits.reserve_chat(1, interval=0.05)
+    # Three messages reserved at once must still be an interval apart each
+    second = limits.reserve_chat(1, interval=0.05)
+    third = limits.reserve_chat(1, interval=0.05)
+    assert second - first == pytest.approx(0.05, abs=0.01)
+    assert third - first == pytest.approx(0.1, abs=0.01)
+
+
+def test_blocked_chats_are_deactivated(monkeypatch):
+    deactivated = []
+
+    async def set_active_by_tg_chat_id(session, chat_id, is_active):
+        deactivated.append((chat_id, is_active))
+
+    monkeypatch.setattr(crud.user, "set_active_by_tg_chat_id", set_active_by_tg_chat_id)
+    bot = FakeBot({1: [TelegramForbiddenError(SendMessage(chat_id=1, text=""), "bot was blocked by the user")]})
+    results = []
+
+    async def on_result(message, status):
+        results.append((message.chat_id, status))
+
+    stats = asyncio.run(make_sender(bot).broadcast([BroadcastMessage(1, "hi"), BroadcastMessage(2, "hi")], on_result))
+
+    assert (stats.delivered, stats.blocked) == (1, 1)
+    assert sorted(results) == [(1, DeliveryStatus.BLOCKED), (2, DeliveryStatus.DELIVERED)]
+    assert deactivated == [(1, False)]
+
+
+def test_failing_callback_and_limiter_do_not_hang_the_broadcast():
+    class FlakyBucket(AsyncTokenBucket):
+        async def acquire(self) -> None:
+            self.calls = getattr(self, "calls", 0) + 1
+            if self.calls == 2:
+                raise RuntimeError("limiter is broken")
+            await super().acquire()
+
+    bot = FakeBot()
+    sender = BroadcastSender(bot, limiter=FlakyBucket("test", 0), limits=FloodControl(), per_chat_interval=0)
+    results = []
+
+    async def on_result(message, status):
+        results.append((message.chat_id, status))
+        raise RuntimeError("callback is broken")
+
+    async def scenario():
+        messages = [BroadcastMessage(chat_id, "hi") for chat_id in range(1, 5)]
+        return await asyncio.wait_for(sender.broadcast(messages, on_result, workers=2), timeout=5)
+
+    stats = asyncio.run(scenario())
+
+    assert (stats.delivered, stats.failed) == (3, 1)
+    assert len(results) == 4
+    assert [status for _, status in results].count(DeliveryStatus.FAILED) == 1
@@ -0,0 +1,169 @@
+import asyncio
+import itertools
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from app.agent.nodes import kp_utils
+from app.agent.nodes.autonomous_task import RecommendUsersAutonomousTask
+from app.agent.recommendations.candidate_pools import SIMILAR_MOVIES_CACHE, CandidatePools, build_candidate_pools
+from app.models.user import PreferenceItem, PreferenceType
+from app.schemas.user import User as UserSchema, UserPreference as UserPreferenceSchema
+
+
+_ids = itertools.count(1)
+
+
+class FakeKpClient:
+    """
+    Фильмы жанра «драма» — 1-5, актёра 100 — 6-8, популярные — 9-10, похожие на фильм N — 1000N+1 ... 1000N+20.
+    Запросы записываются в requests, failing — ключи запросов, на которые API не отвечает.
+    """
+
+    def __init__(self, failing: set[str] = frozenset()):
+        self.requests: list[tuple[str, object]] = []
+        self._failing = failing
+
+    async def get(self, url: str, params: dict | None = None) -> dict | None:
+        params = params or {}
+        if url.startswith(kp_utils.MOVIE_SEARCH_URL + "/"):
+            key, value = "similar", int(url.rsplit("/", 1)[1])
+        else:
+            key = next(key for key in ("genres.name", "persons.id", "lists", "id") if key in params)
+            value = params[key]
+        self.requests.append((key, value))
+        if key in self._failing:
+            raise kp_utils.KpApiError(f"{key} is down")
+
+        if key == "similar":
+            return {"similarMovies": [{"id": value * 1000 + i} for i in range(1, 21)]}
+        ids = {"genres.name": range(1, 6), "persons.id": range(6, 9), "lists": range(9, 11), "id": value}[key]
+        return {"docs": [{"id": movie_id, "name": f"Movie {movie_id}"} for movie_id in ids]}
+
+    def count(self, key: str) -> int:
+        return sum(1 for request_key, _ in self.requests if request_key == key)
+
+
+@pytest.fixture(autouse=True)
+def empty_similar_cache():
+    SIMILAR_MOVIES_CACHE.clear()
+    yield
+    SIMILAR_MOVIES_CACHE.clear()
+
+
+def pref(item: PreferenceItem, kp_id: int = 0, name: str = "", like: bool = True) -> UserPreferenceSchema:
+    return UserPreferenceSchema(
+        id=next(_ids),
+        user_id=0,
+        kp_id=kp_id,
+        item_name=name,
+        preference_item=item,
+        preference_type=PreferenceType.LIKE if like else PreferenceType.DISLIKE,
+    )
+
+
+def user(user_id: int, *prefs: UserPreferenceSchema) -> UserSchema:
+    return UserSchema(
+        id=user_id,
+        tg_chat_id=user_id,
+        full_name=f"User {user_id}",
+        is_active=True,
+        is_superuser=False,
+        created_at="2024-01-01T00:00:00",
+        messages=[],
+        preferences=list(prefs),
+    )
+
+
+USERS = [
+    user(1, pref(PreferenceItem.GENRE, name="Драма"), pref(PreferenceItem.MOVIE, kp_id=1)),
+    user(2, pref(PreferenceItem.GENRE, name="драма"), pref(PreferenceItem.ACTOR, kp_id=100),
+         pref(PreferenceItem.MOVIE, kp_id=2)),
+    user(3, pref(PreferenceItem.MOVIE, kp_id=2), pref(PreferenceItem.GENRE, name="ужасы", like=False)),
+]
+
+
+def test_users_sharing_a_preference_share_its_request():
+    client = FakeKpClient()
+
+    pools = asyncio.run(build_candidate_pools(client, USERS, load_similar=False))
+
+    assert (client.count("genres.name"), client.count("persons.id"), client.count("lists")) == (1, 1, 1)
+    assert sorted(value for key, value in client.requests if key == "similar") == [1, 2]
+    # Similar movies are known by id only, nothing else is fetched
+    assert client.count("id") == 0
+    assert list(pools.by_genre["драма"]) == [1, 2, 3, 4, 5]
+    assert list(pools.by_movie[2]) == list(range(2001, 2021))
+    assert sorted(pools.movies) == list(range(1, 11))
+
+
+def test_engine_pools_load_every_similar_movie_in_batches():
+    client = FakeKpClient()
+
+    pools = asyncio.run(build_candidate_pools(client, USERS))
+
+    [batch] = [value for key, value in client.requests if key == "id"]
+    assert batch == sorted([*range(1001, 1021), *range(2001, 2021)])
+    assert set(pools.movies) >= set(batch)
+
+
+def test_random_picks_fetch_only_the_picked_movies():
+    client = FakeKpClient()
+    task = RecommendUsersAutonomousTask(RunnableLambda(lambda prompt: ""), limit=3, mode="random")
+
+    async def scenario():
+        pools = await build_candidate_pools(client, USERS, load_similar=False)
+        recommendations = {u.id: task._pick_random(pools, u) for u in USERS}
+        await task._load_picked_movies(client, pools, recommendations)
+        return pools, recommendations
+
+    pools, recommendations = asyncio.run(scenario())
+
+    picked_similar = sorted(rec.movie_id for recs in recommendations.values() for rec in recs if rec.movie_id > 1000)
+    [batch] = [value for key, value in client.requests if key == "id"]
+    assert batch == picked_similar
+    for u in USERS:
+        movies, source_prefs = task._select_recommendations(pools, u, recommendations[u.id])
+        assert len(movies) == 3
+        assert all(p.preference_type == PreferenceType.LIKE for p in source_prefs)
+
+
+def test_users_of_an_unavailable_pool_are_failed_not_given_popular_movies():
+    client = FakeKpClient(failing={"genres.name"})
+    pools = asyncio.run(build_candidate_pools(client, USERS, load_similar=False))
+
+    assert pools.unavailable == {("genre", "драма")}
+    with pytest.raises(kp_utils.KpApiError):
+        pools.require(USERS[0].preferences)
+    pools.require(USERS[2].preferences)
+
+
+def test_failed_load_of_picked_movies_fails_their_users():
+    client = FakeKpClient(failing={"id"})
+    task = RecommendUsersAutonomousTask(RunnableLambda(lambda prompt: ""), mode="random")
+    only_movie = user(4, pref(PreferenceItem.MOVIE, kp_id=1))
+
+    async def scenario():
+        pools = await build_candidate_pools(client, [only_movie], load_similar=False)
+        recommendations = {only_movie.id: task._pick_random(pools, only_movie)}
+        await task._load_picked_movies(client, pools, recommendations)
+        return pools, recommendations
+
+    pools, recommendations = asyncio.run(scenario())
+
+    with pytest.raises(kp_utils.KpApiError):
+        task._select_recommendations(pools, only_movie, recommendations[only_movie.id])
+
+
+def test_personalized_selection_skips_watched_and_unloaded_movies():
+    pools = CandidatePools()
+    pools.by_genre["драма"] = pools.add_movies({"id": movie_id, "name": str(movie_id)} for movie_id in (1, 2, 3))
+    pools.by_movie[10] = pools.add_movies([{"id": 11, "name": "11"}])
+    pools.by_movie[10].append(12)  # known by id only
+    prefs = [pref(PreferenceItem.GENRE, name="драма"), pref(PreferenceItem.MOVIE, kp_id=10)]
+
+    movie_ids, _ = pools.select_personalized(prefs, watched_movies=[1, 10], limit=10)
+    assert sorted(movie_ids) == [2, 3, 11]
+
+    movie_ids, _ = pools.select_personalized(prefs, watched_movies=[1, 10], limit=10, loaded_only=False)
+    assert sorted(movie_ids) == [2, 3, 11, 12]
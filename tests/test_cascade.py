@@ -0,0 +1,83 @@
+import pytest
+from langchain_core.exceptions import OutputParserException
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage
+
+from app.agent.llms.cascade import CASCADE_ESCALATIONS
+from app.agent.llms.llm_factory import LLMFactory
+from app.agent.llms.usage import LLM_REQUESTS, LLM_TOKENS
+from app.agent.nodes.people_search_by_name import PeopleSearchByName
+from app.core.config import settings
+
+
+SMALL, LARGE = "gpt-4o-mini", "gpt-4o"
+
+
+def reply(content: str, output_tokens: int) -> AIMessage:
+    return AIMessage(
+        content=content,
+        usage_metadata={"input_tokens": 100, "output_tokens": output_tokens, "total_tokens": 100 + output_tokens},
+    )
+
+
+@pytest.fixture
+def models(monkeypatch):
+    """Фейковые модели вместо SMALL и LARGE; модели ролей создаются заново с колбэком метрик"""
+    def install(small: list[AIMessage], large: list[AIMessage]) -> None:
+        monkeypatch.setattr(LLMFactory, "_initialized_models", {
+            SMALL: FakeMessagesListChatModel(responses=small),
+            LARGE: FakeMessagesListChatModel(responses=large),
+        })
+
+    monkeypatch.setattr(LLMFactory, "_role_models", {})
+    monkeypatch.setattr(settings, "LLM_PARAMS", SMALL)
+    monkeypatch.setattr(settings, "LLM_CASCADE_MODEL", LARGE)
+    return install
+
+
+def params_chain():
+    tool = PeopleSearchByName(
+        LLMFactory.get_role_llm("tool_answer"),
+        api_llm=LLMFactory.get_role_llm("params"),
+        api_fallback_llm=LLMFactory.get_fallback_llm("params"),
+    )
+    return tool._chain
+
+
+def usage(model: str) -> tuple[float, float]:
+    return (
+        LLM_REQUESTS.value(role="params", model=model, status="ok"),
+        LLM_TOKENS.value(role="params", model=model, direction="output"),
+    )
+
+
+def test_invalid_params_are_retried_on_the_large_model(models):
+    models(small=[reply('{"names": "Нолан"}', 7)], large=[reply('{"query": "Кристофер Нолан"}', 9)])
+    before = {model: usage(model) for model in (SMALL, LARGE)}
+    escalations = CASCADE_ESCALATIONS.value(role="params")
+
+    params = params_chain().invoke({"question": "Кто такой Нолан?", "collected_info": ""})
+
+    assert params == {"query": "Кристофер Нолан"}
+    assert CASCADE_ESCALATIONS.value(role="params") == escalations + 1
+    # Both calls are billed to the params role, each to its own model
+    assert usage(SMALL) == (before[SMALL][0] + 1, before[SMALL][1] + 7)
+    assert usage(LARGE) == (before[LARGE][0] + 1, before[LARGE][1] + 9)
+
+
+def test_valid_params_do_not_reach_the_large_model(models):
+    models(small=[reply('{"query": ["Нолан", "Мерфи"]}', 8)], large=[])
+    before = usage(LARGE)
+    escalations = CASCADE_ESCALATIONS.value(role="params")
+
+    assert params_chain().invoke({"question": "Нолан и Мерфи", "collected_info": ""}) == {"query": ["Нолан", "Мерфи"]}
+    assert CASCADE_ESCALATIONS.value(role="params") == escalations
+    assert usage(LARGE) == before
+
+
+def test_without_a_cascade_model_the_validation_error_is_raised(models, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CASCADE_MODEL", "")
+    models(small=[reply('{"query": ""}', 4)], large=[])
+
+    with pytest.raises(OutputParserException):
+        params_chain().invoke({"question": "Кто это?", "collected_info": ""})
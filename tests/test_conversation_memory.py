@@ -0,0 +1,128 @@
+import asyncio
+import datetime
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+from sqlalchemy import insert
+
+from app import crud
+from app.agent.memory import ConversationMemory
+from app.agent.nodes import conversation_summary
+from app.agent.nodes.conversation_summary import ConversationSummarizer
+from app.core.database import async_engine, async_session_factory, engine
+from app.models.base import Base
+from app.models.message import Message, MessageType
+from app.models.user import User
+from app.schemas.message import Message as MessageSchema
+
+
+NOW = datetime.datetime(2024, 5, 3, 16, 0)
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    # One token per word, whatever tokenizer is available
+    monkeypatch.setattr(conversation_summary, "count_tokens", lambda text: len(text.split()))
+
+
+@pytest.fixture
+def tables():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield
+    Base.metadata.drop_all(engine)
+
+
+class RecordingSummarizer(ConversationSummarizer):
+    """Краткое содержание — id свёрнутых сообщений через запятую"""
+
+    def __init__(self, window_tokens: int):
+        super().__init__(FakeListChatModel(responses=[""]), window_tokens=window_tokens)
+        self.folds: list[list[int]] = []
+
+    async def aupdate(self, summary, messages):
+        self.folds.append([message.id for message in messages])
+        return ",".join(filter(None, [summary, *(str(message.id) for message in messages)]))
+
+
+def message(message_id: int, words: int = 1) -> MessageSchema:
+    return MessageSchema(
+        id=message_id, user_id=1, message_type=MessageType.HUMAN, content=" ".join(["word"] * words), created_at=NOW
+    )
+
+
+def add_messages(user_id: int, count: int) -> None:
+    with engine.begin() as conn:
+        conn.execute(insert(User).values(id=user_id, tg_chat_id=user_id, full_name=f"User {user_id}"))
+        conn.execute(insert(Message), [
+            {
+                "user_id": user_id,
+                "message_type": MessageType.HUMAN,
+                "content": f"message {i}",
+                "created_at": NOW + datetime.timedelta(minutes=i),
+            }
+            for i in range(count)
+        ])
+
+
+def run(coroutine_function):
+    async def scenario():
+        try:
+            return await coroutine_function()
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(scenario())
+
+
+def test_split_keeps_the_last_messages_that_fit_in_the_window():
+    summarizer = RecordingSummarizer(window_tokens=6)  # "user: word" is 2 tokens
+
+    folded, window = summarizer.split([message(i) for i in range(1, 6)])
+
+    assert [m.id for m in folded] == [1, 2]
+    assert [m.id for m in window] == [3, 4, 5]
+
+
+def test_split_keeps_min_recent_messages_over_the_budget():
+    summarizer = RecordingSummarizer(window_tokens=6)
+    messages = [message(1), message(2, words=10), message(3, words=10)]
+
+    assert [m.id for m in summarizer.split(messages)[1]] == [3]
+    assert [m.id for m in summarizer.split(messages, min_recent=2)[1]] == [2, 3]
+    assert summarizer.split([]) == ([], [])
+
+
+def test_stale_summary_does_not_overwrite_a_newer_one(tables):
+    add_messages(1, 1)
+
+    async def scenario():
+        async with async_session_factory() as session:
+            saved = [
+                await crud.conversation_summary.save(session, 1, "up to 10", 10),
+                await crud.conversation_summary.save(session, 1, "up to 5", 5),
+                await crud.conversation_summary.save(session, 1, "up to 10 again", 10),
+                await crud.conversation_summary.save(session, 1, "up to 12", 12),
+            ]
+            return saved, await crud.conversation_summary.get_by_user_id(session, 1)
+
+    saved, summary = run(scenario)
+    assert saved == [True, False, False, True]
+    assert (summary.content, summary.last_message_id) == ("up to 12", 12)
+
+
+def test_messages_beyond_one_read_are_folded_oldest_first(tables):
+    add_messages(1, 12)
+    summarizer = RecordingSummarizer(window_tokens=6)  # "human: message N" is 3 tokens, the window holds 2
+    memory = ConversationMemory(summarizer, max_messages=5)
+
+    async def scenario():
+        await memory._update(1)
+        async with async_session_factory() as session:
+            return await memory.load(session, 1)
+
+    summary, window = run(scenario)
+    # Messages 1-7 are older than the last five read, they are folded page by page without gaps
+    assert summarizer.folds == [[1, 2, 3, 4, 5], [6, 7], [8, 9, 10]]
+    assert summary == ",".join(str(i) for i in range(1, 11))
+    assert [m.id for m in window] == [11, 12]
@@ -0,0 +1,64 @@
+from app.core.metrics import MetricsRegistry
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    counter = registry.counter("tool_calls_total", "Tool calls", ("tool",))
+    counter.inc(tool='say "hi"\\\nbye')
+
+    assert 'tool_calls_total{tool="say \\"hi\\"\\\\\\nbye"} 1' in registry.render().splitlines()
+
+
+def test_help_is_escaped():
+    registry = MetricsRegistry()
+    registry.gauge("queue_size", "Line one\nline two \\ end")
+
+    assert "# HELP queue_size Line one\\nline two \\\\ end" in registry.render().splitlines()
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", ("node",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, node="planner")
+
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{node="planner",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{node="planner",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{node="planner",le="+Inf"} 3' in lines
+    assert histogram.count(node="planner") == 3
+
+
+def record_in_worker() -> list[tuple]:
+    from app.core.metrics import registry
+
+    registry.counter("worker_tool_calls_total", "Tool calls", ("tool",)).inc(2, tool="MoviesSearch")
+    registry.histogram("worker_node_seconds", "Node latency", ("node",), buckets=(0.1, 1.0)).observe(0.5, node="planner")
+    return registry.drain()
+
+
+def test_worker_metrics_are_merged_into_the_parent_registry():
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        deltas = [pool.submit(record_in_worker).result() for _ in range(2)]
+
+    registry = MetricsRegistry()
+    for delta in deltas:
+        registry.merge(delta)
+
+    lines = registry.render().splitlines()
+    assert 'worker_tool_calls_total{tool="MoviesSearch"} 4' in lines
+    assert 'worker_node_seconds_bucket{node="planner",le="0.1"} 0' in lines
+    assert 'worker_node_seconds_count{node="planner"} 2' in lines
+
+
+def test_drain_resets_counters_and_histograms():
+    registry = MetricsRegistry()
+    registry.counter("calls_total", "Calls").inc()
+    registry.histogram("latency_seconds", "Latency").observe(1.0)
+    registry.gauge("pool_size", "Pool size").set(3)
+
+    assert {name for _, name, *_ in registry.drain()} == {"calls_total", "latency_seconds"}
+    assert registry.drain() == []
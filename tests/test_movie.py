@@ -0,0 +1,76 @@
+import pytest
+
+from app.agent.nodes import kp_utils, movie_semantic_search
+from app.agent.nodes.movie import Movie
+from app.agent.nodes.movie_semantic_search import MovieSemanticSearch
+from app.core.vector_index import InMemoryCollection
+
+
+GREEN_MILE = Movie(id=435, name="Зелёная миля", year=1999, genres=("драма", "фэнтези"), rating_kp=9.1)
+
+# A Kinopoisk document with missing, null and zero fields
+SERIES_JSON = {
+    "id": 464963,
+    "name": None,
+    "enName": "Game of Thrones",
+    "alternativeName": "Game of Thrones",
+    "year": 2011,
+    "type": "tv-series",
+    "isSeries": True,
+    "countries": [{"name": "США"}, {"name": "Великобритания"}],
+    "genres": [],
+    "seriesLength": 55,
+    "totalSeriesLength": None,
+    "ratingMpaa": "",
+    "description": "К концу подходит время благоденствия.",
+    "rating": {"kp": 9.0, "imdb": 9.2, "filmCritics": 0, "russianFilmCritics": 0, "await": None},
+    "votes": {"kp": 912000, "imdb": 2300000},
+}
+
+
+def test_movie_from_kp_skips_missing_fields():
+    movie = Movie.from_kp(SERIES_JSON)
+
+    assert (movie.name, movie.en_name, movie.genres, movie.mpaa) == ("Game of Thrones", "Game of Thrones", (), None)
+    assert (movie.rating_critics, movie.rating_await, movie.votes_critics, movie.total_series_length) == (None,) * 4
+    assert kp_utils.transform_movie_data(SERIES_JSON) == movie.render() == "\n".join([
+        "Title: Game of Thrones (Game of Thrones, 2011)",
+        "Type: tv-series | Country: США, Великобритания | Episode: 55 min",
+        "Ratings: Kinopoisk 9 (912000 votes), IMDb 9.2 (2300000 votes)",
+        "Description: К концу подходит время благоденствия.",
+    ])
+    assert Movie.from_kp({"id": 1}).render() == "Title: Unknown Title"
+
+
+@pytest.mark.parametrize("movie", [Movie.from_kp(SERIES_JSON), GREEN_MILE, Movie(id=1, name="Без данных")], ids=["series", "film", "empty"])
+def test_movie_survives_a_chroma_round_trip(movie):
+    metadata = movie.to_chroma()
+
+    assert all(isinstance(value, (str, int, float, bool)) for value in metadata.values())
+    restored = Movie.from_chroma(metadata)
+    assert restored == movie
+    assert restored.render() == movie.render()
+    assert restored.render_short() == movie.render_short()
+
+
+@pytest.fixture
+def index(monkeypatch) -> InMemoryCollection:
+    index = InMemoryCollection(embedding_function=lambda texts: [[1.0, 0.0] for _ in texts])
+    monkeypatch.setattr(movie_semantic_search, "collection", index)
+    return index
+
+
+def test_semantic_search_answer_mode_comes_from_settings(index):
+    index.upsert(ids=["435"], metadatas=[GREEN_MILE.to_chroma()], embeddings=[[1.0, 0.0]])
+    question = "Фильм про заключённого с даром исцеления"
+
+    raw = MovieSemanticSearch()
+    llm = MovieSemanticSearch(answer_mode="llm")
+
+    assert raw._answer_mode == "raw"
+    assert raw.invoke(question, "") == f"MovieSemanticSearch — {question}\n{GREEN_MILE.render()}"
+    assert llm.invoke(question, "") == GREEN_MILE.render()
+
+
+def test_semantic_search_in_an_empty_index(index):
+    assert MovieSemanticSearch().invoke("Фильм про заключённого", "").startswith("К сожалению")
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from app.agent.graph import AgentState
+from app.agent.nodes.planner_node import PLANNER_PARSE_FAILURES, AgentTaskList, PlannerNode, parse_plan
+
+
+def plan_json(*tasks: tuple[str, str]) -> str:
+    return json.dumps({"tasks": [{"agent": agent, "question": question} for agent, question in tasks]}, ensure_ascii=False)
+
+
+class FakePlannerLLM(FakeListChatModel):
+    """
+    Structured output отвечает по очереди из structured_responses (None — ответ не разобран по схеме),
+    обычные вызовы, то есть исправление плана, — из responses.
+    """
+    structured_responses: list[str | None] = []
+
+    def with_structured_output(self, schema, **kwargs):
+        responses = iter(self.structured_responses)
+
+        def respond(prompt) -> dict:
+            content = next(responses)
+            parsed = schema.model_validate_json(content) if content is not None else None
+            return {"raw": AIMessage(content=content or "не план"), "parsed": parsed}
+
+        return RunnableLambda(respond)
+
+
+def plan(planner: PlannerNode, question: str = "Женат ли Киллиан Мерфи?") -> AgentTaskList:
+    state = planner.invoke(AgentState(history=[HumanMessage(question)], user_id=0, user_preferences=[]))
+    return AgentTaskList.model_validate(state.history[-1].response_metadata)
+
+
+def test_parse_plan_takes_the_first_valid_candidate():
+    fenced = f"Рассуждение.\n```json\n{plan_json(('MoviesSearch', 'Матрица'))}\n```"
+    assert parse_plan(fenced).tasks[0].question == "Матрица"
+
+    bare = "План: " + plan_json(("PeopleSearchByName", "Нолан")) + " — готово"
+    assert parse_plan(bare).tasks[0].agent == "PeopleSearchByName"
+
+    # A block that doesn't match the schema is skipped for the object after it
+    skipped = '```json\n{"steps": []}\n```\n' + plan_json(("MoviesSearch", "Дюна"))
+    assert parse_plan(skipped).tasks[0].question == "Дюна"
+
+
+@pytest.mark.parametrize("response", ["", "Агенты не нужны", "```json\n{\"tasks\": [\n```", '{"tasks": [{"agent": "MoviesSearch"}]}'])
+def test_malformed_plan_is_not_parsed(response):
+    assert parse_plan(response) is None
+
+
+def test_valid_structured_plan_is_not_repaired():
+    llm = FakePlannerLLM(responses=[], structured_responses=[plan_json(("PeopleSearchByName", "Женат ли Киллиан Мерфи?"))])
+
+    tasks = plan(PlannerNode(llm, mode="structured", reasoning=False)).tasks
+
+    assert [(task.agent, task.question) for task in tasks] == [("PeopleSearchByName", "Женат ли Киллиан Мерфи?")]
+
+
+def test_structured_plan_with_unknown_agents_is_repaired_to_known_ones():
+    llm = FakePlannerLLM(
+        structured_responses=[plan_json(("WebSearch", "Киллиан Мерфи"), ("PeopleSearchByName", "Киллиан Мерфи"))],
+        responses=["```json\n" + plan_json(("WebSearch", "Киллиан Мерфи"), ("PeopleSearchByName", "Киллиан Мерфи")) + "\n```"],
+    )
+    repaired_before = PLANNER_PARSE_FAILURES.value(mode="structured", repaired="true")
+
+    tasks = plan(PlannerNode(llm, mode="structured", reasoning=False)).tasks
+
+    assert [task.agent for task in tasks] == ["PeopleSearchByName"]
+    assert PLANNER_PARSE_FAILURES.value(mode="structured", repaired="true") == repaired_before + 1
+
+
+def test_unrepairable_plan_continues_without_agents():
+    llm = FakePlannerLLM(structured_responses=[None], responses=["Не могу исправить"])
+    failed_before = PLANNER_PARSE_FAILURES.value(mode="structured", repaired="false")
+
+    assert plan(PlannerNode(llm, mode="structured", reasoning=True)).tasks == []
+    assert PLANNER_PARSE_FAILURES.value(mode="structured", repaired="false") == failed_before + 1
+
+
+def test_malformed_text_plan_is_repaired():
+    llm = FakeListChatModel(responses=[
+        "Нужен поиск фильма.\n```json\n{\"tasks\": [{\"agent\": \"MoviesSearch\", \"question\": \"Дюна\"\n```",
+        plan_json(("MoviesSearch", "Дюна")),
+    ])
+
+    tasks = plan(PlannerNode(llm, mode="text"), "Расскажи о Дюне").tasks
+
+    assert [(task.agent, task.question) for task in tasks] == [("MoviesSearch", "Дюна")]
@@ -0,0 +1,93 @@
+import pytest
+
+from app.agent.nodes import prompt_budget
+from app.agent.nodes.prompt_budget import PROMPT_TRUNCATED_TOKENS, PromptBudget, PromptSection
+
+
+@pytest.fixture(autouse=True)
+def approximate_tokens(monkeypatch):
+    # Without tiktoken a token is 3 characters, "\n" and "\n\n" are one token each
+    monkeypatch.setattr(prompt_budget, "_encoding", False)
+
+
+def text(tokens: int, char: str = "a") -> str:
+    return char * (3 * tokens)
+
+
+def lines(count: int, tokens: int = 9) -> list[str]:
+    return [str(i) + text(tokens, str(i))[1:] for i in range(count)]
+
+
+def test_sections_that_fit_are_not_changed():
+    sections = [PromptSection("a", [text(10)]), PromptSection("b", lines(3), shrink="drop")]
+
+    prompt = PromptBudget("test", 100).fit(sections, fixed=text(10))
+
+    assert prompt == {"a": text(10), "b": "\n\n".join(lines(3))}
+    assert [section.tokens for section in sections] == [10, 29]
+
+
+def test_lower_priority_is_cut_first_down_to_min_tokens():
+    sections = [
+        PromptSection("important", [text(40, "i")], priority=1),
+        PromptSection("extra", [text(40, "e")], priority=0, min_tokens=20),
+    ]
+
+    PromptBudget("test", 80).fit(sections, fixed=text(10))
+    # 10 tokens over the budget are taken from the less valuable section only,
+    # the "…" marker may round the cut down by a token
+    important, extra = sections
+    assert important.tokens == 40 and 28 <= extra.tokens <= 30
+
+    sections = [
+        PromptSection("important", [text(40, "i")], priority=1),
+        PromptSection("extra", [text(40, "e")], priority=0, min_tokens=20),
+    ]
+    PromptBudget("test", 60).fit(sections, fixed=text(10))
+    # The rest of the overflow goes to the next priority once min_tokens is reached
+    important, extra = sections
+    assert 28 <= important.tokens <= 30 and 18 <= extra.tokens <= 20
+
+
+def test_drop_removes_items_from_the_end_or_with_keep_tail_from_the_start():
+    head = PromptSection("info", lines(5), shrink="drop", separator="\n")
+    tail = PromptSection("history", lines(5), shrink="drop", keep="tail", separator="\n")
+
+    kept_head = PromptBudget("test", 35).fit([head])["info"].split("\n")
+    kept_tail = PromptBudget("test", 35).fit([tail])["history"].split("\n")
+
+    # The whole items kept are the first ones, the edge item is cut rather than dropped
+    assert kept_head[:3] == lines(5)[:3] and kept_head[3].startswith("3") and kept_head[3].endswith(" …")
+    assert kept_tail[1:] == lines(5)[2:] and kept_tail[0].startswith("… ") and kept_tail[0].endswith("1")
+    assert head.tokens <= 35 and tail.tokens <= 35
+
+
+def test_even_keeps_short_items_and_cuts_long_ones_to_an_equal_share():
+    reviews = PromptSection("reviews", [text(5, "s"), text(40, "l"), text(60, "m")], shrink="even", separator="\n")
+
+    PromptBudget("test", 60).fit([reviews])
+
+    short, long, longest = reviews.items
+    assert short == text(5, "s")
+    assert len(long) == len(longest) and long.startswith("lll") and longest.startswith("mmm")
+    assert reviews.tokens <= 60
+
+
+def test_preferences_are_never_cut():
+    before = PROMPT_TRUNCATED_TOKENS.value(prompt="executor", section="preferences")
+    sections = [
+        PromptSection("history", lines(10), priority=0, min_tokens=20, shrink="drop", keep="tail", separator="\n"),
+        PromptSection("summary", [text(30, "s")], priority=1),
+        PromptSection("tools", [text(30, "t"), text(30, "u")], priority=1, min_tokens=20, shrink="even", separator="\n"),
+        PromptSection("preferences", [text(50, "p")], priority=2, shrink="none"),
+    ]
+
+    prompt = PromptBudget("executor", 60).fit(sections, fixed=text(10))
+
+    # History is cut first, then the summary and the tools; the prompt is over the budget
+    # rather than without the preferences
+    history, summary, tools, _ = sections
+    assert history.tokens <= 20 and summary.tokens == 0 and tools.tokens <= 20
+    assert history.text.endswith(lines(10)[-1]) and tools.items[0].startswith("ttt") and tools.items[1].startswith("uuu")
+    assert prompt["preferences"] == text(50, "p")
+    assert PROMPT_TRUNCATED_TOKENS.value(prompt="executor", section="preferences") == before
@@ -0,0 +1,133 @@
+import datetime
+import itertools
+from array import array
+
+from app.agent.recommendations.candidate_pools import CandidatePools
+from app.agent.recommendations.engine import RecommenderEngine
+from app.models.user import PreferenceItem, PreferenceType
+from app.schemas.user import User as UserSchema, UserPreference as UserPreferenceSchema
+
+
+_ids = itertools.count(1)
+
+
+def make_pools(movies: dict[int, tuple[str, ...]], rating: float = 7.0, votes: int = 1000) -> CandidatePools:
+    pools = CandidatePools()
+    pools.add_movies(
+        {
+            "id": movie_id,
+            "name": f"Movie {movie_id}",
+            "genres": [{"name": genre} for genre in genres],
+            "rating": {"kp": rating},
+            "votes": {"kp": votes},
+        }
+        for movie_id, genres in movies.items()
+    )
+    return pools
+
+
+def pref(item: PreferenceItem, kp_id: int = 0, name: str = "", like: bool = True) -> UserPreferenceSchema:
+    return UserPreferenceSchema(
+        id=next(_ids),
+        user_id=0,
+        kp_id=kp_id,
+        item_name=name,
+        preference_item=item,
+        preference_type=PreferenceType.LIKE if like else PreferenceType.DISLIKE,
+    )
+
+
+def user(user_id: int, *prefs: UserPreferenceSchema) -> UserSchema:
+    return UserSchema(
+        id=user_id,
+        tg_chat_id=user_id,
+        full_name=f"User {user_id}",
+        is_active=True,
+        is_superuser=False,
+        created_at=datetime.datetime(2024, 1, 1),
+        messages=[],
+        preferences=list(prefs),
+    )
+
+
+def recommended_ids(pools: CandidatePools, users: list[UserSchema], k: int = 10, **kwargs) -> dict[int, list[int]]:
+    recommendations = RecommenderEngine(pools, **kwargs).fit(users).recommend(k)
+    return {user_id: [rec.movie_id for rec in recs] for user_id, recs in recommendations.items()}
+
+
+def test_matching_features_rank_above_popularity():
+    pools = make_pools({1: ("драма",), 2: ("комедия",), 3: ("комедия",)})
+    pools.by_person[100] = array("q", [3])
+    users = [user(1, pref(PreferenceItem.GENRE, name="Комедия"), pref(PreferenceItem.ACTOR, kp_id=100))]
+
+    assert recommended_ids(pools, users)[1] == [3, 2, 1]
+
+
+def test_similar_movie_outweighs_genre_and_is_the_source():
+    pools = make_pools({1: ("драма",), 2: ("драма",), 10: ("комедия",)})
+    pools.by_movie[10] = array("q", [1])
+    liked_movie = pref(PreferenceItem.MOVIE, kp_id=10)
+    users = [user(1, pref(PreferenceItem.GENRE, name="драма"), liked_movie)]
+
+    [first, second] = RecommenderEngine(pools).fit(users).recommend(2)[1]
+
+    assert (first.movie_id, first.source_pref) == (1, liked_movie)
+    assert second.movie_id == 2
+    assert second.source_pref.item_name == "драма"
+    assert first.score > second.score
+
+
+def test_rated_movies_are_never_recommended():
+    pools = make_pools({1: ("драма",), 2: ("драма",), 3: ("драма",)})
+    users = [user(1, pref(PreferenceItem.MOVIE, kp_id=1), pref(PreferenceItem.MOVIE, kp_id=3, like=False))]
+
+    assert recommended_ids(pools, users)[1] == [2]
+
+
+def test_disliked_genre_is_a_penalty_not_a_mask():
+    pools = make_pools({1: ("ужасы",), 2: ("ужасы", "комедия"), 3: ("драма",)})
+    pools.by_person[100] = array("q", [2])
+    users = [user(1, pref(PreferenceItem.GENRE, name="ужасы", like=False), pref(PreferenceItem.ACTOR, kp_id=100))]
+
+    # A liked actor outweighs the disliked genre, popularity alone does not
+    assert recommended_ids(pools, users)[1] == [2, 3]
+
+
+def test_disliked_movie_penalizes_only_movies_similar_to_it():
+    pools = make_pools({1: ("драма",), 2: ("драма",), 10: ("драма",)})
+    pools.by_movie[10] = array("q", [1])
+    users = [
+        user(1, pref(PreferenceItem.GENRE, name="драма"), pref(PreferenceItem.MOVIE, kp_id=10, like=False)),
+        user(2, pref(PreferenceItem.MOVIE, kp_id=10)),
+    ]
+
+    # Movie 2 shares the disliked movie's genre and is still recommended, the similar movie 1 is not
+    assert recommended_ids(pools, users, cf_weight=0)[1] == [2]
+
+
+def test_co_liked_movies_are_boosted():
+    pools = make_pools({1: ("драма",), 2: ("драма",), 3: ("драма",)})
+    users = [
+        user(1, pref(PreferenceItem.MOVIE, kp_id=1)),
+        user(2, pref(PreferenceItem.MOVIE, kp_id=1), pref(PreferenceItem.MOVIE, kp_id=3)),
+    ]
+
+    assert recommended_ids(pools, users)[1] == [3, 2]
+
+
+def test_chunking_does_not_change_scores():
+    pools = make_pools({movie_id: ("драма" if movie_id % 2 else "комедия",) for movie_id in range(1, 21)})
+    users = [
+        user(
+            user_id,
+            pref(PreferenceItem.GENRE, name="драма", like=user_id % 3 != 0),
+            pref(PreferenceItem.MOVIE, kp_id=user_id),
+        )
+        for user_id in range(1, 11)
+    ]
+
+    assert recommended_ids(pools, users, k=5, chunk_size=3) == recommended_ids(pools, users, k=5)
+
+
+def test_no_candidates():
+    assert recommended_ids(CandidatePools(), [user(1), user(2)]) == {1: [], 2: []}
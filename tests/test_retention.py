@@ -0,0 +1,109 @@
+import asyncio
+import datetime
+
+import pytest
+from sqlalchemy import insert, select
+
+from app import crud
+from app.core.database import async_engine, async_session_factory, engine
+from app.core.retention import run_retention
+from app.models.base import Base
+from app.models.message import Message, MessageArchive, MessageType
+from app.models.user import User
+
+
+NOW = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)  # SQLite fills created_at in UTC
+
+
+@pytest.fixture(autouse=True)
+def tables():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield
+    Base.metadata.drop_all(engine)
+
+
+def add_messages(user_id: int, ages_in_days: list[float]) -> None:
+    with engine.begin() as conn:
+        conn.execute(insert(User).values(id=user_id, tg_chat_id=user_id, full_name=f"User {user_id}"))
+        conn.execute(insert(Message), [
+            {
+                "user_id": user_id,
+                "message_type": MessageType.HUMAN,
+                "content": f"message {i} of user {user_id}",
+                "created_at": NOW - datetime.timedelta(days=age),
+            }
+            for i, age in enumerate(ages_in_days)
+        ])
+
+
+def contents(model, user_id: int) -> list[str]:
+    with engine.connect() as conn:
+        rows = conn.execute(select(model.id, model.content).where(model.user_id == user_id).order_by(model.id))
+        return [content for _, content in rows]
+
+
+def retention(**kwargs):
+    async def run():
+        try:
+            return await run_retention(**kwargs)
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(run())
+
+
+def test_dormant_user_keeps_last_messages():
+    add_messages(1, [90 - i for i in range(10)])
+
+    stats = retention(retention_days=30, keep_last=5, batch_size=100)
+
+    assert stats.rows_moved == 5
+    assert contents(Message, 1) == [f"message {i} of user 1" for i in range(5, 10)]
+
+
+def test_old_messages_beyond_keep_last_are_archived():
+    add_messages(1, [60] * 8 + [1] * 3)
+
+    stats = retention(retention_days=30, keep_last=5, batch_size=100)
+
+    assert stats.rows_moved == 6
+    assert contents(Message, 1) == [f"message {i} of user 1" for i in range(6, 11)]
+
+
+def test_recent_messages_are_never_archived():
+    add_messages(1, [2] * 20)
+
+    stats = retention(retention_days=30, keep_last=5, batch_size=100)
+
+    assert stats.rows_moved == 0
+    assert len(contents(Message, 1)) == 20
+
+
+def test_batches_cover_all_users():
+    add_messages(1, [40] * 12)
+    add_messages(2, [40] * 3)
+    add_messages(3, [40] * 9)
+
+    stats = retention(retention_days=30, keep_last=5, batch_size=4)
+
+    assert stats.rows_moved == 7 + 4
+    assert stats.batches == 3
+    assert [len(contents(Message, user_id)) for user_id in (1, 2, 3)] == [5, 3, 5]
+    assert len(contents(MessageArchive, 1)) == 7
+
+
+def test_archived_content_is_restored():
+    add_messages(1, [40] * 6)
+
+    retention(retention_days=30, keep_last=5, batch_size=100)
+
+    async def archived():
+        try:
+            async with async_session_factory() as session:
+                return await crud.message.get_archived_user_messages(session, 1)
+        finally:
+            await async_engine.dispose()
+
+    [(message_type, content, _)] = asyncio.run(archived())
+    assert (message_type, content) == (MessageType.HUMAN, "message 0 of user 1")
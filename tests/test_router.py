@@ -0,0 +1,68 @@
+import pytest
+from langchain_core.messages import AIMessage, FunctionMessage, HumanMessage
+
+from app.agent.graph.state import AgentState
+from app.agent.nodes.router_node import FastRouter, Intent, RouterNode
+
+
+MODEL_ROUTED = "Какой рейтинг у фильма Интерстеллар?"
+
+
+@pytest.fixture(scope="module")
+def router() -> FastRouter:
+    return FastRouter()
+
+
+def with_threshold(router: FastRouter, min_confidence: float) -> FastRouter:
+    # The trained model is shared, only the threshold differs
+    other = FastRouter.__new__(FastRouter)
+    other._model = router._model
+    other._min_confidence = min_confidence
+    return other
+
+
+def test_model_prediction_is_routed_only_above_the_threshold(router):
+    intent, confidence, source = router.classify(MODEL_ROUTED)
+    assert (intent, source) == (Intent.MOVIE_INFO, "model")
+
+    routed = with_threshold(router, confidence - 0.01).route(MODEL_ROUTED)
+    assert routed.plan.tasks[0].agent == "MoviesSearch"
+    assert routed.source == "model"
+
+    declined = with_threshold(router, confidence + 0.01).route(MODEL_ROUTED)
+    assert (declined.intent, declined.plan, declined.source) == (Intent.MOVIE_INFO, None, "fallback")
+
+
+def test_rules_are_routed_with_full_confidence(router):
+    route = with_threshold(router, 0.99).route("Сколько лет Киану Ривзу?")
+    assert (route.intent, route.confidence, route.source) == (Intent.PERSON, 1.0, "rule")
+    assert route.plan.tasks[0].agent == "PeopleSearchByName"
+
+
+def test_threshold_above_one_sends_everything_to_the_planner(router):
+    strict = with_threshold(router, 1.01)
+    assert all(strict.route(text).plan is None for text in ("Привет!", "Сколько лет Киану Ривзу?", MODEL_ROUTED))
+
+
+@pytest.mark.parametrize("text", [
+    "Мне нравится фильм Матрица",  # preference
+    "А какой у него рейтинг фильма?",  # reference to an earlier message
+    "Что пишут о фильме Дюна и сколько лет Тимоти Шаламе?",  # several intents
+    "какая погода",  # nothing to search for
+])
+def test_ambiguous_messages_go_to_the_planner_whatever_the_threshold(router, text):
+    route = with_threshold(router, 0.0).route(text)
+    assert (route.intent, route.plan, route.source) == (Intent.OTHER, None, "fallback")
+
+
+def state(*history) -> AgentState:
+    return AgentState(history=list(history), user_id=1, user_preferences=[])
+
+
+def test_short_follow_up_goes_to_the_planner(router):
+    node = RouterNode(router)
+
+    follow_up = state(HumanMessage("Что посмотреть?"), AIMessage("Матрицу"), HumanMessage("Сколько лет Киану?"))
+    assert node.invoke(follow_up).history[-1].content == "Сколько лет Киану?"
+
+    assert isinstance(node.invoke(state(HumanMessage("Сколько лет Киану Ривзу?"))).history[-1], FunctionMessage)
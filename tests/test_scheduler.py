@@ -0,0 +1,113 @@
+import asyncio
+import datetime
+
+import pytest
+
+from app.core.scheduler import CronSchedule, Scheduler
+
+
+def at(*args) -> datetime.datetime:
+    return datetime.datetime(*args)
+
+
+def test_fields_support_lists_ranges_and_steps():
+    schedule = CronSchedule.parse("*/15 9-11,14 1 */3 1-5/2")
+
+    assert schedule.minutes == {0, 15, 30, 45}
+    assert schedule.hours == {9, 10, 11, 14}
+    assert schedule.days == {1}
+    assert schedule.months == {1, 4, 7, 10}
+    assert schedule.weekdays == {1, 3, 5}
+
+
+def test_sunday_is_both_0_and_7():
+    assert CronSchedule.parse("0 0 * * 7").weekdays == CronSchedule.parse("0 0 * * 0").weekdays == {0}
+
+
+@pytest.mark.parametrize(
+    "expression", ["0 16 * *", "60 * * * *", "* 24 * * *", "* * 0 * *", "*/0 * * * *", "5-1 * * * *"]
+)
+def test_invalid_expressions_are_rejected(expression):
+    with pytest.raises(ValueError):
+        CronSchedule.parse(expression)
+
+
+@pytest.mark.parametrize("expression, now, expected", [
+    # Weekly on Friday, from a Wednesday and from the firing minute itself
+    ("0 16 * * 5", at(2024, 5, 1, 12, 0), at(2024, 5, 3, 16, 0)),
+    ("0 16 * * 5", at(2024, 5, 3, 16, 0, 30), at(2024, 5, 10, 16, 0)),
+    # Working hours skip the weekend
+    ("*/15 9-18 * * 1-5", at(2024, 5, 3, 18, 50), at(2024, 5, 6, 9, 0)),
+    # Year rollover
+    ("30 2 1 1 *", at(2024, 6, 15, 0, 0), at(2025, 1, 1, 2, 30)),
+    # Day of month and weekday both restricted: either one matches
+    ("0 0 13 * 5", at(2024, 9, 1, 0, 0), at(2024, 9, 6, 0, 0)),
+    ("0 0 13 * 5", at(2024, 9, 7, 0, 0), at(2024, 9, 13, 0, 0)),
+    # Only one of them restricted: it alone decides
+    ("0 0 29 2 *", at(2024, 3, 1, 0, 0), at(2028, 2, 29, 0, 0)),
+])
+def test_next_after(expression, now, expected):
+    assert CronSchedule.parse(expression).next_after(now) == expected
+
+
+class ShardRecorder:
+    def __init__(self, results=()):
+        self.calls: list[tuple[int, int, str]] = []
+        self._results = list(results)
+
+    async def __call__(self, shard: int, shards: int, run_key: str) -> bool | None:
+        self.calls.append((shard, shards, run_key))
+        result = self._results.pop(0) if self._results else None
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def fire(scheduler: Scheduler, job) -> None:
+    asyncio.run(scheduler._fire(job, at(2024, 5, 3, 16, 0)))
+
+
+def test_every_shard_runs_once_with_the_same_run_key():
+    recorder = ShardRecorder()
+    scheduler = Scheduler()
+    job = scheduler.add_job("recommend", "0 16 * * 5", recorder, shards=3)
+
+    fire(scheduler, job)
+
+    assert sorted(recorder.calls) == [(shard, 3, "2024-05-03T16:00") for shard in range(3)]
+
+
+def test_shard_starts_are_spread_over_the_window(monkeypatch):
+    delays = {}
+
+    async def run_shard(job, shard, run_key, delay):
+        delays[shard] = delay
+
+    scheduler = Scheduler()
+    job = scheduler.add_job("recommend", "0 16 * * 5", ShardRecorder(), shards=4, window=60, jitter=5)
+    monkeypatch.setattr(scheduler, "_run_shard", run_shard)
+    monkeypatch.setattr("app.core.scheduler.random.uniform", lambda low, high: high)
+
+    fire(scheduler, job)
+
+    assert delays == {0: 5, 1: 20, 2: 35, 3: 50}
+
+
+def test_failed_and_partial_shards_are_retried():
+    recorder = ShardRecorder([RuntimeError("Kinopoisk is down"), False, True])
+    scheduler = Scheduler()
+    job = scheduler.add_job("recommend", "0 16 * * 5", recorder, retries=5)
+
+    fire(scheduler, job)
+
+    assert recorder.calls == [(0, 1, "2024-05-03T16:00")] * 3
+
+
+def test_retries_are_limited():
+    recorder = ShardRecorder([False] * 10)
+    scheduler = Scheduler()
+    job = scheduler.add_job("recommend", "0 16 * * 5", recorder, retries=2)
+
+    fire(scheduler, job)
+
+    assert len(recorder.calls) == 3
@@ -0,0 +1,63 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core import tracing
+from app.core.tracing import TRACE_EXPORT_FAILURES, Span, SpanContext, _SpanExporter
+
+
+def child_span(name: str) -> tuple[str, str | None]:
+    with tracing.span(name) as child:
+        return child.trace_id, child.parent_id
+
+
+def test_spans_in_wrapped_pool_work_keep_the_parent_trace():
+    with ThreadPoolExecutor(max_workers=2) as executor, tracing.span("turn") as parent:
+        wrapped = executor.submit(tracing.wrap(child_span), "wrapped").result()
+        # A pool thread does not inherit the context by itself
+        unwrapped = executor.submit(child_span, "unwrapped").result()
+
+    assert wrapped == (parent.trace_id, parent.span_id)
+    assert unwrapped[0] != parent.trace_id and unwrapped[1] is None
+
+
+def test_attached_context_continues_the_trace_in_another_thread():
+    with tracing.span("turn") as parent:
+        context = tracing.current_context()
+
+    def worker():
+        with tracing.attach(context):
+            assert tracing.current_span() is None
+            assert tracing.current_trace_id() == parent.trace_id
+            with tracing.span("summary") as child:
+                return child.trace_id, child.parent_id, child.sampled
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(worker).result() == (parent.trace_id, parent.span_id, parent.sampled)
+    with tracing.attach(None):
+        assert tracing.current_trace_id() is None
+
+
+def test_export_failure_is_reported_and_the_exporter_keeps_running(tmp_path, capsys):
+    path = tmp_path / "traces" / "traces.jsonl"
+    exporter = _SpanExporter("file", str(path))
+    parent = SpanContext(trace_id="a" * 32, span_id="b" * 16)
+    failures = TRACE_EXPORT_FAILURES.value()
+
+    def export(name: str) -> None:
+        span = Span(name, parent)
+        span.end()
+        exporter.export(span)
+
+    export("lost")  # the directory does not exist yet
+    for _ in range(100):
+        if TRACE_EXPORT_FAILURES.value() > failures:
+            break
+        time.sleep(0.01)
+    path.parent.mkdir()
+    export("written")
+    exporter.shutdown()
+
+    assert TRACE_EXPORT_FAILURES.value() == failures + 1
+    assert "Tracing: failed to export 1 spans" in capsys.readouterr().err
+    assert [json.loads(line)["name"] for line in path.read_text().splitlines()] == ["written"]
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import signal
+import socket
+
+import aiohttp
+import pytest
+from aiogram import Bot, Dispatcher
+from aiohttp.test_utils import TestClient, TestServer
+
+from app import webhook
+from app.bot_handlers.middlewares import in_flight
+from app.core.config import settings
+from app.core.metrics import registry
+
+
+UPDATE = {
+    "update_id": 1,
+    "message": {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"}, "text": "hi"},
+}
+
+
+@pytest.fixture(autouse=True)
+def webhook_settings(monkeypatch):
+    monkeypatch.setattr(settings, "WEBHOOK_SECRET", "secret")
+    monkeypatch.setattr(in_flight, "draining", False)
+
+
+def client_scenario(scenario, **kwargs):
+    async def run():
+        bot = Bot("123456:test")
+        app = webhook.build_webhook_app(Dispatcher(), bot, **kwargs)
+        try:
+            async with TestClient(TestServer(app)) as client:
+                return await scenario(client)
+        finally:
+            await bot.session.close()
+
+    return asyncio.run(run())
+
+
+def test_wrong_secret_token_is_rejected():
+    async def scenario(client):
+        statuses = []
+        for headers in ({}, {"X-Telegram-Bot-Api-Secret-Token": "wrong"}, {"X-Telegram-Bot-Api-Secret-Token": "secret"}):
+            response = await client.post(settings.WEBHOOK_PATH, json=UPDATE, headers=headers)
+            statuses.append(response.status)
+        return statuses
+
+    assert client_scenario(scenario) == [401, 401, 200]
+
+
+def test_metrics_render_only_when_enabled():
+    registry.counter("webhook_test_total", "Counter of the webhook test").inc()
+
+    async def scenario(client):
+        response = await client.get(settings.METRICS_PATH)
+        return response.status, response.headers.get("Content-Type"), await response.text()
+
+    status, content_type, body = client_scenario(scenario, serve_metrics=True)
+    assert (status, content_type) == (200, "text/plain; version=0.0.4; charset=utf-8")
+    assert "webhook_test_total 1" in body
+
+    status, _, _ = client_scenario(scenario)
+    assert status == 404
+
+
+def test_health_reports_draining_before_the_listener_closes(monkeypatch):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    monkeypatch.setattr(settings, "WEBAPP_HOST", "127.0.0.1")
+    monkeypatch.setattr(settings, "WEBAPP_PORT", port)
+    url = f"http://127.0.0.1:{port}{settings.HEALTH_PATH}"
+
+    async def health(session: aiohttp.ClientSession) -> tuple[int, str]:
+        async with session.get(url) as response:
+            return response.status, (await response.json())["status"]
+
+    async def scenario():
+        bot = Bot("123456:test")
+        server = asyncio.create_task(webhook._serve(webhook.build_webhook_app(Dispatcher(), bot), False, 1.0))
+        async with aiohttp.ClientSession() as session:
+            for _ in range(50):
+                try:
+                    before = await health(session)
+                    break
+                except aiohttp.ClientConnectionError:
+                    await asyncio.sleep(0.05)
+            os.kill(os.getpid(), signal.SIGTERM)
+            await asyncio.sleep(0.2)
+            during = await health(session)
+            await asyncio.wait_for(server, 5)
+            with pytest.raises(aiohttp.ClientConnectionError):
+                await health(session)
+        await bot.session.close()
+        return before, during
+
+    before, during = asyncio.run(scenario())
+    assert before == (200, "ok")
+    assert during == (503, "draining")
@@ -0,0 +1,94 @@
+import sqlite3
+
+from app.core.wiki_store import WikiStore
+
+
+def page(page_id: int, title: str, revision: int, text: str, redirect: str | None = None) -> str:
+    redirect = f'<redirect title="{redirect}" />' if redirect else ""
+    return f"""
+  <page>
+    <title>{title}</title>
+    <ns>0</ns>
+    <id>{page_id}</id>
+    {redirect}
+    <revision>
+      <id>{revision}</id>
+      <text xml:space="preserve">{text}</text>
+    </revision>
+  </page>"""
+
+
+def person(kp_id: int, lead: str) -> str:
+    return f"{lead} — актёр кино.\n\n== Ссылки ==\n* [https://www.kinopoisk.ru/name/{kp_id}/ Кинопоиск]\n\n" \
+           "[[Категория:Родившиеся 2 сентября]]"
+
+
+def write_dump(path, *pages: str) -> str:
+    path.write_text(f"<mediawiki>{''.join(pages)}\n</mediawiki>", encoding="utf-8")
+    return str(path)
+
+
+def counts(store_path: str) -> tuple[int, int]:
+    with sqlite3.connect(store_path) as connection:
+        return tuple(connection.execute(f"SELECT count(*) FROM {table}").fetchone()[0] for table in ("pages", "keys"))
+
+
+def test_reingest_updates_pages_in_place(tmp_path):
+    store_path = str(tmp_path / "wiki.sqlite3")
+    store = WikiStore(store_path)
+    store.ingest(write_dump(
+        tmp_path / "old.xml",
+        page(101, "Ривз, Киану", 5001, person(7836, "Киану Ривз (старая версия)")),
+        page(102, "Нолан, Кристофер", 5002, person(41477, "Кристофер Нолан")),
+        page(103, "Киану", 5003, "#REDIRECT [[Ривз, Киану]]", redirect="Ривз, Киану"),
+    ), show_logs=False)
+    before = counts(store_path)
+
+    store.ingest(write_dump(
+        tmp_path / "new.xml",
+        page(101, "Ривз, Киану", 6001, person(7836, "Киану Ривз (новая версия)")),
+        page(102, "Нолан, Кристофер", 5002, person(41477, "Кристофер Нолан")),
+    ), show_logs=False)
+
+    assert counts(store_path) == before
+    article = store.get("Киану Ривз")
+    assert (article.revision, article.kp_id) == (6001, 7836)
+    assert "новая версия" in article.content
+    assert store.get(kp_id=7836) == article
+    assert store.get("Киану") == article
+
+
+def test_store_of_an_older_version_is_rebuilt(tmp_path):
+    store_path = str(tmp_path / "wiki.sqlite3")
+    with sqlite3.connect(store_path) as connection:
+        connection.executescript(
+            "CREATE TABLE pages (id INTEGER PRIMARY KEY, title TEXT NOT NULL, kp_id INTEGER, "
+            "revision INTEGER NOT NULL, content BLOB NOT NULL);"
+            "CREATE TABLE keys (key TEXT PRIMARY KEY, page_id INTEGER NOT NULL) WITHOUT ROWID;"
+            "INSERT INTO pages VALUES (1, 'Старая статья', NULL, 1, x'00');"
+            "INSERT INTO keys VALUES ('статья старая', 1);"
+        )
+
+    WikiStore(store_path).ingest(write_dump(
+        tmp_path / "dump.xml", page(102, "Нолан, Кристофер", 5002, person(41477, "Кристофер Нолан"))
+    ), show_logs=False)
+
+    assert WikiStore(store_path).get("Старая статья") is None
+    assert WikiStore(store_path).get("Кристофер Нолан").kp_id == 41477
+
+
+def test_kp_id_comes_only_from_person_links(tmp_path):
+    store_path = str(tmp_path / "wiki.sqlite3")
+    film_first = "Кристофер Нолан — режиссёр кино. Снял {{Kinopoisk film|447301|Начало}}.\n\n" \
+                 "== Ссылки ==\n* {{Kinopoisk name|41477}}\n\n[[Категория:Родившиеся 30 июля]]"
+    film_only = "Джон Доу — актёр кино. См. https://www.kinopoisk.ru/film/435/\n\n[[Категория:Родившиеся 1 мая]]"
+    WikiStore(store_path).ingest(write_dump(
+        tmp_path / "dump.xml",
+        page(102, "Нолан, Кристофер", 5002, film_first),
+        page(104, "Доу, Джон", 5004, film_only),
+    ), show_logs=False)
+
+    store = WikiStore(store_path)
+    assert store.get("Кристофер Нолан").kp_id == 41477
+    assert store.get("Джон Доу").kp_id is None
+    assert store.get(kp_id=447301) is None
@@ -0,0 +1,67 @@
+from app.agent.nodes.wiki_utils import WikiPage, WikiSection, select_sections, split_sections
+
+
+CONTENT = """Киану Ривз — канадский актёр.
+
+== Биография ==
+Родился в Бейруте.
+
+=== Ранние годы ===
+Детство провёл в Торонто.
+
+== Карьера ==
+Снялся в фильмах «Скорость» и «Матрица».
+
+== Личная жизнь ==
+Играет на бас-гитаре.
+
+== Примечания ==
+1. Источник.
+
+== Ссылки ==
+* Сайт"""
+
+
+def page(*sections: WikiSection) -> WikiPage:
+    return WikiPage("Ривз, Киану", 1, sections)
+
+
+def test_split_sections_keeps_the_lead_and_nests_subsections():
+    assert split_sections(CONTENT) == (
+        WikiSection("", "Киану Ривз — канадский актёр."),
+        WikiSection("Биография", "Родился в Бейруте."),
+        WikiSection("Биография / Ранние годы", "Детство провёл в Торонто."),
+        WikiSection("Карьера", "Снялся в фильмах «Скорость» и «Матрица»."),
+        WikiSection("Личная жизнь", "Играет на бас-гитаре."),
+    )
+
+
+def test_split_sections_without_a_lead_or_headings():
+    assert split_sections("== Фильмография ==\nСкорость") == (WikiSection("Фильмография", "Скорость"),)
+    assert split_sections("Только вводная часть") == (WikiSection("", "Только вводная часть"),)
+    assert split_sections("") == ()
+
+
+def test_select_sections_returns_the_lead_and_matching_sections_in_page_order():
+    wiki_page = page(*split_sections(CONTENT))
+
+    selected = select_sections(wiki_page, "В каких фильмах снимался и где прошло детство?")
+
+    assert selected == (
+        "Киану Ривз — канадский актёр.\n\n"
+        "== Биография / Ранние годы ==\nДетство провёл в Торонто.\n\n"
+        "== Карьера ==\nСнялся в фильмах «Скорость» и «Матрица»."
+    )
+    assert select_sections(wiki_page, "Какая погода?") == "Киану Ривз — канадский актёр."
+
+
+def test_select_sections_skips_sections_that_do_not_fit_in_max_chars():
+    wiki_page = page(
+        WikiSection("", "Лид."),
+        WikiSection("Фильмы", "Список работ: " + "роль, " * 20),
+        WikiSection("Награды", "Премии за фильмы: Оскар."),
+    )
+
+    selected = select_sections(wiki_page, "Какие у него награды за фильмы?", max_chars=100)
+
+    assert selected == "Лид.\n\n== Награды ==\nПремии за фильмы: Оскар."
@@ -0,0 +1,149 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.bot_handlers.work_queue import QUEUED_MESSAGE, SHED_MESSAGE, ChatWorkQueue
+
+
+class FakeMessage:
+    def __init__(self, chat_id: int, text: str, fail_answers: bool = False):
+        self.chat = SimpleNamespace(id=chat_id)
+        self.text = text
+        self.answers: list[str] = []
+        self._fail_answers = fail_answers
+
+    async def answer(self, text: str) -> "FakeMessage":
+        if self._fail_answers:
+            raise RuntimeError("Forbidden: bot was blocked by the user")
+        self.answers.append(text)
+        return FakeMessage(self.chat.id, text)
+
+
+class Recorder:
+    """process_turn, который ждёт release для каждого хода"""
+
+    def __init__(self):
+        self.turns: list[list[str]] = []
+        self.running = 0
+        self.max_running = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self, messages, status_message) -> None:
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await self.release.wait()
+            self.turns.append([message.text for message in messages])
+        finally:
+            self.running -= 1
+
+
+async def settle() -> None:
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+def make_queue(recorder, max_concurrent_runs=2, max_pending=10, coalesce_delay=0.01) -> ChatWorkQueue:
+    return ChatWorkQueue(recorder, max_concurrent_runs, max_pending, coalesce_delay)
+
+
+def test_single_message_is_not_delayed():
+    async def scenario():
+        recorder = Recorder()
+        queue = make_queue(recorder, coalesce_delay=60)
+        await queue.submit(FakeMessage(1, "hi"))
+        await settle()
+        return recorder.turns
+
+    assert asyncio.run(asyncio.wait_for(scenario(), 5)) == [["hi"]]
+
+
+def test_messages_sent_during_a_turn_are_answered_together_in_order():
+    async def scenario():
+        recorder = Recorder()
+        recorder.release.clear()
+        queue = make_queue(recorder)
+        await queue.submit(FakeMessage(1, "first"))
+        await settle()
+        for text in ("second", "third"):
+            await queue.submit(FakeMessage(1, text))
+        recorder.release.set()
+        await asyncio.sleep(0.05)
+        return recorder.turns, queue.depth
+
+    turns, depth = asyncio.run(scenario())
+    assert turns == [["first"], ["second", "third"]]
+    assert depth == 0
+
+
+def test_concurrent_runs_are_capped_and_queued_chats_are_notified():
+    async def scenario():
+        recorder = Recorder()
+        recorder.release.clear()
+        queue = make_queue(recorder, max_concurrent_runs=2)
+        messages = [FakeMessage(chat_id, f"message {chat_id}") for chat_id in range(4)]
+        for message in messages:
+            await queue.submit(message)
+        await settle()
+        running = recorder.running
+        recorder.release.set()
+        await settle()
+        return running, recorder, messages
+
+    running, recorder, messages = asyncio.run(scenario())
+    assert running == 2
+    assert recorder.max_running == 2
+    assert len(recorder.turns) == 4
+    assert [bool(message.answers) for message in messages] == [False, False, True, True]
+    assert messages[2].answers == [QUEUED_MESSAGE.format(position=1)]
+
+
+def test_messages_over_the_limit_are_shed():
+    async def scenario():
+        recorder = Recorder()
+        recorder.release.clear()
+        queue = make_queue(recorder, max_pending=1)
+        accepted = await queue.submit(FakeMessage(1, "first"))
+        shed = FakeMessage(2, "second")
+        rejected = not await queue.submit(shed)
+        recorder.release.set()
+        await settle()
+        return accepted, rejected, shed.answers
+
+    assert asyncio.run(scenario()) == (True, True, [SHED_MESSAGE])
+
+
+def test_failed_queue_notification_does_not_lose_the_turn():
+    async def scenario():
+        recorder = Recorder()
+        recorder.release.clear()
+        queue = make_queue(recorder, max_concurrent_runs=1)
+        await queue.submit(FakeMessage(1, "first"))
+        await settle()
+        await queue.submit(FakeMessage(2, "blocked", fail_answers=True))
+        await settle()
+        recorder.release.set()
+        await settle()
+        return recorder.turns, queue.depth
+
+    assert asyncio.run(scenario()) == ([["first"], ["blocked"]], 0)
+
+
+def test_failed_turn_does_not_stop_the_chat():
+    async def scenario():
+        turns = []
+
+        async def process_turn(messages, status_message):
+            turns.append([message.text for message in messages])
+            if len(turns) == 1:
+                await asyncio.sleep(0.01)
+                raise RuntimeError("agent failed")
+
+        queue = make_queue(process_turn)
+        await queue.submit(FakeMessage(1, "first"))
+        await settle()
+        await queue.submit(FakeMessage(1, "second"))
+        await asyncio.sleep(0.05)
+        return turns, queue.depth
+
+    assert asyncio.run(scenario()) == ([["first"], ["second"]], 0)